@@ -0,0 +1,18 @@
+"""Gunicorn settings for the web process (see Procfile).
+
+The progress pages keep a Server-Sent Events stream open for each job they watch (see views.job_events), for up to
+settings.JOB_EVENTS_MAX_SECONDS at a time. The web process therefore uses gevent workers, which serve each request in a
+greenlet: an open stream costs a greenlet (waiting on its Redis pub/sub connection) rather than one of a few worker
+threads, so open progress pages do not hold up other requests."""
+import os
+
+worker_class = 'gevent'
+
+# largest number of requests (including open event streams) a worker serves at once
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+
+def post_fork(server, worker):
+    # let psycopg2 wait for the database cooperatively, so that a query does not block the other greenlets of the worker
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
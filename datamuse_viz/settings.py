@@ -240,4 +240,112 @@ RQ_QUEUES = {
     },
 }
 
+# Datamuse API settings
+# root url for Datamuse queries (can be pointed to a local stand-in server for benchmarks)
+DATAMUSE_API_ROOT = os.getenv('DATAMUSE_API_ROOT', 'https://api.datamuse.com')
+
+# number of threads used to query Datamuse in parallel when processing the words of a new WordSet
+DATAMUSE_WORKERS = int(os.getenv('DATAMUSE_WORKERS', 8))
+
+# number of keep-alive connections to the Datamuse host kept open by the Datamuse client (see words/datamuse_client.py),
+# and the timeouts (in seconds) for opening a connection and for reading a response
+DATAMUSE_POOL_SIZE = int(os.getenv('DATAMUSE_POOL_SIZE', DATAMUSE_WORKERS))
+DATAMUSE_CONNECT_TIMEOUT = float(os.getenv('DATAMUSE_CONNECT_TIMEOUT', 3.05))
+DATAMUSE_READ_TIMEOUT = float(os.getenv('DATAMUSE_READ_TIMEOUT', 10))
+
+# maximum number of requests per second sent to the Datamuse host (0 disables the limit)
+DATAMUSE_RATE_LIMIT = float(os.getenv('DATAMUSE_RATE_LIMIT', 20))
+
+# number of times a Datamuse query is tried before it is given up. Timeouts, connection errors and 429 and 5xx
+# responses are retried with exponential backoff: the n-th retry waits a random time (full jitter) of up to
+# DATAMUSE_BACKOFF * 2 ** (n - 1) seconds, capped at DATAMUSE_BACKOFF_MAX seconds
+DATAMUSE_ATTEMPTS = int(os.getenv('DATAMUSE_ATTEMPTS', 5))
+DATAMUSE_BACKOFF = float(os.getenv('DATAMUSE_BACKOFF', 0.5))
+DATAMUSE_BACKOFF_MAX = float(os.getenv('DATAMUSE_BACKOFF_MAX', 8))
+
+# circuit breaker shared (through Redis) by all processes querying Datamuse (see words/circuit_breaker.py): after
+# FAILURES failed queries within WINDOW seconds, Datamuse is not queried for COOLDOWN seconds. FAILURES=0 disables it.
+DATAMUSE_CIRCUIT_BREAKER = {
+    'FAILURES': int(os.getenv('DATAMUSE_BREAKER_FAILURES', 10)),
+    'WINDOW': float(os.getenv('DATAMUSE_BREAKER_WINDOW', 30)),
+    'COOLDOWN': float(os.getenv('DATAMUSE_BREAKER_COOLDOWN', 30)),
+}
+
+# cache for Datamuse query results (see words/datamuse_cache.py). BACKEND is one of 'lru', 'redis', 'database' or
+# 'none'. TTLs are in seconds: results holding words are kept for POSITIVE_TTL, empty results for NEGATIVE_TTL.
+# MAX_ENTRIES counts results, not bytes, so the default backend is the database rather than the Redis server that RQ
+# relies on.
+DATAMUSE_CACHE = {
+    'BACKEND': os.getenv('DATAMUSE_CACHE_BACKEND', 'database'),
+    'POSITIVE_TTL': int(os.getenv('DATAMUSE_CACHE_POSITIVE_TTL', 30 * 24 * 60 * 60)),
+    'NEGATIVE_TTL': int(os.getenv('DATAMUSE_CACHE_NEGATIVE_TTL', 24 * 60 * 60)),
+    'MAX_ENTRIES': int(os.getenv('DATAMUSE_CACHE_MAX_ENTRIES', 100000)),
+}
+
+# number of days a string that Datamuse did not recognize is remembered before Datamuse is queried for it again
+UNRECOGNIZED_WORD_TTL = int(os.getenv('UNRECOGNIZED_WORD_TTL', 30))
+
+# number of words queried and updated at a time by the backfill of words missing data from Datamuse (see
+# words/datamuse_backfill.py)
+DATAMUSE_BACKFILL_BATCH_SIZE = int(os.getenv('DATAMUSE_BACKFILL_BATCH_SIZE', 500))
+
+# number of words saved to the database at a time when processing the words of a new WordSet
+WORDSET_CHUNK_SIZE = int(os.getenv('WORDSET_CHUNK_SIZE', 500))
+
+# spool area holding the words of uploads until the job that adds them to a new WordSet finishes (see
+# words/upload_spool.py). BACKEND is 'database' (a table shared by the web and worker processes) or 'filesystem' (files
+# in DIRECTORY, which the web and worker processes must share).
+WORDSET_SPOOL = {
+    'BACKEND': os.getenv('WORDSET_SPOOL_BACKEND', 'database'),
+    'DIRECTORY': os.getenv('WORDSET_SPOOL_DIRECTORY', os.path.join(BASE_DIR, 'spool')),
+}
+
+# the words of a new WordSet are split between at most WORDSET_SHARDS jobs that RQ workers run in parallel, each
+# given at least WORDSET_SHARD_MIN_WORDS words (so small WordSets are built by a single shard job), see
+# words/wordset_build.py
+WORDSET_SHARDS = int(os.getenv('WORDSET_SHARDS', 4))
+WORDSET_SHARD_MIN_WORDS = int(os.getenv('WORDSET_SHARD_MIN_WORDS', 1000))
+
+# number of words shown as individual bubbles on the first page of the frequency bubble chart (the rest of the WordSet
+# is aggregated into bins), and the largest page the chart data endpoint returns (see words/chart_data.py)
+FREQUENCY_CHART_PAGE_SIZE = int(os.getenv('FREQUENCY_CHART_PAGE_SIZE', 200))
+FREQUENCY_CHART_MAX_PAGE_SIZE = int(os.getenv('FREQUENCY_CHART_MAX_PAGE_SIZE', 2000))
+
+# largest number of words the occurrences vs frequency scatterplot shows as individual points; larger selections of
+# words are aggregated into a grid of SCATTERPLOT_GRID_SIZE by SCATTERPLOT_GRID_SIZE cells (see words/chart_data.py)
+SCATTERPLOT_MAX_POINTS = int(os.getenv('SCATTERPLOT_MAX_POINTS', 4000))
+SCATTERPLOT_GRID_SIZE = int(os.getenv('SCATTERPLOT_GRID_SIZE', 60))
+
+# number of words in each page of the word table of a WordSet (the first page is part of the WordSet's page, later ones
+# are fetched as the table is scrolled), and the largest page the table's json endpoint returns
+WORDSET_TABLE_PAGE_SIZE = int(os.getenv('WORDSET_TABLE_PAGE_SIZE', 100))
+WORDSET_TABLE_MAX_PAGE_SIZE = int(os.getenv('WORDSET_TABLE_MAX_PAGE_SIZE', 1000))
+
+# longest time (in seconds) a stream of job progress events stays open before the browser reconnects, and the time
+# without progress after which the status of the job is checked and a keepalive comment is sent (see
+# words/job_progress.py)
+JOB_EVENTS_MAX_SECONDS = float(os.getenv('JOB_EVENTS_MAX_SECONDS', 60))
+JOB_EVENTS_KEEPALIVE = float(os.getenv('JOB_EVENTS_KEEPALIVE', 15))
+
+# seconds the result of a related words chart job is kept, during which requests for the same chart share it (see
+# words/related_words.py), and seconds such a job may wait in the queue before it expires
+RELATED_WORDS_RESULT_TTL = int(os.getenv('RELATED_WORDS_RESULT_TTL', 300))
+RELATED_WORDS_JOB_TTL = int(os.getenv('RELATED_WORDS_JOB_TTL', 600))
+
+# seconds a related words chart is cached (see words/related_words_cache.py); charts are also dropped as soon as
+# relations are added for their word. 0 disables the cache.
+RELATED_WORDS_CACHE_TTL = int(os.getenv('RELATED_WORDS_CACHE_TTL', 24 * 60 * 60))
+
+# largest number of levels of a related words graph (words related to the related words of a word, and so on), the
+# number of related words each word of the graph branches out to, and the lowest score of those related words (see
+# words/related_words_graph.py)
+RELATED_WORDS_GRAPH_MAX_DEPTH = int(os.getenv('RELATED_WORDS_GRAPH_MAX_DEPTH', 3))
+RELATED_WORDS_GRAPH_FAN_OUT = int(os.getenv('RELATED_WORDS_GRAPH_FAN_OUT', 5))
+RELATED_WORDS_GRAPH_MIN_SCORE = int(os.getenv('RELATED_WORDS_GRAPH_MIN_SCORE', 0))
+
+# progress of a WordSet job is written to Redis once JOB_PROGRESS_INTERVAL seconds have passed or
+# JOB_PROGRESS_WORDS words have been processed since the last write (see words/job_progress.ProgressReporter)
+JOB_PROGRESS_INTERVAL = float(os.getenv('JOB_PROGRESS_INTERVAL', 0.25))
+JOB_PROGRESS_WORDS = int(os.getenv('JOB_PROGRESS_WORDS', 500))
+
 # todo set email to send admin emails to?
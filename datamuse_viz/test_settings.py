@@ -20,5 +20,13 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 LOGGING = {}
 
+# don't let Datamuse results cached by one test affect another
+DATAMUSE_CACHE = dict(DATAMUSE_CACHE, BACKEND='none')
+
+# the circuit breaker and the related words cache are shared through Redis, so state left by one test (or test run)
+# would change the outcome of the next ones; tests of these use their own instances
+DATAMUSE_CIRCUIT_BREAKER = dict(DATAMUSE_CIRCUIT_BREAKER, FAILURES=0)
+RELATED_WORDS_CACHE_TTL = 0
+
 # revert STATICFILES_STORAGE to the default
 STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
@@ -1,11 +1,39 @@
 from django.contrib import admin
 
-from words.models import Language, Word, PartOfSpeech, WordSet
+from words import wordset_build
+from words.models import Language, Word, PartOfSpeech, WordSet, UnrecognizedWord, WordSetStats
+
+
+class WordSetAdmin(admin.ModelAdmin):
+    """Adds actions resuming or restarting the stalled jobs adding words to the selected WordSets (see
+    wordset_build.stalled_jobs)."""
+    actions = ['resume_stalled_builds', 'restart_stalled_builds']
+
+    def stalled_jobs(self, queryset):
+        from words.views import rq_queue
+
+        pks = set(queryset.values_list('pk', flat=True))
+        return rq_queue, [job for job in wordset_build.stalled_jobs(rq_queue) if job.args[0].pk in pks]
+
+    def resume_stalled_builds(self, request, queryset):
+        queue, jobs = self.stalled_jobs(queryset)
+        for job in jobs:
+            wordset_build.resume(queue, job)
+        self.message_user(request, f'{len(jobs)} stalled jobs resumed.')
+    resume_stalled_builds.short_description = 'Resume stalled jobs adding words to the selected word sets'
+
+    def restart_stalled_builds(self, request, queryset):
+        queue, jobs = self.stalled_jobs(queryset)
+        for job in jobs:
+            wordset_build.restart(queue, job)
+        self.message_user(request, f'{len(jobs)} stalled jobs restarted.')
+    restart_stalled_builds.short_description = 'Restart stalled jobs adding words to the selected word sets'
+
 
 # register model classes so they are visible on admin site (admin/)
 admin.site.register(Language)
 admin.site.register(Word)
 admin.site.register(PartOfSpeech)
-admin.site.register(WordSet)
-
-
+admin.site.register(WordSet, WordSetAdmin)
+admin.site.register(UnrecognizedWord)
+admin.site.register(WordSetStats)
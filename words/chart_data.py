@@ -0,0 +1,207 @@
+"""Data for the charts of WordSets, computed in the database so that the size of a response does not grow with the
+size of the WordSet.
+
+The frequency bubble chart is served a page at a time: each page holds the next words of the WordSet in order of
+descending frequency, plus bins aggregating all of the words after the page (one bin per power of ten of frequency).
+The first page gives a compact chart of the most frequent words and the shape of the rest of the WordSet; the chart
+fetches further pages on demand, replacing the bins with those of the new page. Pages are selected with a cursor
+holding the frequency and name of the last word of the previous page (keyset pagination, see pagination.py).
+
+The scatterplot of occurrences vs frequency is served in one of two modes, chosen from the number of words to plot. Up
+to settings.SCATTERPLOT_MAX_POINTS words are sent as individual points; above that, the plot area is divided into a
+grid of settings.SCATTERPLOT_GRID_SIZE by settings.SCATTERPLOT_GRID_SIZE cells and each non-empty cell is sent as a
+single point at the mean position of its words, so the browser never draws more than a few thousand marks."""
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Avg, Case, Count, F, FloatField, Func, IntegerField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Cast, Floor, Least
+
+from words import pagination
+from words.models import WordSet
+
+# group of the bubbles aggregating the words after a page
+bin_group = 'grouped words'
+
+
+def encode_cursor(frequency: Decimal, name: str):
+    """Returns the cursor for the page following the word with frequency and name."""
+    return pagination.encode_cursor(str(frequency), name)
+
+
+def decode_cursor(cursor: str):
+    """Returns the (frequency, name) tuple held by cursor. Raises ValueError if cursor is not valid."""
+    frequency, name = pagination.decode_cursor(cursor, 2)
+    try:
+        return Decimal(frequency), str(name)
+    except (TypeError, InvalidOperation):
+        raise ValueError(f'invalid cursor: {cursor}')
+
+
+def frequency_queryset(wordset: WordSet, frequency_gt: Decimal = None, frequency_lt: Decimal = None):
+    """Returns the words of wordset that have a frequency, limited to frequencies greater than frequency_gt and less
+    than frequency_lt (when given)."""
+    queryset = wordset.words.filter(frequency__isnull=False)
+    if frequency_gt is not None:
+        queryset = queryset.filter(frequency__gt=frequency_gt)
+    if frequency_lt is not None:
+        queryset = queryset.filter(frequency__lt=frequency_lt)
+    return queryset
+
+
+def after(queryset, frequency: Decimal, name: str):
+    """Returns the words of queryset that come after the word with frequency and name in order of descending frequency
+    (and ascending name among words with the same frequency)."""
+    return queryset.filter(Q(frequency__lt=frequency) | Q(frequency=frequency, name__gt=name))
+
+
+def bin_label(exponent: int):
+    """Returns the label of the bin holding frequencies from 10 ** exponent to 10 ** (exponent + 1)."""
+    if exponent is None:
+        return '0'
+    return f'{Decimal(10) ** exponent:f}–{Decimal(10) ** (exponent + 1):f}'
+
+
+def frequency_bins(queryset):
+    """Returns the words of queryset aggregated into one bubble per power of ten of frequency (words with a frequency
+    of 0 have a bin of their own), in order of descending frequency. Uses a single query."""
+    # the logarithm of 0 is undefined, so words with a frequency of 0 get an exponent of NULL. The base 10 logarithm is
+    # taken of the frequency cast to a float, which is an order of magnitude faster than the logarithm of a numeric
+    # (Django's Log function casts its arguments to numeric on PostgreSQL)
+    log10 = Func(Cast('frequency', FloatField()), function='LOG', output_field=FloatField())
+    exponent = Case(When(frequency__gt=0, then=Floor(log10)), output_field=IntegerField())
+    rows = queryset.annotate(exponent=exponent).values('exponent').annotate(
+        count=Count('id'), total=Sum('frequency'), low=Min('frequency'), high=Max('frequency')
+    ).order_by(F('exponent').desc(nulls_last=True))
+
+    bins = []
+    for row in rows:
+        exponent = None if row['exponent'] is None else int(row['exponent'])
+        label = bin_label(exponent)
+        bins.append({
+            "name": label,
+            "title": f'{row["count"]} words with frequency {label}',
+            "group": bin_group,
+            "value": float(row['total']),
+            "count": row['count'],
+            "min": float(row['low']),
+            "max": float(row['high']),
+        })
+    return bins
+
+
+def frequency_page(wordset: WordSet, limit: int, cursor: str = None, frequency_gt: Decimal = None,
+                   frequency_lt: Decimal = None):
+    """Returns a page of the frequency bubble chart of wordset: a dictionary holding
+
+        words: the limit words following cursor (or the first limit words if cursor is None) in order of descending
+               frequency, each as a bubble of the chart
+        bins:  the words after the page, aggregated by frequency_bins
+        count: the number of words in words and bins
+        next:  the cursor of the following page, or None if this is the last page
+
+    Uses two queries, or one when all of the remaining words fit in the page."""
+    queryset = frequency_queryset(wordset, frequency_gt, frequency_lt)
+    if cursor is not None:
+        queryset = after(queryset, *decode_cursor(cursor))
+
+    # fetch one more word than needed to find out if there are words after the page
+    rows = list(queryset.order_by('-frequency', 'name').values_list('name', 'frequency')[:limit + 1])
+    words = [
+        {
+            "name": name,
+            "title": name,
+            "group": wordset.name,
+            "value": float(frequency),
+        }
+        for name, frequency in rows[:limit]
+    ]
+
+    bins = []
+    next_cursor = None
+    if len(rows) > limit:
+        last_name, last_frequency = rows[limit - 1]
+        next_cursor = encode_cursor(last_frequency, last_name)
+        bins = frequency_bins(after(queryset, last_frequency, last_name))
+
+    return {
+        "words": words,
+        "bins": bins,
+        "count": len(words) + sum(item['count'] for item in bins),
+        "next": next_cursor,
+    }
+
+
+def scatterplot_queryset(wordset: WordSet, frequency_gt: Decimal = None, frequency_lt: Decimal = None,
+                         occurrences_gt: int = None, occurrences_lt: int = None):
+    """Returns the memberships of wordset whose word has a frequency, limited by the given bounds on frequency and
+    occurrences (when given)."""
+    queryset = wordset.membership_set.filter(word__frequency__isnull=False)
+    if frequency_gt is not None:
+        queryset = queryset.filter(word__frequency__gt=frequency_gt)
+    if frequency_lt is not None:
+        queryset = queryset.filter(word__frequency__lt=frequency_lt)
+    if occurrences_gt is not None:
+        queryset = queryset.filter(occurrences__gt=occurrences_gt)
+    if occurrences_lt is not None:
+        queryset = queryset.filter(occurrences__lt=occurrences_lt)
+    return queryset
+
+
+def grid_cell(field: str, low, high, size: int):
+    """Returns an expression for the index (0 to size - 1) of the grid cell holding the value of field, for a grid of
+    size cells spanning low to high."""
+    # a range holding a single value is given one cell
+    scale = size / float(high - low) if high > low else 0
+    position = (Cast(field, FloatField()) - Value(float(low))) * Value(scale)
+    return Cast(Least(Floor(position), Value(size - 1)), IntegerField())
+
+
+def scatterplot_data(wordset: WordSet, max_points: int = None, grid_size: int = None, **limits):
+    """Returns the data of the scatterplot of occurrences (x) vs frequency (y) of the words of wordset: a dictionary
+    holding
+
+        mode:   'points' if each word is a point, or 'bins' if the points are grid cells aggregating words
+        count:  the number of words plotted
+        points: the points, each with a name, x and y (and for bins, the count of words in the cell)
+
+    The words are limited by limits (see scatterplot_queryset). Words are sent as points if there are at most
+    max_points of them (settings.SCATTERPLOT_MAX_POINTS by default), otherwise they are aggregated in a grid of
+    grid_size by grid_size cells (settings.SCATTERPLOT_GRID_SIZE by default). Uses two queries."""
+    if max_points is None:
+        max_points = settings.SCATTERPLOT_MAX_POINTS
+    if grid_size is None:
+        grid_size = settings.SCATTERPLOT_GRID_SIZE
+
+    queryset = scatterplot_queryset(wordset, **limits)
+    bounds = queryset.aggregate(count=Count('id'), min_x=Min('occurrences'), max_x=Max('occurrences'),
+                                min_y=Min('word__frequency'), max_y=Max('word__frequency'))
+
+    if bounds['count'] <= max_points:
+        points = [
+            {
+                "name": name,
+                "x": occurrences,
+                "y": float(frequency),
+            }
+            for name, occurrences, frequency in queryset.values_list('word__name', 'occurrences', 'word__frequency')
+        ]
+        return {"mode": "points", "count": bounds['count'], "points": points}
+
+    cells = queryset.annotate(
+        cell_x=grid_cell('occurrences', bounds['min_x'], bounds['max_x'], grid_size),
+        cell_y=grid_cell('word__frequency', bounds['min_y'], bounds['max_y'], grid_size),
+    ).values('cell_x', 'cell_y').annotate(
+        count=Count('id'), x=Avg('occurrences'), y=Avg('word__frequency')
+    ).order_by('cell_x', 'cell_y')
+
+    points = [
+        {
+            "name": f'{cell["count"]} words',
+            "x": float(cell['x']),
+            "y": float(cell['y']),
+            "count": cell['count'],
+        }
+        for cell in cells
+    ]
+    return {"mode": "bins", "count": bounds['count'], "points": points}
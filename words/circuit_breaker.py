@@ -0,0 +1,103 @@
+"""Circuit breaker shared by every process that queries an upstream service, so that all of the web and worker processes
+stop querying the service at once while it is unhealthy, rather than each of them waiting out its own retries.
+
+The state of the breaker is kept in Redis (the server used by django-rq):
+    closed:     queries are allowed. Each failed query adds to a failure counter, which expires `window` seconds after
+                the first failure it counts; a successful query resets it. When the counter reaches `failures`, the
+                breaker opens.
+    open:       queries are refused (allow returns False) for `cooldown` seconds.
+    half-open:  once the cooldown is over, a single query (the probe) is allowed at a time. The breaker closes if the
+                probe succeeds, and opens again for another cooldown if it fails.
+
+If Redis is unavailable, the error is logged and the breaker stays closed, so the service is queried as if there were
+no breaker."""
+import logging
+
+from redis.exceptions import RedisError
+
+# Get an instance of a logger
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(ConnectionError):
+    """Exception indicating a query was not sent because the circuit breaker of its service is open."""
+
+
+class CircuitBreaker:
+    """Circuit breaker named name, opening after failures failed queries within window seconds and refusing queries for
+    cooldown seconds. A breaker with failures=0 never opens."""
+
+    def __init__(self, name: str, failures: int, window: float, cooldown: float, connection=None):
+        self.name = name
+        self.failures = failures
+        self.window = window
+        self.cooldown = cooldown
+        self._connection = connection
+
+        self.failures_key = f'circuit-breaker:{name}:failures'
+        self.open_key = f'circuit-breaker:{name}:open'          # exists while the breaker is open
+        self.tripped_key = f'circuit-breaker:{name}:tripped'    # exists from the time the breaker opens until it closes
+        self.probe_key = f'circuit-breaker:{name}:probe'        # held by the query probing the service when half-open
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            # the Redis client used by django-rq
+            from words.views import redis_cursor
+            self._connection = redis_cursor
+        return self._connection
+
+    def allow(self):
+        """Returns True if a query may be sent to the service."""
+        if not self.failures:
+            return True
+        try:
+            is_open, tripped = self.connection.mget(self.open_key, self.tripped_key)
+            if is_open:
+                return False
+            if tripped:
+                # half-open: only the query that takes the probe is sent (the probe is released if it never reports)
+                return bool(self.connection.set(self.probe_key, 1, nx=True, ex=max(1, int(self.cooldown))))
+            return True
+        except RedisError as e:
+            logger.warning(f'circuit breaker {self.name} unavailable: {e}')
+            return True
+
+    def record_success(self):
+        """Records a query answered by the service, closing the breaker."""
+        if not self.failures:
+            return
+        try:
+            self.connection.delete(self.failures_key, self.tripped_key, self.probe_key)
+        except RedisError as e:
+            logger.warning(f'circuit breaker {self.name} unavailable: {e}')
+
+    def record_failure(self):
+        """Records a failed query, opening the breaker if it was the probe or if there have been too many failures."""
+        if not self.failures:
+            return
+        try:
+            pipeline = self.connection.pipeline()
+            pipeline.incr(self.failures_key)
+            pipeline.exists(self.tripped_key)
+            count, tripped = pipeline.execute()
+            if count == 1:
+                self.connection.expire(self.failures_key, max(1, int(self.window)))
+            if tripped or count >= self.failures:
+                self.trip()
+        except RedisError as e:
+            logger.warning(f'circuit breaker {self.name} unavailable: {e}')
+
+    def trip(self):
+        """Opens the breaker for cooldown seconds."""
+        logger.warning(f'circuit breaker {self.name} open for {self.cooldown} seconds')
+        pipeline = self.connection.pipeline()
+        pipeline.set(self.open_key, 1, px=max(1, int(self.cooldown * 1000)))
+        # half-open from the end of the cooldown until a query succeeds
+        pipeline.set(self.tripped_key, 1)
+        pipeline.delete(self.failures_key, self.probe_key)
+        pipeline.execute()
+
+    def reset(self):
+        """Closes the breaker."""
+        self.connection.delete(self.failures_key, self.open_key, self.tripped_key, self.probe_key)
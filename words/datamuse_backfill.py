@@ -0,0 +1,136 @@
+"""Backfill of the data of Words that have none from Datamuse (datamuse_success=False), such as the words saved while
+Datamuse could not be reached when their WordSet was created.
+
+The words are scanned in order of id, a batch of settings.DATAMUSE_BACKFILL_BATCH_SIZE at a time, using the partial
+index on Word ids where datamuse_success=False (so only the words missing data are read, however large the Word table
+is). Datamuse is queried for the words of each batch in parallel, through the rate limiter and circuit breaker of
+datamuse_json.query_with_retry (see datamuse_json.query_words), and the words it recognizes are updated in bulk.
+
+The id of the last word of each batch done is kept in Redis, so a backfill that is stopped (by its limit, by the circuit
+breaker opening, or by its worker dying) continues after that word the next time it runs. Once the scan reaches the
+last word, the next backfill starts over from the first word. Words still missing data after a pass (because Datamuse
+could not be reached again) are retried by the next pass; words Datamuse does not recognize are recorded as
+UnrecognizedWords and skipped until their entry expires. Each backfill starts by deleting the expired UnrecognizedWords,
+which no query reads any more.
+
+The backfill is run by the backfill_words command, in the command's process or as an RQ job (backfill_job), which can be
+scheduled with the --enqueue option (for instance by Heroku Scheduler)."""
+import logging
+
+from django.conf import settings
+from rq.job import get_current_job
+
+from words import datamuse_json, job_progress
+from words.circuit_breaker import CircuitOpenError
+from words.models import Word, UnrecognizedWord, default_language
+
+# Get an instance of a logger
+logger = logging.getLogger(__name__)
+
+# Redis key holding the id of the last word of the last batch done
+cursor_key = 'datamuse-backfill:cursor'
+
+# id of the RQ job running the backfill, so that a scheduled backfill is not enqueued while one is queued or running
+job_id = 'datamuse-backfill'
+
+
+def redis_connection():
+    # the Redis client used by django-rq
+    from words.views import redis_cursor
+    return redis_cursor
+
+
+def get_cursor(connection=None):
+    """Returns the id of the word the backfill continues after."""
+    return int((connection or redis_connection()).get(cursor_key) or 0)
+
+
+def set_cursor(word_id: int, connection=None):
+    (connection or redis_connection()).set(cursor_key, word_id)
+
+
+def missing_words(after_id: int = 0):
+    """Returns the QuerySet of the words missing data from Datamuse with an id greater than after_id, in order of id."""
+    return Word.objects.filter(datamuse_success=False, id__gt=after_id).order_by('id')
+
+
+def backfill(batch_size: int = None, limit: int = None, workers: int = None, connection=None):
+    """Queries Datamuse for the words missing data, starting after the word the last backfill stopped at, and updates
+    the words Datamuse recognizes. Stops after limit words (if not None), or once Datamuse's circuit breaker opens.
+
+    Yields a dict for each batch of words done, holding the number of words in the batch (processed_words) and of
+    updated_words, unrecognized_words and failed_words (words Datamuse could not be queried for), and the id of the last
+    word of the batch (cursor)."""
+    batch_size = batch_size or settings.DATAMUSE_BACKFILL_BATCH_SIZE
+    language = default_language()
+    expired = UnrecognizedWord.objects.expired().delete()[0]
+    if expired:
+        logger.info(f'deleted {expired} expired unrecognized words')
+    cursor = get_cursor(connection)
+    done = 0
+
+    while limit is None or done < limit:
+        size = batch_size if limit is None else min(batch_size, limit - done)
+        batch = list(missing_words(cursor).values_list('id', 'name')[:size])
+        if not batch:
+            # the scan is complete: the next backfill starts from the first word
+            set_cursor(0, connection)
+            return
+
+        names = [name for _, name in batch]
+        # strings Datamuse recently did not recognize need no query
+        known_unrecognized = set(
+            UnrecognizedWord.objects.current().filter(name__in=names, language=language).values_list('name', flat=True)
+        )
+
+        found_words = []
+        new_unrecognized_words = []
+        failed_words = []
+        breaker_open = False
+        queries = [name for name in names if name not in known_unrecognized]
+        for name, result in datamuse_json.query_words(queries, workers):
+            if isinstance(result, CircuitOpenError):
+                breaker_open = True
+                failed_words.append(name)
+            elif isinstance(result, ConnectionError):
+                failed_words.append(name)
+            elif datamuse_json.exact_match(name, result):
+                found_words.append(result[0])
+            else:
+                new_unrecognized_words.append(name)
+
+        if found_words:
+            # update the words in bulk (and the statistics of the WordSets holding them)
+            datamuse_json.bulk_decode_words(found_words)
+            UnrecognizedWord.objects.filter(name__in=[dct['word'] for dct in found_words], language=language).delete()
+        UnrecognizedWord.objects.record(new_unrecognized_words, language)
+
+        if breaker_open:
+            # Datamuse is down: leave the cursor before this batch, so the next backfill starts with its failed words
+            logger.warning(f'Datamuse circuit breaker open, backfill stopped after word id {cursor}')
+            return
+
+        cursor = batch[-1][0]
+        set_cursor(cursor, connection)
+        done += len(batch)
+        yield {
+            'processed_words': len(batch),
+            'updated_words': len(found_words),
+            'unrecognized_words': len(known_unrecognized) + len(new_unrecognized_words),
+            'failed_words': len(failed_words),
+            'cursor': cursor,
+        }
+
+
+def backfill_job(batch_size: int = None, limit: int = None):
+    """RQ job running a backfill (see backfill), with its progress reported in job.meta (see
+    job_progress.ProgressReporter). Returns the number of words updated."""
+    job = get_current_job()
+    progress = job_progress.ProgressReporter(job, 'updated_words', 'unrecognized_words', 'failed_words')
+    total = missing_words(get_cursor()).count()
+    progress.set_total(total if limit is None else min(total, limit))
+    with progress:
+        for counts in backfill(batch_size, limit):
+            progress.add(counts['processed_words'], updated_words=counts['updated_words'],
+                         unrecognized_words=counts['unrecognized_words'], failed_words=counts['failed_words'])
+    return job.meta['updated_words']
@@ -0,0 +1,251 @@
+"""Cache for Datamuse query results, keyed on the normalized query parameters.
+
+query_with_retry checks the cache before querying Datamuse, so a word (or a related-words query) is only looked up again
+once its cached result expires. Results that hold at least one word are kept for
+settings.DATAMUSE_CACHE['POSITIVE_TTL'] seconds; empty results (unrecognized words, relations with no words) for
+settings.DATAMUSE_CACHE['NEGATIVE_TTL'] seconds. Related words queries (rel_*) that return words are not cached:
+their words are saved as WordRelations by every caller (see datamuse_json.add_related_many), which are read instead of
+querying Datamuse again, so only their empty results (which leave no WordRelation) are worth caching.
+
+The results are stored by one of the following backends, chosen by settings.DATAMUSE_CACHE['BACKEND']:
+    'lru':      a dictionary in the memory of the current process
+    'redis':    the Redis server used by django-rq (shared by the web and worker processes)
+    'database': the DatamuseResponse table
+    'none':     no caching
+Each backend holds at most settings.DATAMUSE_CACHE['MAX_ENTRIES'] results, evicting the oldest ones first. The number
+of results, rather than their size, is bounded, so the 'redis' backend is only suitable for a Redis server with room to
+spare besides the RQ queues."""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from words.models import DatamuseResponse
+
+# Get an instance of a logger
+logger = logging.getLogger(__name__)
+
+
+def cache_key(kwargs: dict):
+    """Returns the cache key for a Datamuse query with parameters kwargs.
+
+    Parameter names and string values are lowercased and stripped, so equivalent queries share the same key."""
+    normalized = {
+        key.lower(): value.strip().lower() if isinstance(value, str) else value
+        for key, value in kwargs.items()
+    }
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+def is_related_words_query(kwargs: dict):
+    """Returns True if kwargs are the parameters of a related words query (such as rel_syn)."""
+    return any(key.lower().startswith('rel_') for key in kwargs)
+
+
+class LRUBackend:
+    """Keeps results in an OrderedDict in the memory of the current process, evicting the least recently used."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()     # key: (expiry time, result)
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, result = entry
+            if expires < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return result
+
+    def set(self, key: str, result, ttl: int):
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class RedisBackend:
+    """Keeps results in Redis (with a Redis expiry time). A sorted set of keys, ordered by the time each was stored,
+    is used to evict the oldest results when there are more than max_entries."""
+
+    prefix = 'datamuse_cache:'
+    index_key = 'datamuse_cache_index'
+
+    def __init__(self, max_entries: int, connection=None):
+        self.max_entries = max_entries
+        self._connection = connection
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            # the Redis client used by django-rq
+            from words.views import redis_cursor
+            self._connection = redis_cursor
+        return self._connection
+
+    def get(self, key: str):
+        value = self.connection.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key: str, result, ttl: int):
+        pipeline = self.connection.pipeline()
+        pipeline.set(self.prefix + key, json.dumps(result), ex=ttl)
+        pipeline.zadd(self.index_key, {key: time.time()})
+        pipeline.zcard(self.index_key)
+        size = pipeline.execute()[-1]
+
+        if size > self.max_entries:
+            oldest = self.connection.zrange(self.index_key, 0, size - self.max_entries - 1)
+            pipeline = self.connection.pipeline()
+            pipeline.zrem(self.index_key, *oldest)
+            pipeline.delete(*[self.prefix + old_key.decode() for old_key in oldest])
+            pipeline.execute()
+
+    def clear(self):
+        keys = [self.prefix + key.decode() for key in self.connection.zrange(self.index_key, 0, -1)]
+        self.connection.delete(self.index_key, *keys)
+
+    def __len__(self):
+        return self.connection.zcard(self.index_key)
+
+
+class DatabaseBackend:
+    """Keeps results in the DatamuseResponse table. Expired rows, and the oldest rows when there are more than
+    max_entries, are deleted after every evict_interval results are stored."""
+
+    evict_interval = 100
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.sets = 0
+
+    def get(self, key: str):
+        response = DatamuseResponse.objects.filter(key=key, expires__gt=timezone.now()).first()
+        return None if response is None else response.result
+
+    def set(self, key: str, result, ttl: int):
+        DatamuseResponse.objects.update_or_create(
+            key=key, defaults={'result': result, 'expires': timezone.now() + timedelta(seconds=ttl)}
+        )
+        self.sets += 1
+        if self.sets % self.evict_interval == 0:
+            self.evict()
+
+    def evict(self):
+        DatamuseResponse.objects.filter(expires__lte=timezone.now()).delete()
+        excess = DatamuseResponse.objects.count() - self.max_entries
+        if excess > 0:
+            oldest = DatamuseResponse.objects.order_by('expires').values('key')[:excess]
+            DatamuseResponse.objects.filter(key__in=oldest).delete()
+
+    def clear(self):
+        DatamuseResponse.objects.all().delete()
+
+    def __len__(self):
+        return DatamuseResponse.objects.count()
+
+
+class DatamuseCache:
+    """Cache of Datamuse results with separate TTLs for positive (non-empty) and negative (empty) results.
+
+    Counts cache hits and misses. If the backend is unavailable (for example, Redis is down), the error is logged and
+    the query is treated as a miss, so Datamuse is queried as if there were no cache."""
+
+    def __init__(self, backend, positive_ttl: int, negative_ttl: int):
+        self.backend = backend
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, kwargs: dict):
+        """Returns the cached result for a query with parameters kwargs, or None if there is none."""
+        result = None
+        if self.backend is not None:
+            try:
+                result = self.backend.get(cache_key(kwargs))
+            except (RedisError, DatabaseError) as e:
+                logger.warning(f'Datamuse cache unavailable: {e}')
+
+        with self.lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def set(self, kwargs: dict, result: list):
+        """Stores the result of a query with parameters kwargs."""
+        if self.backend is None:
+            return
+        if result and is_related_words_query(kwargs):
+            # the related words are stored as WordRelations
+            return
+        ttl = self.positive_ttl if result else self.negative_ttl
+        try:
+            self.backend.set(cache_key(kwargs), result, ttl)
+        except (RedisError, DatabaseError) as e:
+            logger.warning(f'Datamuse cache unavailable: {e}')
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns a dict holding the number of hits and misses and the hit rate since the cache was created."""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+backends = {
+    'lru': LRUBackend,
+    'redis': RedisBackend,
+    'database': DatabaseBackend,
+}
+
+
+def create_cache(options: dict):
+    """Returns a DatamuseCache configured by options (a dict in the format of settings.DATAMUSE_CACHE)."""
+    backend_name = options.get('BACKEND', 'database')
+    if backend_name == 'none':
+        backend = None
+    elif backend_name in backends:
+        backend = backends[backend_name](options.get('MAX_ENTRIES', 100000))
+    else:
+        raise ValueError(f'{backend_name} is not a valid Datamuse cache backend.')
+
+    return DatamuseCache(backend, options.get('POSITIVE_TTL', 2592000), options.get('NEGATIVE_TTL', 86400))
+
+
+# the cache used by datamuse_json
+cache = create_cache(settings.DATAMUSE_CACHE)
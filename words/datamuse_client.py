@@ -0,0 +1,96 @@
+"""Client for the Datamuse API (https://www.datamuse.com/api/).
+
+Queries are sent through a single requests.Session, whose connection pool keeps connections to the Datamuse host
+alive between queries, so that a query reuses an open (TLS) connection instead of opening a new one. The pool holds up
+to settings.DATAMUSE_POOL_SIZE connections, enough for the threads of datamuse_json.run_queries to query Datamuse in
+parallel; threads wait for a free connection rather than opening more. Responses are requested gzip compressed.
+
+A Session's connection pool is thread-safe. Datamuse sets no cookies, so the threads do not share any other state
+through the Session."""
+import requests
+from requests.adapters import HTTPAdapter
+
+# parameters of the /words endpoint
+word_params = {
+    'ml', 'sl', 'sp', 'v', 'topics', 'lc', 'rc', 'max', 'md', 'qe',
+    'rel_jja', 'rel_jjb', 'rel_syn', 'rel_trg', 'rel_ant', 'rel_spc', 'rel_gen', 'rel_com', 'rel_par', 'rel_bga',
+    'rel_bgb', 'rel_rhy', 'rel_nry', 'rel_hom', 'rel_cns',
+}
+
+
+class DatamuseResponseError(ValueError):
+    """Exception indicating Datamuse answered a query with an error status or a body that is not json."""
+
+    def __init__(self, message: str, status: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after  # seconds Datamuse asked the client to wait (Retry-After header), if any
+
+
+def is_retryable(error: Exception):
+    """Returns True if a query that failed with error may succeed if it is sent again: timeouts, connection errors,
+    responses cut short, 429 (Too Many Requests) and 5xx errors, and 200 responses whose body is not json. Other error
+    statuses (such as 400 or 404) would be answered the same way again."""
+    if isinstance(error, DatamuseResponseError):
+        return error.status == 429 or not 400 <= error.status < 500
+    return isinstance(error, (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                              requests.exceptions.ContentDecodingError))
+
+
+def retry_after(response: requests.Response):
+    """Returns the number of seconds in the Retry-After header of response, or None if it has none (or holds a
+    date)."""
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+
+class DatamuseClient:
+    """Queries the Datamuse API at api_root, using a pool of up to pool_size keep-alive connections. timeout is the
+    (connect, read) timeout of each request in seconds."""
+
+    def __init__(self, api_root: str = 'https://api.datamuse.com', pool_size: int = 10, timeout: tuple = (3.05, 10),
+                 max_results: int = 100):
+        self.api_root = api_root
+        self.timeout = timeout
+        self.max = max_results
+
+        self.session = requests.Session()
+        # pool_block: threads wait for a connection of the pool rather than opening (and discarding) extra ones
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip', 'Accept': 'application/json'})
+
+    def words(self, **kwargs):
+        """Queries the /words endpoint with the parameters in kwargs (see https://www.datamuse.com/api/) and returns
+        the list of words in the response. Up to self.max words are returned unless kwargs holds max.
+
+        Raises ValueError if a parameter is not valid, DatamuseResponseError (a ValueError) if Datamuse answers with
+        an error, and requests.RequestException if Datamuse could not be reached (see is_retryable)."""
+        for param in kwargs:
+            if param not in word_params:
+                raise ValueError(f'{param} is not a valid parameter for this endpoint.')
+        params = dict(kwargs)
+        params.setdefault('max', self.max)
+        if not 0 < int(params['max']) <= 1000:
+            raise ValueError('Datamuse only supports values of max in (0, 1000]')
+        return self.get('words', params)
+
+    def get(self, endpoint: str, params: dict):
+        """Sends a GET request to endpoint with params and returns the json of the response."""
+        response = self.session.get(f'{self.api_root}/{endpoint}', params=params, timeout=self.timeout)
+        # read the whole body (even of an error), so that the connection goes back to the pool
+        response.content
+        if response.status_code != 200:
+            raise DatamuseResponseError(f'Datamuse answered {response.status_code} {response.reason}',
+                                        response.status_code, retry_after(response))
+        try:
+            return response.json()
+        except ValueError:
+            raise DatamuseResponseError('Datamuse answered with a body that is not json', response.status_code)
+
+    def close(self):
+        """Closes the connections of the pool."""
+        self.session.close()
@@ -1,9 +1,20 @@
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, List
+from urllib.parse import urlparse
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
-
-from words.models import Word, PartOfSpeech
-import datamuse
+from django.db import connections
+from requests import RequestException
+
+from words import datamuse_cache, related_words_cache
+from words.circuit_breaker import CircuitBreaker, CircuitOpenError
+from words.datamuse_client import DatamuseClient, DatamuseResponseError, is_retryable
+from words.models import Word, PartOfSpeech, UnrecognizedWord, WordRelation, WordSetStats, default_language, \
+    is_storable_name
 import json
 import logging
 
@@ -33,8 +44,49 @@ possible_parts_of_speech = [choice[0] for choice in PartOfSpeech.part_choices]
 # Get an instance of a logger
 logger = logging.getLogger(__name__)
 
-# Get a DataMuse instance for making queries through python-datamuse
-api = datamuse.Datamuse()
+# Datamuse client shared by all threads, holding a pool of keep-alive connections (see datamuse_client)
+api = DatamuseClient(settings.DATAMUSE_API_ROOT, pool_size=settings.DATAMUSE_POOL_SIZE,
+                     timeout=(settings.DATAMUSE_CONNECT_TIMEOUT, settings.DATAMUSE_READ_TIMEOUT))
+
+# circuit breaker shared by all processes querying Datamuse, so that they all stop querying it while it is down
+breaker = CircuitBreaker('datamuse', settings.DATAMUSE_CIRCUIT_BREAKER['FAILURES'],
+                         settings.DATAMUSE_CIRCUIT_BREAKER['WINDOW'], settings.DATAMUSE_CIRCUIT_BREAKER['COOLDOWN'])
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces out calls so that no more than rate calls are made per second.
+
+    A rate of 0 or None disables the limit."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        """Block until the caller is allowed to make its call."""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+# one RateLimiter per host, so that all threads querying the same host share the same limit
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(url: str):
+    """Returns the RateLimiter shared by all queries sent to the host in url."""
+    host = urlparse(url).netloc
+    with rate_limiters_lock:
+        if host not in rate_limiters:
+            rate_limiters[host] = RateLimiter(settings.DATAMUSE_RATE_LIMIT)
+        return rate_limiters[host]
 
 
 class DatamuseWordNotRecognizedError(Exception):
@@ -48,17 +100,52 @@ class DatamuseWordNotRecognizedError(Exception):
         self.message = f'word "{word_string}" was not recognized by Datamuse'
 
 
+def backoff_delay(attempt: int, wait: float, retry_after: float = None):
+    """Returns the number of seconds to wait before retrying a query that failed attempt times: a random time of up to
+    wait * 2 ** (attempt - 1) seconds (full jitter, so that the threads and workers whose queries failed together
+    spread out their retries), or retry_after seconds if Datamuse asked for a longer wait, capped at
+    settings.DATAMUSE_BACKOFF_MAX."""
+    delay = random.uniform(0, wait * 2 ** (attempt - 1))
+    if retry_after:
+        delay = max(delay, retry_after)
+    return min(delay, settings.DATAMUSE_BACKOFF_MAX)
+
+
 def query_with_retry(retries: int, wait: float, **kwargs):
-    """Datamuse query with kwargs, retry a certain number of times (wait a number of seconds in between) on failure."""
-    for i in range(0, retries):
+    """Datamuse query with kwargs, tried up to retries times, with exponential backoff starting at wait seconds in
+    between (see backoff_delay).
+
+    Only failures that may not recur are retried (timeouts, connection errors, 429 and 5xx errors, see
+    datamuse_client.is_retryable). Each of them is recorded by the circuit breaker shared by all processes; while the
+    breaker is open, CircuitOpenError (a ConnectionError) is raised without querying Datamuse, so that jobs give up on
+    their queries at once rather than waiting out their retries. Raises ConnectionError if the query failed.
+
+    Returns the cached result if the same query was made recently (see datamuse_cache)."""
+    cached_result = datamuse_cache.cache.get(kwargs)
+    if cached_result is not None:
+        return cached_result
+
+    for attempt in range(1, retries + 1):
+        if not breaker.allow():
+            raise CircuitOpenError('Datamuse service unavailable (circuit breaker open)')
+        if attempt > 1:
+            logger.info(f'trying again: attempt {attempt} of {retries}')
         try:
-            if i > 1:
-                logger.info(f'trying again: attempt {i+1} of {retries}')
+            get_rate_limiter(api.api_root).wait()
             result = api.words(**kwargs)
+        except (DatamuseResponseError, RequestException) as e:
+            if not is_retryable(e):
+                # Datamuse is up, but would answer the query with the same error again
+                breaker.record_success()
+                raise ConnectionError(f'Datamuse query failed: {e}')
+            logger.info(f'Datamuse query failed: {e}')
+            breaker.record_failure()
+            if attempt < retries:
+                time.sleep(backoff_delay(attempt, wait, getattr(e, 'retry_after', None)))
+        else:
+            breaker.record_success()
+            datamuse_cache.cache.set(kwargs, result)
             return result
-        except ValueError:
-            logger.info('Datamuse query failed.')
-            time.sleep(wait)
     # no response after retries exhausted
     raise ConnectionError('Datamuse service unavailable')
 
@@ -91,32 +178,74 @@ def decode_word(dct):
         return word
 
 
-def add_or_update_word(word: str):
-    """Query DataMuse for the parts_of_speech, frequency and definitions of a Word
+def bulk_get_or_create_words(names: Iterable[str]):
+    """Gets or creates a Word for each (lowercase) name in names using a constant number of queries.
 
-    Returns the corresponding Word instance, or None if the query was unsuccessful"""
-    if not word or word.isspace():
-        # exit early if word is empty or only whitespace
-        return None
+    New words are created with datamuse_success=False. Returns a dict mapping each name to its Word."""
+    names = set(names)
+    words = {word.name: word for word in Word.objects.filter(name__in=names)}
 
-    word = word.lower()
+    missing = names - words.keys()
+    if missing:
+        # ignore_conflicts, in case another job created some of these words since the above query
+        language = default_language()
+        Word.objects.bulk_create([Word(name=name, language_id=language) for name in missing], ignore_conflicts=True)
+        words.update((word.name, word) for word in Word.objects.filter(name__in=missing))
 
-    if Word.objects.filter(name=word).exists() and Word.objects.get(name=word).datamuse_success is True:
-        # word already in database and Datamuse call already successfully performed. Skip DataMuse query
-        # logger.debug(f'{word} values already populated from Datamuse')
-        return Word.objects.get(name=word)
+    return words
 
-    # do api query, give up after 5 attempts
-    try:
-        result = query_with_retry(5, 1.0, sp=word, md='dpf', max=1)
-    except ConnectionError as e:
-        logger.error(e)
-        # create word instance with datamuse_success=False and other fields blank, or return the existing instance
-        return Word.objects.get_or_create(name=word)[0]
 
+def bulk_decode_words(dcts: List[dict]):
+    """Bulk version of decode_word: saves the data in a list of json objects (each corresponding to a single word).
+
+    Creates or updates all of the Words, and adds their parts of speech, using a constant number of queries. Returns a
+    dict mapping the name of each word to its Word."""
+    dcts = {dct['word'].lower(): dct for dct in dcts}
+    words = bulk_get_or_create_words(dcts.keys())
+
+    # words that were missing data (including the ones just created, which belong to no WordSet yet)
+    refreshed_ids = [word.id for word in words.values() if not word.datamuse_success]
+
+    parts = []     # (word id, part of speech) pairs
+    for name, dct in dcts.items():
+        word = words[name]
+        word.datamuse_success = True
+        for tag in dct['tags']:
+            if tag in possible_parts_of_speech:
+                parts.append((word.id, tag))
+            elif tag[:2] == 'f:':
+                word.frequency = float(tag[2:])
+        if 'defs' in dct:
+            word.definitions = dct['defs']
+
+    Word.objects.bulk_update(words.values(), ['datamuse_success', 'frequency', 'definitions'])
+
+    if parts:
+        # the PartOfSpeech rows must exist before they can be linked to words
+        PartOfSpeech.objects.bulk_create([PartOfSpeech(name=tag) for tag in {tag for _, tag in parts}],
+                                         ignore_conflicts=True)
+        through = Word.parts_of_speech.through
+        through.objects.bulk_create([through(word_id=word_id, partofspeech_id=tag) for word_id, tag in parts],
+                                    ignore_conflicts=True)
+
+    if refreshed_ids:
+        WordSetStats.objects.refresh_for_words(refreshed_ids)
+
+    return words
+
+
+def exact_match(word: str, result: list):
+    """Returns True if result (from a Datamuse 'sp' query for word) holds an entry that exactly matches word."""
     # check if result is not empty and the entry is a word that exactly matches the parameter
     # todo match result if it is same as word but with - in it? match if plural?
-    if result and result[0]['word'] == word:
+    return bool(result) and result[0]['word'] == word
+
+
+def word_from_result(word: str, result: list):
+    """Fills in a Word from the result of a Datamuse 'sp' query for word.
+
+    Returns the corresponding Word instance, or None if result does not contain an exact match for word."""
+    if exact_match(word, result):
         # convert result to string that json.loads can read
         # result is a list (of size one because api parameter max=1) of json objects holding data concerning the word
         result = json.dumps(result[0])
@@ -130,12 +259,88 @@ def add_or_update_word(word: str):
         return None
 
 
+def add_or_update_word(word: str):
+    """Query DataMuse for the parts_of_speech, frequency and definitions of a Word
+
+    Returns the corresponding Word instance, or None if the query was unsuccessful"""
+    if not word or word.isspace() or not is_storable_name(word):
+        # exit early if word is empty, only whitespace or too long to be a word
+        return None
+
+    word = word.lower()
+
+    existing_word = Word.objects.filter(name=word).first()
+    if existing_word is not None and existing_word.datamuse_success is True:
+        # word already in database and Datamuse call already successfully performed. Skip DataMuse query
+        # logger.debug(f'{word} values already populated from Datamuse')
+        return existing_word
+
+    language = default_language()
+    if UnrecognizedWord.objects.current().filter(name=word, language=language).exists():
+        logger.debug(f'{word} was recently not recognized by Datamuse, skipping Datamuse query')
+        return None
+
+    # do api query, give up after settings.DATAMUSE_ATTEMPTS attempts
+    try:
+        result = query_with_retry(settings.DATAMUSE_ATTEMPTS, settings.DATAMUSE_BACKOFF, sp=word, md='dpf', max=1)
+    except ConnectionError as e:
+        logger.error(e)
+        # create word instance with datamuse_success=False and other fields blank, or return the existing instance
+        return Word.objects.get_or_create(name=word)[0]
+
+    word_instance = word_from_result(word, result)
+    if word_instance is None:
+        UnrecognizedWord.objects.record([word], language)
+    elif existing_word is not None:
+        # the word was missing data, so the statistics of the WordSets holding it are out of date
+        WordSetStats.objects.refresh_for_words([word_instance.id])
+    return word_instance
+
+
+def run_queries(queries: dict, workers: int = None):
+    """Runs Datamuse queries using a pool of worker threads.
+
+    queries maps a key to the kwargs of a Datamuse query. Only the HTTP requests are made in the worker threads;
+    nothing is written to the database. Yields a tuple (key, result) for each query as soon as it completes, where
+    result is the list returned by Datamuse or the ConnectionError raised by query_with_retry if Datamuse could not be
+    reached. The number of threads defaults to settings.DATAMUSE_WORKERS; requests are also limited by the rate limiter
+    for the Datamuse host."""
+    if workers is None:
+        workers = settings.DATAMUSE_WORKERS
+
+    def query(kwargs):
+        try:
+            return query_with_retry(settings.DATAMUSE_ATTEMPTS, settings.DATAMUSE_BACKOFF, **kwargs)
+        except ConnectionError as e:
+            return e
+        finally:
+            # close any database connection opened by this thread (i.e. by the database cache backend)
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(query, kwargs): key for key, kwargs in queries.items()}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # if the caller stops early (or raises), don't run the queries that have not started yet
+            for future in futures:
+                future.cancel()
+
+
+def query_words(words: Iterable[str], workers: int = None):
+    """Query Datamuse for the data of each (lowercase) word in words, using a pool of worker threads (see run_queries).
+
+    Yields a tuple (word, result) for each word as soon as its query completes."""
+    return run_queries({word: {'sp': word, 'md': 'dpf', 'max': 1} for word in words}, workers)
+
+
 def add_related(word: str, code: str):
     """Query DataMuse for the words related to the Word and add the words to the database.
 
      The relationship type used is determined by the argument code, which should be one of the strings
-     in the list relation_codes. Returns the Word corresponding to word and the QuerySet of related words.
-     Returns None if Datamuse does not recognize 'word'."""
+     in the list relation_codes. Returns the Word corresponding to word and the QuerySet of WordRelations holding the
+     related words. Raises DatamuseWordNotRecognizedError if Datamuse does not recognize 'word'."""
     if code not in relation_codes:
         raise ValueError(f'{code} is not a valid related word code.')
     elif not word or word.isspace():
@@ -143,19 +348,16 @@ def add_related(word: str, code: str):
     else:
         # construct string for function call using word and code and use eval() to run it
         word = word.lower()
-        code_param = "rel_" + code  # parameter used by python-datamuse
+        code_param = "rel_" + code  # Datamuse parameter for the relation type
 
         word_instance = add_or_update_word(word)
         if not word_instance:
             raise DatamuseWordNotRecognizedError(word)
 
-        # the related word field for the word
-        word_attr = getattr(word_instance, code)
+        # the WordRelations holding the words related to the word by this relation type
+        relations = WordRelation.objects.filter(source_word=word_instance, code=code)
 
-        # the corresponding set of relationships (relationship being a subclass of models.WordRelation)
-        relations = getattr(word_instance, f'{code}_relations')
-
-        if word_attr.exists():
+        if relations.exists():
             logger.debug(f'related words for word {word} and code {code} already retrieved, skipping Datamuse query')
             return word_instance, relations
 
@@ -163,9 +365,10 @@ def add_related(word: str, code: str):
             code_param: word,
             "md": "dpf"
         }
-        result = query_with_retry(5, 1.0, **kwargs)
+        result = query_with_retry(settings.DATAMUSE_ATTEMPTS, settings.DATAMUSE_BACKOFF, **kwargs)
 
         if result:
+            new_relations = []
             for item in result:
                 # get the word's score value (it's relevance compared to other words in the query)
                 score = item.get('score', 0)
@@ -177,8 +380,74 @@ def add_related(word: str, code: str):
                 related_word = json.loads(item, object_hook=decode_word)
                 logger.debug(f'word: {word}, code: {code}, related word: {related_word.name}, score: {score}')
 
-                # add this Word to the appropriate field of word_instance
-                word_attr.add(related_word, through_defaults={'score': score})
+                new_relations.append(
+                    WordRelation(source_word=word_instance, related_word=related_word, code=code, score=score)
+                )
+
+            # add the related words to word_instance in a single query
+            WordRelation.objects.bulk_create(new_relations, ignore_conflicts=True)
+            # the charts cached for the word are out of date
+            related_words_cache.cache.invalidate([word])
 
-        # returns an instance for word and the field word_instance.code (which holds the related words)
+        # returns an instance for word and the WordRelations holding the related words
         return word_instance, relations
+
+
+def add_related_many(word: str, codes: List[str], workers: int = None):
+    """Batch version of add_related: gets the words related to word for each relation type in codes.
+
+    Datamuse is only queried for the relation types that have no related words stored yet, and those queries are run
+    concurrently (see run_queries). The related words are saved and then loaded back, with their WordRelations, using a
+    constant number of queries. Returns the Word corresponding to word and a dict mapping each code with related words
+    to a list of its WordRelations (with related_word selected), in order of score.
+
+    Raises DatamuseWordNotRecognizedError if Datamuse does not recognize 'word', and ConnectionError (after saving the
+    results of the other queries) if Datamuse could not be reached for some of the relation types."""
+    for code in codes:
+        if code not in relation_codes:
+            raise ValueError(f'{code} is not a valid related word code.')
+    if not word or word.isspace():
+        raise ValueError(f"Parameter 'word={word}' is None or whitespace.")
+
+    word = word.lower()
+    word_instance = add_or_update_word(word)
+    if not word_instance:
+        raise DatamuseWordNotRecognizedError(word)
+
+    stored_codes = set(
+        WordRelation.objects.filter(source_word=word_instance, code__in=codes).values_list('code', flat=True).distinct()
+    )
+    queries = {code: {f'rel_{code}': word, 'md': 'dpf'} for code in codes if code not in stored_codes}
+    if queries:
+        logger.debug(f'querying Datamuse for words related to {word} by {list(queries)}')
+
+    results = {}
+    failed_codes = []
+    for code, result in run_queries(queries, workers):
+        if isinstance(result, ConnectionError):
+            logger.error(result)
+            failed_codes.append(code)
+        elif result:
+            results[code] = result
+
+    if results:
+        # save every related word, then every relation, in bulk
+        related_words = bulk_decode_words([item for result in results.values() for item in result])
+        WordRelation.objects.bulk_create(
+            [WordRelation(source_word=word_instance, related_word=related_words[item['word'].lower()], code=code,
+                          score=item.get('score', 0))
+             for code, result in results.items() for item in result],
+            ignore_conflicts=True
+        )
+        # the charts cached for the word are out of date
+        related_words_cache.cache.invalidate([word])
+
+    if failed_codes:
+        raise ConnectionError('Datamuse service unavailable')
+
+    relations_by_code = {}
+    for relation in WordRelation.objects.filter(source_word=word_instance, code__in=codes)\
+            .select_related('related_word').order_by('code', '-score'):
+        relations_by_code.setdefault(relation.code, []).append(relation)
+
+    return word_instance, relations_by_code
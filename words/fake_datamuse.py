@@ -0,0 +1,201 @@
+"""A local stand-in for the Datamuse API, used for benchmarks and load tests.
+
+The server answers GET requests to /words the way Datamuse would. Without a corpus, 'sp' queries return a single entry
+for any word made of letters (and nothing for anything else), and rel_[code] queries return a few related words derived
+from the query word. With a corpus (see load_corpus), only the words in the corpus are recognized and rel_[code] queries
+return the related words listed in the corpus. The md parameter selects which metadata (d: definitions, p: parts of
+speech, f: frequency) is included in each entry.
+
+Each response is delayed by a configurable latency to approximate the round-trip time to the real service. A fraction
+of requests (error_rate) can be answered with a 500 error, and requests beyond rate_limit per second with a 429
+error. Connections are kept alive between requests, and responses are gzip compressed for clients that accept it; the
+server counts the requests and connections it receives, so benchmarks can measure connection reuse."""
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# corpus shipped with the app for load tests
+default_corpus_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'datamuse_corpus.json')
+
+
+def load_corpus(path: str = default_corpus_path):
+    """Loads a corpus from a json file holding two objects: "words", mapping each word to its "tags" and "defs" (as
+    returned by Datamuse with md=dpf), and "relations", mapping each word to a mapping of relation codes to lists of
+    related words."""
+    with open(path, encoding='utf8') as corpus_file:
+        return json.load(corpus_file)
+
+
+def word_entry(word: str, score: int = 1000, data: dict = None, md: str = 'dpf'):
+    """Returns the json object Datamuse would return for word, including the metadata selected by md.
+
+    data holds the "tags" and "defs" of word; if it is None, made-up data is used."""
+    if data is None:
+        data = {
+            "tags": ["n", f"f:{len(word):.6f}"],
+            "defs": [f"n\ta made-up definition of {word}"],
+        }
+
+    entry = {"word": word, "score": score}
+    tags = [tag for tag in data.get("tags", [])
+            if ('f' in md and tag.startswith('f:')) or ('p' in md and not tag.startswith('f:'))]
+    if tags:
+        entry["tags"] = tags
+    if 'd' in md and data.get("defs"):
+        entry["defs"] = data["defs"]
+    return entry
+
+
+class FakeDatamuseHandler(BaseHTTPRequestHandler):
+    """Request handler for FakeDatamuseServer."""
+
+    # HTTP/1.1 so that clients can keep connections alive between requests
+    protocol_version = 'HTTP/1.1'
+
+    # the headers and body of a response are written separately; without TCP_NODELAY, the body of each response on a
+    # kept-alive connection waits for the client to acknowledge the headers (40 ms with delayed acknowledgements)
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # a handler is created for each connection, and handles all of the requests sent on it
+        super().setup()
+        self.server.count_connection()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.count_request()
+
+        if url.path != '/words':
+            self.send_json(404, {"error": "not found"})
+            return
+
+        time.sleep(self.server.latency)
+
+        if not self.server.allow_request():
+            self.send_text(429, 'Too Many Requests')
+            return
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.send_text(500, 'Internal Server Error')
+            return
+
+        md = params.get('md', '')
+        if 'sp' in params:
+            result = self.server.spelled_like(params['sp'], md)
+        else:
+            code, word = next(((key[4:], value) for key, value in params.items() if key.startswith('rel_')),
+                              (None, None))
+            result = self.server.related(word, code, md) if word else []
+
+        max_results = int(params.get('max', 100))
+        self.send_json(200, result[:max_results])
+
+    def send_json(self, status, data):
+        self.send_body(status, 'application/json', json.dumps(data).encode())
+
+    def send_text(self, status, text):
+        self.send_body(status, 'text/plain', text.encode())
+
+    def send_body(self, status, content_type, body):
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_response(status)
+            self.send_header('Content-Encoding', 'gzip')
+        else:
+            self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # don't write a line to stderr for every request
+        pass
+
+
+class FakeDatamuseServer(ThreadingHTTPServer):
+    """Threaded HTTP server imitating Datamuse. Use as a context manager to run it in a background thread:
+
+        with FakeDatamuseServer(latency=0.05) as server:
+            datamuse_json.api.api_root = server.url
+    """
+    daemon_threads = True
+
+    # accept many simultaneous connections (the default backlog of 5 would stall clients with many threads)
+    request_queue_size = 128
+
+    def __init__(self, latency: float = 0.05, host: str = '127.0.0.1', port: int = 0, corpus: dict = None,
+                 error_rate: float = 0.0, rate_limit: float = 0):
+        super().__init__((host, port), FakeDatamuseHandler)
+        self.latency = latency
+        self.corpus = corpus
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.thread = None
+
+        self.lock = threading.Lock()
+        self.requests = 0   # number of requests received
+        self.connections = 0    # number of connections opened by clients
+        self.rejected = 0   # number of requests answered with 429 because of the rate limit
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def count_connection(self):
+        with self.lock:
+            self.connections += 1
+
+    def allow_request(self):
+        """Returns False if more than rate_limit requests have been allowed in the current one second window."""
+        if not self.rate_limit:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start = now
+                self.window_requests = 0
+            if self.window_requests >= self.rate_limit:
+                self.rejected += 1
+                return False
+            self.window_requests += 1
+            return True
+
+    def spelled_like(self, word: str, md: str):
+        """Result of an 'sp' query for word."""
+        word = word.lower()
+        if self.corpus is None:
+            return [word_entry(word, md=md)] if word.isalpha() else []
+        data = self.corpus['words'].get(word)
+        return [word_entry(word, data=data, md=md)] if data is not None else []
+
+    def related(self, word: str, code: str, md: str):
+        """Result of a rel_[code] query for word."""
+        word = word.lower()
+        if self.corpus is None:
+            return [word_entry(f'{word}{code}{i}', score=1000 - i, md=md) for i in range(5)]
+        related_words = self.corpus['relations'].get(word, {}).get(code, [])
+        return [word_entry(related_word, score=1000 - i, data=self.corpus['words'].get(related_word), md=md)
+                for i, related_word in enumerate(related_words)]
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
@@ -1 +1,462 @@
-import loggingimport refrom typing import Listimport magicfrom crispy_forms.helper import FormHelperfrom crispy_forms.layout import Layout, Row, Column, Div, Submitfrom django import formsfrom django.core.exceptions import ValidationErrorfrom django.forms import Textareafrom string import punctuationfrom rq.job import Job, get_current_jobfrom words import datamuse_jsonfrom words.models import Word, WordSet# Get an instance of a loggerlogger = logging.getLogger(__name__)# tuple holding word relationship codes and their verbose namesrelations = tuple(    (relation_code, Word._meta.get_field(relation_code).verbose_name) for relation_code in datamuse_json.relation_codes)class WordCharField(forms.CharField):    """Custom CharField that treats each line from the Widget as a separate string and returns a list"""    widget = Textarea    def to_python(self, value):        if not value:            return []        else:            # an HTML line break in an input fields is CR LF            # todo allow phrases surrounded by ""            return value.split('\r\n')class WordFileField(forms.FileField):    """File field that accepts text files and splits the text at whitespace, returning an array of strings    Detects and removes punctuation so that, for example, prose works can be uploaded to form a set of words."""    def to_python(self, data):        result = []        if data:            # only accept files of 10 mb or less            if data.size > 10000000:                raise ValidationError("Uploaded file is to large; file size cannot exceed 10 mb.")            # confirm that file is plain text, raise error if it is not            file_type = magic.from_buffer(data.read(), mime=True)            if file_type != "text/plain":                raise ValidationError("Uploaded file is not a plain text file.")            # punctuation characters (excluding -) escaped for regular expressions            p = re.escape(punctuation[:12] + punctuation[13:])            # string for splitting data into words. splits input at:            #   one or more characters that are whitespace or punctuation (excluding the - character)            #   or the em-dash, '--', and any surrounding non-word characters            #   or the dash -, only when it is surrounded by non-word characters, so that hyphenated words are not split            pattern_string = f'[{p}\s]+' \                             '|' '\W*\\-\\-\W*' \                             '|' '(?<=\W)\\-(?=\W)'            # regex pattern from above string            pattern = re.compile(pattern_string)            for line in data:                # decode text using utf8. error handler "backslashreplace" replaces unrecognized characters with the                # equivalent numeric escape sequence rather than throwing UnicodeDecodeError like the default error                # handler would.                array = pattern.split(line.decode(errors='backslashreplace'))                array = list(filter(None, array))                result.extend(array)        return resultdef wordset_form_process(wordset: WordSet, commit=True, *args: List[str]):    """Helper for WordSetCreateForm save method. Adds words from the form to the new WordSet.    Arguments: wordset, a WordSet; args, one or more lists of strings. Adds a Word corresponding to each string in    the list(s) to the WordSet and sets the occurrences (in the Membership shared by the WordSet and the Word) to the    number of times the string occurs across all of the lists."""    detected_words = dict()    job = get_current_job()    job.meta['potential_words'] = 0    # number of possible words contained in the lists passed to the function    job.meta['processed_words'] = 0   # number of possible words processed by this function    job.meta['recognized_words'] = 0  # number of words that Datamuse recognizes    job.save_meta()    # get words and occurrences from each list    for word_list in args:        for word in word_list:            if word not in detected_words:                detected_words[word] = 1            else:                detected_words[word] += 1    potential_words = len(detected_words)    job.meta['potential_words'] = potential_words    job.save_meta()    processed_words = 0    recognized_words = 0    # get or create each word instance and add to WordSet with the number of occurrences    for word, count in detected_words.items():        word_instance = datamuse_json.add_or_update_word(word)        if word_instance:  # word is a valid word according to DataMuse            recognized_words += 1            wordset.words.add(word_instance, through_defaults={'occurrences': count})        else:            # add the word followed by a line break to unrecognized_words field, so that each unrecognized word appears            # on its own line when the field is displayed to the user.            wordset.unrecognized_words = wordset.unrecognized_words + f'{word}<br>'        processed_words += 1        job.meta['processed_words'] = processed_words        job.meta['recognized_words'] = recognized_words        job.save_meta()    if commit:        wordset.save()    return wordsetclass WordSetCreateForm(forms.ModelForm):    """Form to create a WordSet"""    # Field allows user to type one word or phrase (to be added to the new WordSet) per line in the Textarea    words = WordCharField(strip=False, required=False,                          help_text="(Optional) Type the words to include in the set (one word or phrase per line)")    # Field allows user to upload a text file containing words to include in the set    text_file = WordFileField(required=False,                              help_text="(Optional) Upload a text file containing words (multiple words per line) "                                        "to include in the set. The text is split into individual words (no "                                        "phrases will be detected). Punctuation (apart from hyphens) will be ignored.")    class Meta:        model = WordSet        fields = ['name', 'description', 'creator']        widgets = {            # hide creator field; field needed so validation occurs for 'unique_wordset_name_per_creator' constraint            'creator': forms.HiddenInput(),        }    def save(self, commit=True):        logger.debug('WordSetCreateForm save start')        from words.views import rq_queue        # do initial save of new wordset        instance = super(WordSetCreateForm, self).save(commit=commit)        # create and enqueue django-rq task to process words from form fields        job = Job.create(func=wordset_form_process,                         args=(instance, commit, self.cleaned_data['words'], self.cleaned_data['text_file']),                         connection=rq_queue.connection,                         ttl=-1,                         description=instance.name,                         timeout='1h',                         id=self.job_id                         )        rq_queue.enqueue_job(job)        logger.debug('WordSetCreateForm save end')        return instance    def __init__(self, *args, **kwargs):        # get current user        self.user = kwargs.pop('user', None)        # get job_id to use when creating a django-rq job        self.job_id = kwargs.pop('job_id', None)        super(WordSetCreateForm, self).__init__(*args, **kwargs)        if self.user and self.user.is_authenticated:            logger.debug(f'self.user: {self.user}')            self.fields['creator'].initial = self.user  # set creator to current user        else:            # no authenticated user, set creator field to blank            logger.debug("self.user is AnonymousUser or None")            self.fields['creator'].initial = ''        # control rendering using django-crispy-forms        self.helper = FormHelper()        self.helper.layout = Layout(            Row(                Column('name', css_class='form-group col-md-4'),            ),            Row(                Column('description', css_class='form-group col-md-6'),            ),            Row(                Column('words', css_class='form-group col-md-6'),            ),            'text_file',        )class RelatedWordsForm(forms.Form):    """Form to input a word and send a DataMuse Query"""    word = forms.CharField()    relations = forms.MultipleChoiceField(        choices=relations,        widget=forms.CheckboxSelectMultiple()    )    def clean(self):        super().clean()        if 'relations' not in self.cleaned_data:            raise ValidationError('Please check at least one relation.')        return self.cleaned_dataclass WordSetChoice(forms.Form):    """Form to select a WordSet out of the existing WordSets."""    word_set = forms.ModelChoiceField(queryset=WordSet.objects.all(), widget=forms.Select)    frequency_gt = forms.DecimalField(widget=forms.TextInput(attrs={'size': 6}), required=False,                                      label="Only show words with frequency greater than")    frequency_lt = forms.DecimalField(widget=forms.TextInput(attrs={'size': 6}), required=False,                                      label="Only show words with frequency less than")    def clean(self):        cleaned_data = super().clean()        frequency_gt = cleaned_data.get("frequency_gt")        frequency_lt = cleaned_data.get("frequency_lt")        if frequency_gt and frequency_lt:            # Only do something if both fields are valid so far.            if frequency_gt > frequency_lt:                raise forms.ValidationError(                    "frequency less than field must be greater than frequency greater than field")class ScatterplotWordSetChoice(WordSetChoice):    """Adds fields for limiting the displayed words by an upper or lower limit on word occurrences."""    occurrences_gt = forms.IntegerField(widget=forms.TextInput(attrs={'size': 6}), required=False,                                        label="Only show words with occurrences greater than")    occurrences_lt = forms.IntegerField(widget=forms.TextInput(attrs={'size': 6}), required=False,                                        label="Only show words with occurrences less than")    def __init__(self, *args, **kwargs):        super(ScatterplotWordSetChoice, self).__init__(*args, **kwargs)        # control rendering using django-crispy-forms        self.helper = FormHelper()        self.helper.form_class = 'form-horizontal'        self.helper.form_method = 'post'        self.helper.add_input(Submit('submit', 'Submit', css_class='button'))        self.helper.layout = Layout(            Div(                Div('word_set', css_class='col-lg-12 col-md-12 col-sm-12 col-xs-12'),                css_class='form-group'            ),            Div(                Div('frequency_gt', css_class='col-lg-5 col-md-5'),                Div('frequency_lt', css_class='col-lg-5 col-md-5'),                css_class='form-group'            ),            Div(                Div('occurrences_gt', css_class='col-lg-5 col-md-5'),                Div('occurrences_lt', css_class='col-lg-5 col-md-5'),                css_class='form-group'            ),        )    def clean(self):        super().clean()        occurrences_gt = self.cleaned_data.get("occurrences_gt")        occurrences_lt = self.cleaned_data.get("occurrences_lt")        if occurrences_gt and occurrences_lt:            # Only do something if both fields are valid so far.            if occurrences_gt > occurrences_lt:                raise forms.ValidationError(                    "occurrences less than field must be greater than occurrences greater than field")
\ No newline at end of file
+import logging
+import re
+import uuid
+from collections import Counter
+from typing import List, Iterable, Mapping, Union
+
+import magic
+
+from crispy_forms.helper import FormHelper
+from crispy_forms.layout import Layout, Row, Column, Div, Submit
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.forms import Textarea
+from string import punctuation
+
+from words import chart_data, datamuse_json, job_checkpoint, job_progress, pagination, upload_spool
+from words.models import Word, WordSet, Membership, UnrecognizedWord, WordSetStats, default_language, \
+    is_storable_name, relation_verbose_names
+
+# Get an instance of a logger
+logger = logging.getLogger(__name__)
+
+# tuple holding word relationship codes and their verbose names
+relations = tuple(
+    (relation_code, relation_verbose_names[relation_code]) for relation_code in datamuse_json.relation_codes
+)
+
+
+class WordCharField(forms.CharField):
+    """Custom CharField that treats each line from the Widget as a separate string and returns a list"""
+
+    widget = Textarea
+
+    def to_python(self, value):
+        if not value:
+            return []
+        else:
+            # an HTML line break in an input fields is CR LF
+            # todo allow phrases surrounded by ""
+            return value.split('\r\n')
+
+
+# punctuation characters (excluding -) escaped for regular expressions
+escaped_punctuation = re.escape(punctuation[:12] + punctuation[13:])
+
+# regex pattern for splitting text into words. splits input at:
+#   one or more characters that are whitespace or punctuation (excluding the - character)
+#   or the em-dash, '--', and any surrounding non-word characters
+#   or the dash -, only when it is surrounded by non-word characters, so that hyphenated words are not split
+word_separator = re.compile(f'[{escaped_punctuation}\s]+'
+                            '|' '\W*\-\-\W*'
+                            '|' '(?<=\W)\-(?=\W)')
+
+
+def tokenize(lines: Iterable[bytes]):
+    """Generator that yields the words in lines (an iterable of lines of utf8 encoded text, such as a file) one at a
+    time, so the text never has to be held in memory all at once."""
+    for line in lines:
+        # decode text using utf8. error handler "backslashreplace" replaces unrecognized characters with the
+        # equivalent numeric escape sequence rather than throwing UnicodeDecodeError like the default error
+        # handler would.
+        for word in word_separator.split(line.decode(errors='backslashreplace')):
+            if word:
+                yield word
+
+
+class WordFileField(forms.FileField):
+    """File field that accepts text files and splits the text at whitespace, returning a Counter of the words
+
+    Detects and removes punctuation so that, for example, prose works can be uploaded to form a set of words. The file
+    is read one line at a time, and the result holds each distinct word once (with its number of occurrences)."""
+
+    # number of bytes at the start of the file used to detect the file type
+    sniff_size = 4096
+
+    def to_python(self, data):
+        result = Counter()
+        if data:
+            # only accept files of 10 mb or less
+            if data.size > 10000000:
+                raise ValidationError("Uploaded file is to large; file size cannot exceed 10 mb.")
+
+            # confirm that file is plain text, raise error if it is not
+            file_type = magic.from_buffer(data.read(self.sniff_size), mime=True)
+            if file_type != "text/plain":
+                raise ValidationError("Uploaded file is not a plain text file.")
+            data.seek(0)
+
+            result.update(tokenize(data))
+
+        return result
+
+
+def chunks(items: list, size: int):
+    """Yields successive lists of (at most) size items from the list items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def count_words(*args: Union[List[str], Mapping[str, int], upload_spool.SpooledUpload]):
+    """Returns a dict mapping each word in args (lists of strings, mappings of strings to their number of occurrences
+    or SpooledUploads) to its number of occurrences across all of the args. Words are lowercased, so case is ignored
+    when counting."""
+    detected_words = dict()
+    for word_counts in args:
+        if not isinstance(word_counts, (Mapping, upload_spool.SpooledUpload)):
+            word_counts = Counter(word_counts)
+        for word, count in word_counts.items():
+            word = word.lower()
+            if word not in detected_words:
+                detected_words[word] = count
+            else:
+                detected_words[word] += count
+    return detected_words
+
+
+def add_words(wordset: WordSet, detected_words: Mapping[str, int], progress: job_progress.ProgressReporter,
+              checkpoint: job_checkpoint.JobCheckpoint):
+    """Adds a Word for each string in detected_words (a mapping of lowercase strings to their number of occurrences)
+    to wordset, with the occurrences set in their Membership, and returns the list of strings that are not words.
+
+    Datamuse is queried for several words at once (see datamuse_json.query_words); the number of parallel queries is
+    set by settings.DATAMUSE_WORKERS. Words are saved in batches of settings.WORDSET_CHUNK_SIZE, so the number of
+    database queries grows with the number of batches rather than the number of words. Each word processed is added to
+    progress, along with its recognized_words and skipped_lookups counters.
+
+    Words that are not words are added to checkpoint as each batch is saved. Words already in wordset or in checkpoint
+    (processed by an earlier run of the job that did not finish) are skipped."""
+    unrecognized_words = []
+    language = default_language()
+
+    def add_to_wordset(words: dict):
+        """Adds each Word in the dict words (which maps word names to Words) to wordset in a single query."""
+        Membership.objects.bulk_create(
+            [Membership(wordset=wordset, word=word, word_name=name, occurrences=detected_words[name])
+             for name, word in words.items()],
+            ignore_conflicts=True
+        )
+
+    # words already in the wordset or the checkpoint were processed by an earlier run of this job that did not finish
+    members = set(wordset.words.values_list('name', flat=True))
+    checkpointed = checkpoint.words()
+
+    # strings that are empty, only whitespace or too long to be stored are not words
+    candidate_words = []
+    for word in detected_words:
+        if not word or word.isspace() or not is_storable_name(word):
+            unrecognized_words.append(word)
+            progress.add(1)
+        elif word in checkpointed:
+            unrecognized_words.append(word)
+        elif word not in members:
+            candidate_words.append(word)
+    resumed_words = len(detected_words.keys() & members)
+    resumed_unrecognized_words = len(detected_words.keys() & checkpointed)
+    if resumed_words or resumed_unrecognized_words:
+        progress.add(resumed_words + resumed_unrecognized_words, timed=False, recognized_words=resumed_words)
+
+    # words already in the database with data from Datamuse, and strings Datamuse recently did not recognize, need no
+    # Datamuse query
+    words_to_query = []
+    for chunk in chunks(candidate_words, settings.WORDSET_CHUNK_SIZE):
+        known_words = {word.name: word for word in Word.objects.filter(name__in=chunk, datamuse_success=True)}
+        add_to_wordset(known_words)
+
+        known_unrecognized = set(
+            UnrecognizedWord.objects.current().filter(name__in=chunk, language=language).values_list('name', flat=True)
+        ) - known_words.keys()
+        unrecognized_words.extend(word for word in chunk if word in known_unrecognized)
+        checkpoint.add(known_unrecognized)
+
+        words_to_query.extend(word for word in chunk if word not in known_words and word not in known_unrecognized)
+        progress.add(len(known_words) + len(known_unrecognized), recognized_words=len(known_words),
+                     skipped_lookups=len(known_unrecognized))
+
+    # query Datamuse for the remaining words in parallel, saving the results in batches as they arrive
+    found_words = []    # json objects from Datamuse for recognized words
+    failed_words = []   # words for which Datamuse could not be reached
+    new_unrecognized_words = []     # words Datamuse did not recognize
+
+    def save_results():
+        if found_words:
+            # remove any expired entries for words that Datamuse now recognizes
+            UnrecognizedWord.objects.filter(name__in=[dct['word'] for dct in found_words], language=language).delete()
+        words = datamuse_json.bulk_decode_words(found_words)
+        # words Datamuse did not respond for are saved with datamuse_success=False and other fields blank
+        words.update(datamuse_json.bulk_get_or_create_words(failed_words))
+        add_to_wordset(words)
+        UnrecognizedWord.objects.record(new_unrecognized_words, language)
+        checkpoint.add(new_unrecognized_words)
+        found_words.clear()
+        failed_words.clear()
+        new_unrecognized_words.clear()
+
+    for word, result in datamuse_json.query_words(words_to_query):
+        if isinstance(result, ConnectionError):
+            logger.error(result)
+            failed_words.append(word)
+            progress.add(1, recognized_words=1)
+        elif datamuse_json.exact_match(word, result):
+            found_words.append(result[0])
+            progress.add(1, recognized_words=1)
+        else:
+            logger.info(f'{word} not found by Datamuse')
+            unrecognized_words.append(word)
+            new_unrecognized_words.append(word)
+            progress.add(1)
+
+        if len(found_words) + len(failed_words) + len(new_unrecognized_words) >= settings.WORDSET_CHUNK_SIZE:
+            save_results()
+    save_results()
+
+    return unrecognized_words
+
+
+def complete_wordset(wordset: WordSet, commit: bool, unrecognized_words: List[str]):
+    """Records unrecognized_words in wordset, saves wordset (if commit) and writes its statistics (see WordSetStats).
+    Called once all of the words of a new WordSet have been added."""
+    # add each unrecognized word followed by a line break to unrecognized_words field, so that each unrecognized word
+    # appears on its own line when the field is displayed to the user.
+    wordset.unrecognized_words = wordset.unrecognized_words + ''.join(f'{word}<br>' for word in unrecognized_words)
+
+    if commit:
+        wordset.save()
+    WordSetStats.objects.refresh(wordset)
+
+
+class WordSetCreateForm(forms.ModelForm):
+    """Form to create a WordSet"""
+
+    # Field allows user to type one word or phrase (to be added to the new WordSet) per line in the Textarea
+    words = WordCharField(strip=False, required=False,
+                          help_text="(Optional) Type the words to include in the set (one word or phrase per line)")
+
+    # Field allows user to upload a text file containing words to include in the set
+    text_file = WordFileField(required=False,
+                              help_text="(Optional) Upload a text file containing words (multiple words per line) "
+                                        "to include in the set. The text is split into individual words (no "
+                                        "phrases will be detected). Punctuation (apart from hyphens) will be ignored.")
+
+    class Meta:
+        model = WordSet
+        fields = ['name', 'description', 'creator']
+
+        widgets = {
+            # hide creator field; field needed so validation occurs for 'unique_wordset_name_per_creator' constraint
+            'creator': forms.HiddenInput(),
+        }
+
+    def save(self, commit=True):
+        logger.debug('WordSetCreateForm save start')
+
+        from words import wordset_build
+        from words.views import rq_queue
+
+        # do initial save of new wordset
+        instance = super(WordSetCreateForm, self).save(commit=commit)
+
+        # pages follow the progress of the jobs that add the words with job_id
+        if self.job_id is None:
+            self.job_id = str(uuid.uuid4())
+
+        # reduce the words from both form fields to a single Counter and spool it under the id of the job that splits
+        # the words between shard jobs, so that the jobs hold only a reference to the words rather than the words
+        # themselves
+        word_counts = Counter(word.lower() for word in self.cleaned_data['words'])
+        for word, count in self.cleaned_data['text_file'].items():
+            word_counts[word.lower()] += count
+        upload_spool.spool.write(wordset_build.coordinator_id(self.job_id), word_counts)
+
+        # create and enqueue the django-rq jobs that add the words to the WordSet (see wordset_build)
+        wordset_build.enqueue(rq_queue, instance, commit, self.job_id)
+
+        logger.debug('WordSetCreateForm save end')
+
+        return instance
+
+    def __init__(self, *args, **kwargs):
+        # get current user
+        self.user = kwargs.pop('user', None)
+
+        # get job_id to use when creating a django-rq job
+        self.job_id = kwargs.pop('job_id', None)
+
+        super(WordSetCreateForm, self).__init__(*args, **kwargs)
+        if self.user and self.user.is_authenticated:
+            logger.debug(f'self.user: {self.user}')
+            self.fields['creator'].initial = self.user  # set creator to current user
+        else:
+            # no authenticated user, set creator field to blank
+            logger.debug("self.user is AnonymousUser or None")
+            self.fields['creator'].initial = ''
+
+        # control rendering using django-crispy-forms
+        self.helper = FormHelper()
+        self.helper.layout = Layout(
+            Row(
+                Column('name', css_class='form-group col-md-4'),
+            ),
+            Row(
+                Column('description', css_class='form-group col-md-6'),
+            ),
+            Row(
+                Column('words', css_class='form-group col-md-6'),
+            ),
+            'text_file',
+        )
+
+
+class RelatedWordsForm(forms.Form):
+    """Form to input a word and send a DataMuse Query"""
+    word = forms.CharField()
+    relations = forms.MultipleChoiceField(
+        choices=relations,
+        widget=forms.CheckboxSelectMultiple()
+    )
+    depth = forms.IntegerField(
+        min_value=1, max_value=settings.RELATED_WORDS_GRAPH_MAX_DEPTH, initial=1, required=False, label='Levels',
+        widget=forms.NumberInput(attrs={'size': 2}),
+        help_text='with more than one level, the chart branches out through the related words of each related word '
+                  '(for a single relation)'
+    )
+
+    def clean(self):
+        super().clean()
+        if 'relations' not in self.cleaned_data:
+            raise ValidationError('Please check at least one relation.')
+        if (self.cleaned_data.get('depth') or 1) > 1 and len(self.cleaned_data['relations']) > 1:
+            raise ValidationError('Please check a single relation to display more than one level.')
+        return self.cleaned_data
+
+
+class WordSetChoice(forms.Form):
+    """Form to select a WordSet out of the existing WordSets."""
+
+    word_set = forms.ModelChoiceField(queryset=WordSet.objects.all(), widget=forms.Select)
+
+    frequency_gt = forms.DecimalField(widget=forms.TextInput(attrs={'size': 6}), required=False,
+                                      label="Only show words with frequency greater than")
+    frequency_lt = forms.DecimalField(widget=forms.TextInput(attrs={'size': 6}), required=False,
+                                      label="Only show words with frequency less than")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        frequency_gt = cleaned_data.get("frequency_gt")
+        frequency_lt = cleaned_data.get("frequency_lt")
+
+        if frequency_gt and frequency_lt:
+            # Only do something if both fields are valid so far.
+            if frequency_gt > frequency_lt:
+                raise forms.ValidationError(
+                    "frequency less than field must be greater than frequency greater than field")
+
+
+class FrequencyChartQuery(forms.Form):
+    """Validates the query string of the frequency bubble chart data endpoint (see chart_data.frequency_page)."""
+    frequency_gt = forms.DecimalField(required=False)
+    frequency_lt = forms.DecimalField(required=False)
+    limit = forms.IntegerField(required=False, min_value=1, max_value=settings.FREQUENCY_CHART_MAX_PAGE_SIZE)
+    cursor = forms.CharField(required=False)
+
+    def clean_limit(self):
+        return self.cleaned_data['limit'] or settings.FREQUENCY_CHART_PAGE_SIZE
+
+    def clean_cursor(self):
+        cursor = self.cleaned_data['cursor'] or None
+        if cursor is not None:
+            try:
+                chart_data.decode_cursor(cursor)
+            except ValueError as e:
+                raise ValidationError(str(e))
+        return cursor
+
+    def clean(self):
+        cleaned_data = super().clean()
+        frequency_gt = cleaned_data.get("frequency_gt")
+        frequency_lt = cleaned_data.get("frequency_lt")
+
+        if frequency_gt is not None and frequency_lt is not None and frequency_gt > frequency_lt:
+            raise forms.ValidationError(
+                "frequency less than field must be greater than frequency greater than field")
+
+
+class WordTableQuery(forms.Form):
+    """Validates the query string of the endpoint serving pages of the word table of a WordSet (see
+    pagination.membership_page)."""
+    limit = forms.IntegerField(required=False, min_value=1, max_value=settings.WORDSET_TABLE_MAX_PAGE_SIZE)
+    cursor = forms.CharField(required=False)
+
+    def clean_limit(self):
+        return self.cleaned_data['limit'] or settings.WORDSET_TABLE_PAGE_SIZE
+
+    def clean_cursor(self):
+        cursor = self.cleaned_data['cursor'] or None
+        if cursor is not None:
+            try:
+                pagination.decode_membership_cursor(cursor)
+            except ValueError as e:
+                raise ValidationError(str(e))
+        return cursor
+
+
+class ScatterplotQuery(forms.Form):
+    """Validates the query string of the scatterplot data endpoint (see chart_data.scatterplot_data)."""
+    frequency_gt = forms.DecimalField(required=False)
+    frequency_lt = forms.DecimalField(required=False)
+    occurrences_gt = forms.IntegerField(required=False)
+    occurrences_lt = forms.IntegerField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field in ('frequency', 'occurrences'):
+            lower = cleaned_data.get(f'{field}_gt')
+            upper = cleaned_data.get(f'{field}_lt')
+            if lower is not None and upper is not None and lower > upper:
+                raise forms.ValidationError(
+                    f"{field} less than field must be greater than {field} greater than field")
+
+
+class ScatterplotWordSetChoice(WordSetChoice):
+    """Adds fields for limiting the displayed words by an upper or lower limit on word occurrences."""
+    occurrences_gt = forms.IntegerField(widget=forms.TextInput(attrs={'size': 6}), required=False,
+                                        label="Only show words with occurrences greater than")
+    occurrences_lt = forms.IntegerField(widget=forms.TextInput(attrs={'size': 6}), required=False,
+                                        label="Only show words with occurrences less than")
+
+    def __init__(self, *args, **kwargs):
+        super(ScatterplotWordSetChoice, self).__init__(*args, **kwargs)
+
+        # control rendering using django-crispy-forms
+        self.helper = FormHelper()
+        self.helper.form_class = 'form-horizontal'
+        self.helper.form_method = 'post'
+        self.helper.add_input(Submit('submit', 'Submit', css_class='button'))
+        self.helper.layout = Layout(
+            Div(
+                Div('word_set', css_class='col-lg-12 col-md-12 col-sm-12 col-xs-12'),
+                css_class='form-group'
+            ),
+            Div(
+                Div('frequency_gt', css_class='col-lg-5 col-md-5'),
+                Div('frequency_lt', css_class='col-lg-5 col-md-5'),
+                css_class='form-group'
+            ),
+            Div(
+                Div('occurrences_gt', css_class='col-lg-5 col-md-5'),
+                Div('occurrences_lt', css_class='col-lg-5 col-md-5'),
+                css_class='form-group'
+            ),
+        )
+
+    def clean(self):
+        super().clean()
+        occurrences_gt = self.cleaned_data.get("occurrences_gt")
+        occurrences_lt = self.cleaned_data.get("occurrences_lt")
+
+        if occurrences_gt and occurrences_lt:
+            # Only do something if both fields are valid so far.
+            if occurrences_gt > occurrences_lt:
+                raise forms.ValidationError(
+                    "occurrences less than field must be greater than occurrences greater than field")
\ No newline at end of file
@@ -0,0 +1,37 @@
+"""Checkpoints of the jobs that add words to a new WordSet, so that a job run again with the same job id (after its
+worker died, see wordset_build.stalled_jobs) continues where the earlier run stopped.
+
+Words that Datamuse recognizes are checkpointed by the database: once saved, they are in the WordSet, and
+forms.add_words skips the words already in the WordSet. The other words a job is done with (those Datamuse does not
+recognize) leave no trace in the WordSet, so they are kept in a Redis set named after the job until the job is done.
+The checkpoint is written each time a batch of words is saved to the database."""
+from typing import Iterable
+
+from rq.job import Job
+
+# seconds a checkpoint is kept after it was last written, if its job never finishes
+checkpoint_ttl = 7 * 24 * 60 * 60
+
+
+class JobCheckpoint:
+    """The words job is done with that are not in its WordSet."""
+
+    def __init__(self, job: Job):
+        self.connection = job.connection
+        self.key = f'rq:job-checkpoint:{job.id}'
+
+    def words(self):
+        """Returns the set of words in the checkpoint."""
+        return {word.decode() for word in self.connection.smembers(self.key)}
+
+    def add(self, words: Iterable[str]):
+        """Adds words to the checkpoint."""
+        words = list(words)
+        if words:
+            pipeline = self.connection.pipeline()
+            pipeline.sadd(self.key, *words)
+            pipeline.expire(self.key, checkpoint_ttl)
+            pipeline.execute()
+
+    def delete(self):
+        self.connection.delete(self.key)
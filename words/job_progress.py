@@ -0,0 +1,166 @@
+"""Push notifications of the progress of RQ jobs, over Redis pub/sub and Server-Sent Events.
+
+Jobs that report progress (the jobs of wordset_build, views.related_words_process) publish each update of their
+job.meta to a Redis channel named after the job (see publish). The job_events view streams these messages to the
+browser as Server-Sent Events (see events), so a page watching a job receives each update as it happens instead of
+polling for it, and Redis is only read when a client connects or the stream is idle.
+
+Each message is a json object holding the status of the job, its meta and, in the last message of a job, its result:
+the same shape as the json returned by views.job_json. RQ marks a job finished only after its function returns, so
+jobs publish a message with status 'finished' themselves as the last step of their work.
+
+Jobs that process many words report their progress through a ProgressReporter, which coalesces the updates so that
+job.meta is written and published a few times a second rather than once per word."""
+import json
+import time
+
+from django.conf import settings
+from rq.job import Job
+
+# statuses after which a job publishes no more progress
+done_statuses = ('finished', 'failed')
+
+
+def channel(job_id: str):
+    """Returns the name of the Redis channel for the progress of the job with job_id."""
+    return f'rq:job-progress:{job_id}'
+
+
+def job_state(job: Job, status: str = None, result=None):
+    """Returns the message describing the current state of job (as returned by views.job_json)."""
+    return {
+        'status': status or job.get_status(),
+        'meta': job.meta,
+        'result': result,
+    }
+
+
+def publish(job: Job, status: str = 'started', result=None, pipeline=None):
+    """Publishes the state of job (its status, meta and result) to the channel of job, or adds the command publishing it
+    to pipeline. Does nothing if job is None (when the job function is called directly rather than by a worker)."""
+    if job is None:
+        return
+    message = json.dumps(job_state(job, status, result), default=str)
+    (pipeline or job.connection).publish(channel(job.id), message)
+
+
+def update_rate(meta: dict, timed_words: int, elapsed: float):
+    """Sets the rate (words/sec) and eta (seconds until all potential_words are processed) in meta, from timed_words
+    processed in elapsed seconds. Leaves them unchanged until words have been timed."""
+    if elapsed > 0 and timed_words > 0:
+        rate = timed_words / elapsed
+        meta['rate'] = round(rate, 1)
+        meta['eta'] = round(max(0, meta['potential_words'] - meta['processed_words']) / rate, 1)
+
+
+class ProgressReporter:
+    """Counts the words processed by job in job.meta, writing job.meta to Redis and publishing it (see publish) once
+    interval seconds (settings.JOB_PROGRESS_INTERVAL by default) have passed or batch words (settings.JOB_PROGRESS_WORDS
+    by default) have been processed since the last write. Used as a context manager, the progress is always written
+    when the block ends, whether the work finished or raised an exception.
+
+    job.meta holds potential_words (the number of words to process), processed_words, a counter for each name in
+    counters, and the rate at which words are processed (words/sec) and the estimated seconds until all are processed
+    (eta, None until the rate is known)."""
+
+    def __init__(self, job: Job, *counters: str, interval: float = None, batch: int = None):
+        self.job = job
+        self.interval = settings.JOB_PROGRESS_INTERVAL if interval is None else interval
+        self.batch = settings.JOB_PROGRESS_WORDS if batch is None else batch
+        self.started = self.last_write = time.monotonic()
+        # words processed since the last write, and words (such as those skipped) left out of the rate
+        self.unwritten = 0
+        self.untimed = 0
+
+        job.meta['potential_words'] = 0
+        job.meta['processed_words'] = 0
+        for counter in counters:
+            job.meta[counter] = 0
+        job.meta['rate'] = 0
+        job.meta['eta'] = None
+        self.write()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.write()
+
+    def set_total(self, potential_words: int):
+        """Sets the number of words to process, and writes the progress."""
+        self.job.meta['potential_words'] = potential_words
+        self.write()
+
+    def add(self, processed: int, timed: bool = True, **counts: int):
+        """Adds processed to the number of words processed and each value in counts to the counter it names, writing
+        the progress if enough time or words have passed since the last write. Words added with timed False (such as
+        words done by an earlier run of the job) are left out of the rate."""
+        meta = self.job.meta
+        meta['processed_words'] += processed
+        for counter, count in counts.items():
+            meta[counter] += count
+        self.unwritten += processed
+        if not timed:
+            self.untimed += processed
+        if self.unwritten >= self.batch or time.monotonic() - self.last_write >= self.interval:
+            self.write()
+
+    def write(self):
+        """Updates the rate and eta, then writes job.meta to Redis and publishes it."""
+        meta = self.job.meta
+        now = time.monotonic()
+        update_rate(meta, meta['processed_words'] - self.untimed, now - self.started)
+        self.job.save_meta()
+        publish(self.job)
+        self.last_write = now
+        self.unwritten = 0
+
+
+def event(data: dict):
+    """Formats data as a Server-Sent Event."""
+    return f'data: {json.dumps(data, default=str)}\n\n'
+
+
+def events(job: Job, max_seconds: float = None, keepalive: float = None):
+    """Yields the progress of job as Server-Sent Events: the current state of the job, then each message published for
+    the job, until the job is done or max_seconds (settings.JOB_EVENTS_MAX_SECONDS by default) have passed. The browser
+    reconnects after a stream ends while the job is still running.
+
+    When no message arrives for keepalive seconds (settings.JOB_EVENTS_KEEPALIVE by default), the status of the job is
+    read from Redis (so a job that failed, which publishes nothing, ends the stream) and a comment is sent to keep the
+    connection open."""
+    if max_seconds is None:
+        max_seconds = settings.JOB_EVENTS_MAX_SECONDS
+    if keepalive is None:
+        keepalive = settings.JOB_EVENTS_KEEPALIVE
+
+    pubsub = job.connection.pubsub(ignore_subscribe_messages=True)
+    try:
+        # subscribe before reading the state of the job, so no message published in between is missed
+        pubsub.subscribe(channel(job.id))
+        yield f'retry: {int(keepalive * 1000)}\n'
+        state = job_state(job, result=job.result)
+        yield event(state)
+        if state['status'] in done_statuses:
+            return
+
+        deadline = time.monotonic() + max_seconds
+        idle_since = time.monotonic()
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=min(keepalive, max(0.0, deadline - time.monotonic())))
+            if message is not None:
+                data = json.loads(message['data'])
+                yield event(data)
+                if data['status'] in done_statuses:
+                    return
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= keepalive:
+                status = job.get_status()
+                if status in done_statuses:
+                    job.refresh()
+                    yield event(job_state(job, status, job.result))
+                    return
+                yield ': keepalive\n\n'
+                idle_since = time.monotonic()
+    finally:
+        pubsub.close()
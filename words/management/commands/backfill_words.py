@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+
+from words import datamuse_backfill
+
+
+class Command(BaseCommand):
+    help = 'Queries Datamuse again for the words saved without data (datamuse_success=False) and updates the words ' \
+           'it recognizes, a batch at a time. The backfill continues after the word the last backfill stopped at. ' \
+           'With --enqueue, the backfill runs as an RQ job (schedule this command with --enqueue to backfill ' \
+           'periodically).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='number of words queried and updated at a time')
+        parser.add_argument('--limit', type=int, help='stop after this number of words')
+        parser.add_argument('--workers', type=int, help='number of threads querying Datamuse in parallel')
+        parser.add_argument('--restart', action='store_true', help='start over from the first word missing data')
+        parser.add_argument('--enqueue', action='store_true',
+                            help='run the backfill as an RQ job, unless a backfill job is already queued or running')
+
+    def handle(self, *args, **options):
+        if options['restart']:
+            datamuse_backfill.set_cursor(0)
+
+        if options['enqueue']:
+            self.enqueue(options)
+            return
+
+        cursor = datamuse_backfill.get_cursor()
+        missing = datamuse_backfill.missing_words(cursor).count()
+        self.stdout.write(f'{missing} words missing data after word id {cursor}')
+        start = time.monotonic()
+        totals = dict.fromkeys(('processed_words', 'updated_words', 'unrecognized_words', 'failed_words'), 0)
+        for counts in datamuse_backfill.backfill(options['batch_size'], options['limit'], options['workers']):
+            for counter in totals:
+                totals[counter] += counts[counter]
+            elapsed = time.monotonic() - start
+            self.stdout.write(
+                f"{totals['processed_words']} words ({totals['processed_words'] / elapsed:.1f} words/s): "
+                f"{totals['updated_words']} updated, {totals['unrecognized_words']} not recognized, "
+                f"{totals['failed_words']} failed (up to word id {counts['cursor']})"
+            )
+        self.stdout.write(self.style.SUCCESS(f"backfill done: {totals['updated_words']} words updated"))
+
+    def enqueue(self, options):
+        from words.views import rq_queue
+
+        try:
+            job = Job.fetch(datamuse_backfill.job_id, connection=rq_queue.connection)
+            if job.get_status() in ('queued', 'started'):
+                self.stdout.write(f'backfill job already {job.get_status()}')
+                return
+            job.delete()
+        except NoSuchJobError:
+            pass
+        rq_queue.enqueue(datamuse_backfill.backfill_job, options['batch_size'], options['limit'],
+                         job_id=datamuse_backfill.job_id, description='Datamuse backfill', job_timeout='6h')
+        self.stdout.write(self.style.SUCCESS(f'backfill job {datamuse_backfill.job_id} enqueued'))
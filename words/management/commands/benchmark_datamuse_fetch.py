@@ -0,0 +1,80 @@
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from words import datamuse_json, datamuse_cache
+from words.datamuse_client import DatamuseClient
+from words.fake_datamuse import FakeDatamuseServer
+
+
+class UnpooledClient(DatamuseClient):
+    """Datamuse client opening a new connection for every query (through the requests module-level functions, as the
+    python-datamuse package did), to compare against the pooled client."""
+
+    def get(self, endpoint: str, params: dict):
+        return requests.get(f'{self.api_root}/{endpoint}', params=params, timeout=self.timeout).json()
+
+
+class Command(BaseCommand):
+    help = 'Measures the throughput of datamuse_json.query_words against a local fake Datamuse server ' \
+           'for different numbers of worker threads, and the number of connections opened, with the pooled ' \
+           'Datamuse client and with a client opening a connection for each query.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--words', type=int, default=500, help='number of words to query for each run')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32],
+                            help='worker counts to benchmark')
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='seconds the fake server waits before answering each request')
+        parser.add_argument('--rate', type=float, default=0,
+                            help='rate limit (requests per second) to apply; 0 for no limit')
+
+    def handle(self, *args, **options):
+        original_api = datamuse_json.api
+        original_cache = datamuse_cache.cache
+
+        # measure the queries themselves, not the cache
+        datamuse_cache.cache = datamuse_cache.create_cache({'BACKEND': 'none'})
+
+        with FakeDatamuseServer(latency=options['latency']) as server, \
+                override_settings(DATAMUSE_RATE_LIMIT=options['rate']):
+            self.stdout.write(f"{options['words']} words, {options['latency']}s latency, fake server at {server.url}")
+            self.stdout.write(f"{'client':>9} {'workers':>8} {'seconds':>10} {'words/sec':>10} {'connections':>12}")
+
+            try:
+                for workers in options['workers']:
+                    for name, client_class in (('pooled', DatamuseClient), ('unpooled', UnpooledClient)):
+                        # start each run with a fresh client and rate limiter
+                        datamuse_json.api = client_class(server.url, pool_size=workers)
+                        datamuse_json.rate_limiters.clear()
+                        connections = server.connections
+
+                        # distinct words for each run, made only of letters so the fake server recognizes them
+                        words = [f'bench{name[0]}{chr(97 + workers % 26)}{self.letters(i)}'
+                                 for i in range(options['words'])]
+
+                        start = time.perf_counter()
+                        for word, result in datamuse_json.query_words(words, workers=workers):
+                            if isinstance(result, Exception):
+                                raise result
+                        elapsed = time.perf_counter() - start
+                        datamuse_json.api.close()
+
+                        self.stdout.write(f'{name:>9} {workers:>8} {elapsed:>10.2f} {len(words) / elapsed:>10.1f} '
+                                          f'{server.connections - connections:>12}')
+            finally:
+                datamuse_json.api = original_api
+                datamuse_cache.cache = original_cache
+                datamuse_json.rate_limiters.clear()
+
+    @staticmethod
+    def letters(number: int):
+        """Converts number to a string of lowercase letters (0 -> 'a', 25 -> 'z', 26 -> 'ba', ...)"""
+        result = ''
+        while True:
+            number, remainder = divmod(number, 26)
+            result = chr(97 + remainder) + result
+            if not number:
+                return result
@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from words.datamuse_json import relation_codes
+from words.models import Word, WordRelation
+
+
+class Command(BaseCommand):
+    help = 'Seeds the WordRelation table with generated rows (inside a transaction that is rolled back) and compares ' \
+           'fetching the related words for every relation type with one query against one set of queries per type.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='number of WordRelation rows to generate')
+        parser.add_argument('--related', type=int, default=10,
+                            help='number of related words for each source word and relation type')
+        parser.add_argument('--samples', type=int, default=200, help='number of source words to look up')
+
+    def handle(self, *args, **options):
+        source_count = max(1, options['rows'] // (options['related'] * len(relation_codes)))
+
+        with transaction.atomic():
+            seed_start = time.perf_counter()
+            first_id = self.seed(source_count, options['related'])
+            self.stdout.write(f'seeded {WordRelation.objects.count()} rows for {source_count} source words in '
+                              f'{time.perf_counter() - seed_start:.1f}s')
+
+            sample = [Word(pk=first_id + random.randrange(source_count)) for _ in range(options['samples'])]
+
+            with connection.cursor() as cursor:
+                query, params = self.single_query(sample[0]).query.sql_with_params()
+                cursor.execute('EXPLAIN ' + query, params)
+                self.stdout.write('plan for single query:')
+                for row in cursor.fetchall():
+                    self.stdout.write(f'    {row[0]}')
+
+            self.report('single query', sample, lambda word: list(self.single_query(word)))
+            self.report('per relation type', sample, self.per_code_queries)
+
+            # leave the database as it was
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def seed(source_count: int, related: int):
+        """Generates source_count source words, each related to related other source words for every relation type.
+        Returns the id of the first generated word."""
+        word_table = Word._meta.db_table
+        relation_table = WordRelation._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO words_language (name) VALUES ('en') ON CONFLICT DO NOTHING")
+            cursor.execute(
+                f"INSERT INTO {word_table} (name, language_id, datamuse_success) "
+                f"SELECT 'benchmark' || n, 'en', true FROM generate_series(0, %s) AS n RETURNING id",
+                [source_count - 1]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            first_id = min(ids)
+            cursor.execute(
+                f"INSERT INTO {relation_table} (source_word_id, related_word_id, code, score) "
+                f"SELECT %s + s, %s + (s + r + 1) %% %s, code, (random() * 10000)::int "
+                f"FROM generate_series(0, %s) AS s, generate_series(0, %s) AS r, unnest(%s) AS code",
+                [first_id, first_id, source_count, source_count - 1, related - 1, relation_codes]
+            )
+            cursor.execute(f'ANALYZE {word_table}')
+            cursor.execute(f'ANALYZE {relation_table}')
+        return first_id
+
+    @staticmethod
+    def single_query(word: Word):
+        """The related words for every relation type, grouped by type in order of score."""
+        return WordRelation.objects.filter(source_word=word, code__in=relation_codes)\
+            .select_related('related_word').order_by('code', '-score')
+
+    @staticmethod
+    def per_code_queries(word: Word):
+        """The access pattern used with one through table per relation type: exists(), count() and an ordered fetch
+        for each type."""
+        for code in relation_codes:
+            relations = WordRelation.objects.filter(source_word=word, code=code)
+            if relations.exists() and relations.count() > 0:
+                list(relations.select_related('related_word').order_by('-score'))
+
+    def report(self, label: str, sample: list, lookup):
+        timings = []
+        for word in sample:
+            start = time.perf_counter()
+            lookup(word)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.stdout.write(f'{label}: mean {statistics.mean(timings):.2f}ms, '
+                          f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f}ms')
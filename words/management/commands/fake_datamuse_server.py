@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from words.fake_datamuse import FakeDatamuseServer, load_corpus, default_corpus_path
+
+
+class Command(BaseCommand):
+    help = 'Runs a local stand-in for the Datamuse API (see words/fake_datamuse.py). Point DATAMUSE_API_ROOT at it ' \
+           'to run the site or its RQ workers without querying the real service.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='seconds the server waits before answering each request')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='fraction of requests answered with a 500 error')
+        parser.add_argument('--rate-limit', type=float, default=0,
+                            help='requests per second beyond which requests are answered with a 429 error; 0 for none')
+        parser.add_argument('--corpus', default=default_corpus_path,
+                            help="json corpus of words and relations to serve, or 'none' to recognize any word made "
+                                 "of letters")
+
+    def handle(self, *args, **options):
+        corpus = None if options['corpus'] == 'none' else load_corpus(options['corpus'])
+        server = FakeDatamuseServer(latency=options['latency'], port=options['port'], corpus=corpus,
+                                    error_rate=options['error_rate'], rate_limit=options['rate_limit'])
+        self.stdout.write(f'fake Datamuse server running at {server.url} (press CTRL-C to stop)')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f'{server.requests} requests received, {server.rejected} rejected by the rate limit')
@@ -0,0 +1,176 @@
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from words.datamuse_json import relation_codes
+from words.fake_datamuse import FakeDatamuseServer, load_corpus, default_corpus_path
+from words.models import WordSet
+
+
+def percentile(values: list, p: float):
+    """Returns the p-th percentile (0 < p <= 100) of values using the nearest-rank method."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Load test: submits concurrent WordSet uploads and related-words requests through the real views, with ' \
+           'RQ worker processes querying a local fake Datamuse server, and reports latency percentiles and ' \
+           'words/sec. Uses the configured database and Redis server; the WordSets it creates are deleted afterwards.'
+
+    # statuses of a finished rq job
+    done_statuses = ('finished', 'failed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=10, help='number of WordSet uploads')
+        parser.add_argument('--related', type=int, default=10, help='number of related-words requests')
+        parser.add_argument('--concurrency', type=int, default=4, help='number of simultaneous users')
+        parser.add_argument('--words-per-upload', type=int, default=500,
+                            help='number of words in the text file of each upload')
+        parser.add_argument('--unknown-ratio', type=float, default=0.05,
+                            help='fraction of the uploaded words that Datamuse will not recognize')
+        parser.add_argument('--workers', type=int, default=2, help='number of RQ worker processes to start')
+        parser.add_argument('--latency', type=float, default=0.05, help='latency of the fake Datamuse server')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='error rate of the fake Datamuse server')
+        parser.add_argument('--rate-limit', type=float, default=0, help='rate limit of the fake Datamuse server')
+        parser.add_argument('--datamuse-url',
+                            help='url of an already running Datamuse stand-in to use instead of starting one')
+        parser.add_argument('--cache', action='store_true',
+                            help='let the workers use the Datamuse cache (by default it is disabled)')
+        parser.add_argument('--timeout', type=float, default=600, help='seconds to wait for each job')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.corpus = load_corpus(default_corpus_path)
+        self.run_id = uuid.uuid4().hex[:8]
+
+        server = None
+        if options['datamuse_url']:
+            datamuse_url = options['datamuse_url']
+        else:
+            server = FakeDatamuseServer(latency=options['latency'], corpus=self.corpus,
+                                        error_rate=options['error_rate'], rate_limit=options['rate_limit'])
+            server.__enter__()
+            datamuse_url = server.url
+
+        workers = self.start_workers(datamuse_url)
+        setup_test_environment()
+        # the pages are rendered without running collectstatic first
+        static_settings = override_settings(
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+        )
+        static_settings.enable()
+        try:
+            self.stdout.write(f"{options['workers']} workers, {options['concurrency']} concurrent users, "
+                              f"Datamuse stand-in at {datamuse_url}")
+            self.run_phase('uploads', self.upload, options['uploads'])
+            self.run_phase('related words', self.related_words, options['related'])
+        finally:
+            static_settings.disable()
+            teardown_test_environment()
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.wait()
+            if server is not None:
+                self.stdout.write(f'fake Datamuse server: {server.requests} requests, '
+                                  f'{server.rejected} rejected by the rate limit')
+                server.__exit__()
+            WordSet.objects.filter(name__startswith=f'load test {self.run_id}').delete()
+
+    def start_workers(self, datamuse_url: str):
+        """Starts the RQ worker processes, pointed at datamuse_url."""
+        env = dict(os.environ, DATAMUSE_API_ROOT=datamuse_url)
+        if not self.options['cache']:
+            env['DATAMUSE_CACHE_BACKEND'] = 'none'
+        manage_py = os.path.join(settings.BASE_DIR, 'manage.py')
+        return [subprocess.Popen([sys.executable, manage_py, 'rqworker', 'default'], env=env,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                for _ in range(self.options['workers'])]
+
+    def run_phase(self, name: str, task, count: int):
+        """Runs task count times with the configured number of simultaneous users and reports the results. Each call
+        of task returns (seconds from request to finished job, number of words processed, job status)."""
+        if not count:
+            return
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.options['concurrency']) as executor:
+            results = list(executor.map(task, range(count)))
+        elapsed = time.perf_counter() - start
+
+        latencies = [latency for latency, _, _ in results]
+        words = sum(word_count for _, word_count, _ in results)
+        failed = sum(1 for _, _, status in results if status != 'finished')
+        self.stdout.write(f'{name}: {count} requests ({failed} failed) in {elapsed:.1f}s')
+        self.stdout.write(f'    latency p50 {percentile(latencies, 50):.2f}s, p95 {percentile(latencies, 95):.2f}s, '
+                          f'p99 {percentile(latencies, 99):.2f}s')
+        self.stdout.write(f'    {words} words, {words / elapsed:.1f} words/sec')
+
+    def wait_for_job(self, client: Client, url: str):
+        """Polls the json at url until the job it describes is done, returning the json."""
+        deadline = time.monotonic() + self.options['timeout']
+        while True:
+            data = client.get(url, secure=True).json()
+            status = data.get('status') or data.get('meta', {}).get('status')
+            if status in self.done_statuses or time.monotonic() > deadline:
+                return data
+            time.sleep(0.1)
+
+    def upload(self, number: int):
+        """Creates a WordSet from a generated text file and waits for its job to finish."""
+        client = Client()
+        known_words = list(self.corpus['words'])
+        text_words = [
+            f'unknown{random.randrange(10 ** 6)}x' if random.random() < self.options['unknown_ratio']
+            else random.choice(known_words)
+            for _ in range(self.options['words_per_upload'])
+        ]
+        text_file = SimpleUploadedFile('upload.txt', ' '.join(text_words).encode(), content_type='text/plain')
+
+        try:
+            start = time.perf_counter()
+            response = client.post(reverse('wordset_create'),
+                                   {'name': f'load test {self.run_id} {number}', 'text_file': text_file},
+                                   secure=True)
+            job_id = re.search(r'_([^/]+)/$', response['Location']).group(1)
+            meta = self.wait_for_job(client, reverse('wordset_create_progress json', args=[job_id]))
+            return time.perf_counter() - start, meta.get('processed_words', 0), meta.get('status')
+        finally:
+            connections.close_all()
+
+    def related_words(self, number: int):
+        """Requests the related words chart for a random corpus word and waits for its job to finish (unless the whole
+        chart was part of the page)."""
+        client = Client()
+        word = random.choice(list(self.corpus['relations']))
+        codes = random.sample(relation_codes, 3)
+
+        try:
+            start = time.perf_counter()
+            response = client.post(reverse('viz related words'), {'word': word, 'relations': codes}, secure=True)
+            # the part of the chart that was cached or stored, and the job for the rest of it
+            results = [response.context.get('result')]
+            status = 'finished'
+            if response.context.get('job_id'):
+                data = self.wait_for_job(client, reverse('job json', args=[response.context['job_id']]))
+                results.append(data.get('result'))
+                status = data.get('status')
+            word_count = sum(len(child['children']) for result in results if result
+                             for child in result.get('json_object', {}).get('children', []))
+            return time.perf_counter() - start, word_count, status
+        finally:
+            connections.close_all()
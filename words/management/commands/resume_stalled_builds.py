@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from words import wordset_build
+
+
+class Command(BaseCommand):
+    help = 'Resumes jobs adding words to new WordSets that were left in the StartedJobRegistry by a worker that ' \
+           'died. Each job is requeued with the same id and skips the words processed before its worker died, unless ' \
+           '--restart is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restart', action='store_true',
+                            help='discard the work done by the stalled jobs and process all of their words again')
+        parser.add_argument('--list', action='store_true', help='only list the stalled jobs')
+
+    def handle(self, *args, **options):
+        from words.views import rq_queue
+
+        jobs = wordset_build.stalled_jobs(rq_queue)
+        if not jobs:
+            self.stdout.write('no stalled jobs')
+        for job in jobs:
+            if options['list']:
+                self.stdout.write(f'{job.id}: stalled ({job.description})')
+            elif options['restart']:
+                wordset_build.restart(rq_queue, job)
+                self.stdout.write(self.style.SUCCESS(f'{job.id}: restarted ({job.description})'))
+            else:
+                wordset_build.resume(rq_queue, job)
+                self.stdout.write(self.style.SUCCESS(f'{job.id}: resumed ({job.description})'))
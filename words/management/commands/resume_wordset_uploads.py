@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+
+from words import upload_spool
+
+
+class Command(BaseCommand):
+    help = 'Requeues failed jobs that add spooled uploads to new WordSets. The words of each upload are streamed ' \
+           'back from the spool, and words added to the WordSet before the job failed are skipped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-orphans', action='store_true',
+                            help='delete spooled uploads whose job no longer exists')
+
+    def handle(self, *args, **options):
+        from words.views import rq_queue
+
+        # each upload is spooled under the id of the job that processes it
+        for key in upload_spool.spool.keys():
+            try:
+                job = Job.fetch(key, connection=rq_queue.connection)
+            except NoSuchJobError:
+                if options['delete_orphans']:
+                    upload_spool.spool.delete(key)
+                    self.stdout.write(f'{key}: job not found, spooled upload deleted')
+                else:
+                    self.stdout.write(f'{key}: job not found')
+                continue
+
+            status = job.get_status()
+            if job.is_failed:
+                rq_queue.failed_job_registry.requeue(job)
+                self.stdout.write(self.style.SUCCESS(f'{key}: requeued ({job.description})'))
+            else:
+                self.stdout.write(f'{key}: {status} ({job.description})')
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:37
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('words', '0013_wordset_unrecognized_words'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatamuseResponse',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('result', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
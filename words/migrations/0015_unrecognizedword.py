@@ -0,0 +1,29 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import words.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('words', '0014_datamuseresponse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnrecognizedWord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('last_checked', models.DateTimeField(default=django.utils.timezone.now)),
+                ('language', models.ForeignKey(default=words.models.default_language, on_delete=django.db.models.deletion.CASCADE, to='words.Language')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='unrecognizedword',
+            constraint=models.UniqueConstraint(fields=('name', 'language'), name='unique_unrecognized_word_per_language'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('words', '0015_unrecognizedword'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpooledUploadChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('index', models.PositiveIntegerField()),
+                ('data', models.TextField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='spooleduploadchunk',
+            constraint=models.UniqueConstraint(fields=('key', 'index'), name='unique_spooled_upload_chunk'),
+        ),
+    ]
@@ -0,0 +1,289 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# three letter relation codes, each of which had its own through table (named after the code in uppercase)
+relation_codes = ['jja', 'jjb', 'syn', 'trg', 'ant', 'spc', 'gen', 'com', 'par', 'bga', 'bgb', 'rhy', 'nry', 'hom', 'cns']
+
+
+def copy_relations(apps, schema_editor):
+    """Copies the rows of each per-relation through table into WordRelation, using one INSERT ... SELECT per table so
+    the rows never pass through Python."""
+    word_relation_table = apps.get_model('words', 'WordRelation')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        for code in relation_codes:
+            table = apps.get_model('words', code.upper())._meta.db_table
+            cursor.execute(
+                f'INSERT INTO {word_relation_table} (source_word_id, related_word_id, code, score) '
+                f'SELECT source_word_id, related_word_id, %s, score FROM {table} '
+                f'ON CONFLICT DO NOTHING',
+                [code]
+            )
+
+
+def copy_relations_back(apps, schema_editor):
+    """Copies the rows of WordRelation back into the per-relation through tables."""
+    word_relation_table = apps.get_model('words', 'WordRelation')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        for code in relation_codes:
+            table = apps.get_model('words', code.upper())._meta.db_table
+            cursor.execute(
+                f'INSERT INTO {table} (source_word_id, related_word_id, score) '
+                f'SELECT source_word_id, related_word_id, score FROM {word_relation_table} WHERE code = %s',
+                [code]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('words', '0016_spooleduploadchunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WordRelation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(choices=[('jja', 'popular related nouns'), ('jjb', 'popular related adjectives'), ('syn', 'synonyms'), ('trg', 'triggers'), ('ant', 'antonyms'), ('spc', 'direct hypernyms'), ('gen', 'direct hyponyms'), ('com', 'comprises'), ('par', 'part of'), ('bga', 'frequent followers'), ('bgb', 'frequent predecessors'), ('rhy', 'rhymes'), ('nry', 'near rhymes'), ('hom', 'homophones'), ('cns', 'consonant matches')], max_length=3)),
+                ('score', models.IntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='wordrelation',
+            name='related_word',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='linked_relations', to='words.Word'),
+        ),
+        migrations.AddField(
+            model_name='wordrelation',
+            name='source_word',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='relations', to='words.Word'),
+        ),
+        migrations.AddIndex(
+            model_name='wordrelation',
+            index=models.Index(fields=['source_word', 'code', '-score'], name='word_relation_lookup'),
+        ),
+        migrations.AddConstraint(
+            model_name='wordrelation',
+            constraint=models.UniqueConstraint(fields=('source_word', 'code', 'related_word'), name='unique_word_relation'),
+        ),
+        migrations.RunPython(copy_relations, copy_relations_back),
+        migrations.RemoveField(
+            model_name='bga',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='bga',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='bgb',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='bgb',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='cns',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='cns',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='com',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='com',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='gen',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='gen',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='hom',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='hom',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='jja',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='jja',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='jjb',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='jjb',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='nry',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='nry',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='par',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='par',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='rhy',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='rhy',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='spc',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='spc',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='syn',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='syn',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='trg',
+            name='related_word',
+        ),
+        migrations.RemoveField(
+            model_name='trg',
+            name='source_word',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='ant',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='bga',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='bgb',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='cns',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='com',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='gen',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='hom',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='jja',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='jjb',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='nry',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='par',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='rhy',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='spc',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='syn',
+        ),
+        migrations.RemoveField(
+            model_name='word',
+            name='trg',
+        ),
+        migrations.DeleteModel(
+            name='ANT',
+        ),
+        migrations.DeleteModel(
+            name='BGA',
+        ),
+        migrations.DeleteModel(
+            name='BGB',
+        ),
+        migrations.DeleteModel(
+            name='CNS',
+        ),
+        migrations.DeleteModel(
+            name='COM',
+        ),
+        migrations.DeleteModel(
+            name='GEN',
+        ),
+        migrations.DeleteModel(
+            name='HOM',
+        ),
+        migrations.DeleteModel(
+            name='JJA',
+        ),
+        migrations.DeleteModel(
+            name='JJB',
+        ),
+        migrations.DeleteModel(
+            name='NRY',
+        ),
+        migrations.DeleteModel(
+            name='PAR',
+        ),
+        migrations.DeleteModel(
+            name='RHY',
+        ),
+        migrations.DeleteModel(
+            name='SPC',
+        ),
+        migrations.DeleteModel(
+            name='SYN',
+        ),
+        migrations.DeleteModel(
+            name='TRG',
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.4 on 2026-10-18 08:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('words', '0017_wordrelation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WordSetStats',
+            fields=[
+                ('wordset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='words.WordSet')),
+                ('unique_words', models.IntegerField(default=0)),
+                ('total_occurrences', models.IntegerField(default=0)),
+                ('recognized_words', models.IntegerField(default=0)),
+                ('missing_data_words', models.IntegerField(default=0)),
+                ('unrecognized_words', models.IntegerField(default=0)),
+                ('frequency_min', models.DecimalField(blank=True, decimal_places=6, max_digits=12, null=True)),
+                ('frequency_median', models.DecimalField(blank=True, decimal_places=6, max_digits=12, null=True)),
+                ('frequency_max', models.DecimalField(blank=True, decimal_places=6, max_digits=12, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'word set stats',
+            },
+        ),
+    ]
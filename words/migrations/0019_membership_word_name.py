@@ -0,0 +1,36 @@
+# Generated by Django 2.2.4 on 2026-10-18 08:06
+
+from django.db import migrations, models
+
+
+def copy_word_names(apps, schema_editor):
+    """Fills in the word_name of each Membership with a single UPDATE ... FROM, so the rows never pass through
+    Python."""
+    membership_table = apps.get_model('words', 'Membership')._meta.db_table
+    word_table = apps.get_model('words', 'Word')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {membership_table} SET word_name = {word_table}.name FROM {word_table} '
+            f'WHERE {membership_table}.word_id = {word_table}.id'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('words', '0018_wordsetstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='membership',
+            name='word_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        # fill in the names before creating the index, so the index is built once
+        migrations.RunPython(copy_word_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='membership',
+            index=models.Index(fields=['wordset', 'word_name', 'id'], name='membership_by_word_name'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.4 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('words', '0019_membership_word_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='word',
+            index=models.Index(condition=models.Q(datamuse_success=False), fields=['id'], name='word_missing_data'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.4 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def fill_blank_word_names(apps, schema_editor):
+    """Fills in the word_name of the Memberships created by wordset.words.add() before fill_membership_word_names
+    existed, which were left blank."""
+    membership_table = apps.get_model('words', 'Membership')._meta.db_table
+    word_table = apps.get_model('words', 'Word')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {membership_table} SET word_name = {word_table}.name FROM {word_table} "
+            f"WHERE {membership_table}.word_id = {word_table}.id AND {membership_table}.word_name = ''"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('words', '0020_word_missing_data'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_blank_word_names, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,14 @@
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib.postgres.fields import JSONField
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models import BooleanField
+from django.db.models import BooleanField, OuterRef, Subquery
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
 from django.urls import reverse
+from django.utils import timezone
 
 
 class Language(models.Model):
@@ -38,6 +43,78 @@ def default_language():
     return lang.pk
 
 
+# three letter codes used by the rel_[code] DataMuse parameter and the verbose name of each relation type
+relation_choices = (
+    ('jja', 'popular related nouns'),
+    ('jjb', 'popular related adjectives'),
+    ('syn', 'synonyms'),
+    ('trg', 'triggers'),
+    ('ant', 'antonyms'),
+    ('spc', 'direct hypernyms'),
+    ('gen', 'direct hyponyms'),
+    ('com', 'comprises'),
+    ('par', 'part of'),
+    ('bga', 'frequent followers'),
+    ('bgb', 'frequent predecessors'),
+    ('rhy', 'rhymes'),
+    ('nry', 'near rhymes'),
+    ('hom', 'homophones'),
+    ('cns', 'consonant matches'),
+)
+
+relation_verbose_names = dict(relation_choices)
+
+
+class RelatedWordsManager:
+    """Manager for the words related to a Word by one relation type (i.e. word.syn for the synonyms of word).
+
+    Behaves like the related manager of a ManyToManyField: add(), remove() and clear() change the WordRelations of the
+    word, and any other QuerySet method (all(), filter(), exists(), count()...) is applied to the related Words."""
+
+    def __init__(self, instance, code: str):
+        self.instance = instance
+        self.code = code
+
+    def relations(self):
+        """Returns a QuerySet of the WordRelations for this word and relation type."""
+        return WordRelation.objects.filter(source_word=self.instance, code=self.code)
+
+    def get_queryset(self):
+        return Word.objects.filter(linked_relations__source_word=self.instance, linked_relations__code=self.code)
+
+    def add(self, *words, through_defaults=None):
+        WordRelation.objects.bulk_create(
+            [WordRelation(source_word=self.instance, related_word=word, code=self.code, **(through_defaults or {}))
+             for word in words],
+            ignore_conflicts=True
+        )
+
+    def remove(self, *words):
+        self.relations().filter(related_word__in=words).delete()
+
+    def clear(self):
+        self.relations().delete()
+
+    def __getattr__(self, name):
+        return getattr(self.get_queryset(), name)
+
+
+class RelatedWordsDescriptor:
+    """Gives access to the words related to a Word by the relation type code, through a RelatedWordsManager.
+
+    Replaces the ManyToManyField (with a through table per relation type) formerly used for each relation type."""
+
+    def __init__(self, code: str, help_text: str = ''):
+        self.code = code
+        self.verbose_name = relation_verbose_names[code]
+        self.help_text = help_text
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return RelatedWordsManager(instance, self.code)
+
+
 class WordQuerySet(models.query.QuerySet):
     """Custom QuerySet converts name value to lowercase before searching.
 
@@ -73,60 +150,37 @@ class Word(models.Model):
     # purpose is to avoid redundant DataMuse queries
     datamuse_success = BooleanField(default=False)
 
-    # Remaining fields hold words related to this word. The relationships are governed by the RelatedWords model class.
-    # Field names derived from three-letter codes used by rel_[code] DataMuse parameter.
-    # datamuse_json skips a related word DataMuse query if the field is already populated.
-    jja = models.ManyToManyField('self', through='JJA', blank=True, verbose_name='popular related nouns',
-                                 symmetrical=False, related_name='related_by_jja')
-    jjb = models.ManyToManyField('self', through='JJB', blank=True, verbose_name='popular related adjectives',
-                                 symmetrical=False, related_name='related_by_jjb')
-    syn = models.ManyToManyField('self', through='SYN', blank=True, verbose_name='synonyms', symmetrical=False,
-                                 related_name='related_by_syn')
-    trg = models.ManyToManyField('self', through='TRG', blank=True, verbose_name='triggers', symmetrical=False,
-                                 related_name='related_by_trg',
-                                 help_text='words that are statistically associated with this word '
-                                           'in the same piece of text')
-    ant = models.ManyToManyField('self', through='ANT', blank=True, verbose_name='antonyms', symmetrical=False,
-                                 related_name='related_by_ant')
-    spc = models.ManyToManyField('self', through='SPC', blank=True, verbose_name='direct hypernyms', symmetrical=False,
-                                 related_name='related_by_spc',
-                                 help_text='words with a similar, but broader meaning '
-                                           '(i.e. boat is a hypernym of gondola)')
-    gen = models.ManyToManyField('self', through='GEN', blank=True, verbose_name='direct hyponyms', symmetrical=False,
-                                 related_name='related_by_gen',
-                                 help_text='words with a similar, but more specific meaning '
-                                           '(i.e. gondola is a hyponym of boat)')
-    com = models.ManyToManyField('self', through='COM', blank=True, verbose_name='comprises', symmetrical=False,
-                                 related_name='related_by_com',
-                                 help_text='things which this is composed of'
-                                           '(a car has an accelerator, a steering wheel, etc.')
-    par = models.ManyToManyField('self', through='PAR', blank=True, verbose_name='part of', symmetrical=False,
-                                 related_name='related_by_par',
-                                 help_text='things of which this is a part of'
-                                           '(a window is a part of a car, a house, a boat, etc.)')
-    bga = models.ManyToManyField('self', through='BGA', blank=True, verbose_name='frequent followers', symmetrical=False,
-                                 related_name='related_by_bga',
-                                 help_text='words that frequently follow this '
-                                           '(i.e. havoc follows wreak')
-    bgb = models.ManyToManyField('self', through='BGB', blank=True, verbose_name='frequent predecessors', symmetrical=False,
-                                 related_name='related_by_bgb',
-                                 help_text='words that frequently precede this'
-                                           '(i.e. wreck precedes havoc')
-    rhy = models.ManyToManyField('self', through='RHY', blank=True, verbose_name='rhymes', symmetrical=False,
-                                 help_text='perfect rhymes', related_name='related_by_rhy')
-    nry = models.ManyToManyField('self', through='NRY', blank=True, verbose_name='near rhymes', symmetrical=False,
-                                 help_text='approximate rhymes',
-                                 related_name='related_by_nry')
-    hom = models.ManyToManyField('self', through='HOM', blank=True, verbose_name='homophones', symmetrical=False,
-                                 help_text='sound-alike words',
-                                 related_name='related_by_hom')
-    cns = models.ManyToManyField('self', through='CNS', blank=True, verbose_name='consonant matches', symmetrical=False,
-                                 help_text='i.e. sample and simple',
-                                 related_name='related_by_cns')
+    # Remaining attributes hold words related to this word. The relationships are stored in the WordRelation table.
+    # Attribute names derived from three-letter codes used by rel_[code] DataMuse parameter.
+    # datamuse_json skips a related word DataMuse query if the attribute is already populated.
+    jja = RelatedWordsDescriptor('jja')
+    jjb = RelatedWordsDescriptor('jjb')
+    syn = RelatedWordsDescriptor('syn')
+    trg = RelatedWordsDescriptor('trg', help_text='words that are statistically associated with this word '
+                                                  'in the same piece of text')
+    ant = RelatedWordsDescriptor('ant')
+    spc = RelatedWordsDescriptor('spc', help_text='words with a similar, but broader meaning '
+                                                  '(i.e. boat is a hypernym of gondola)')
+    gen = RelatedWordsDescriptor('gen', help_text='words with a similar, but more specific meaning '
+                                                  '(i.e. gondola is a hyponym of boat)')
+    com = RelatedWordsDescriptor('com', help_text='things which this is composed of'
+                                                  '(a car has an accelerator, a steering wheel, etc.')
+    par = RelatedWordsDescriptor('par', help_text='things of which this is a part of'
+                                                  '(a window is a part of a car, a house, a boat, etc.)')
+    bga = RelatedWordsDescriptor('bga', help_text='words that frequently follow this '
+                                                  '(i.e. havoc follows wreak')
+    bgb = RelatedWordsDescriptor('bgb', help_text='words that frequently precede this'
+                                                  '(i.e. wreck precedes havoc')
+    rhy = RelatedWordsDescriptor('rhy', help_text='perfect rhymes')
+    nry = RelatedWordsDescriptor('nry', help_text='approximate rhymes')
+    hom = RelatedWordsDescriptor('hom', help_text='sound-alike words')
+    cns = RelatedWordsDescriptor('cns', help_text='i.e. sample and simple')
 
     class Meta:
         # for each language, there should be only one word with a certain name
         constraints = [models.UniqueConstraint(fields=['name', 'language'], name='unique_word_per_language'), ]
+        # partial index holding only the words missing data from Datamuse, scanned in order of id by datamuse_backfill
+        indexes = [models.Index(fields=['id'], name='word_missing_data', condition=models.Q(datamuse_success=False)), ]
 
     def save(self, *args, **kwargs):
         self.name = self.name.lower()  # Convert name to lowercase
@@ -138,78 +192,33 @@ class Word(models.Model):
 
 
 class WordRelation(models.Model):
-    """Base class for classes that govern the ManyToManyFields that hold words related to a word."""
+    """A word related to a word, as returned by a Datamuse rel_[code] query.
+
+    The words related to a word by every relation type are held in this one table, so all of the related words needed
+    for a chart can be fetched with a single query (using the index on source_word, code and score)."""
 
-    # %(class)s is replaced with the lowercase of the class name in subclasses
-    source_word = models.ForeignKey(Word, on_delete=models.CASCADE, related_name='%(class)s_relations')
-    related_word = models.ForeignKey(Word, on_delete=models.CASCADE, related_name='linked_%(class)s_relations')
+    # no separate index on source_word is needed, as it leads the word_relation_lookup index
+    source_word = models.ForeignKey(Word, on_delete=models.CASCADE, related_name='relations', db_index=False)
+    related_word = models.ForeignKey(Word, on_delete=models.CASCADE, related_name='linked_relations')
+
+    # three letter code used by the rel_[code] DataMuse parameter
+    code = models.CharField(max_length=3, choices=relation_choices)
 
     # an integer returned by DataMuse that indicates relative popularity or relevance of the word compared to other
     # words in the list of related words
     score = models.IntegerField(null=True, blank=True)
 
     class Meta:
-        abstract = True
-
-
-class JJA(WordRelation):
-    pass
-
-
-class JJB(WordRelation):
-    pass
-
-
-class SYN(WordRelation):
-    pass
-
-
-class TRG(WordRelation):
-    pass
-
-
-class ANT(WordRelation):
-    pass
-
-
-class SPC(WordRelation):
-    pass
-
-
-class GEN(WordRelation):
-    pass
-
-
-class COM(WordRelation):
-    pass
-
-
-class PAR(WordRelation):
-    pass
-
-
-class BGA(WordRelation):
-    pass
+        # related words are looked up by source word and code, and listed in order of score
+        indexes = [models.Index(fields=['source_word', 'code', '-score'], name='word_relation_lookup'), ]
+        # a word can only be related to another word once for each relation type
+        constraints = [
+            models.UniqueConstraint(fields=['source_word', 'code', 'related_word'], name='unique_word_relation'),
+        ]
 
-
-class BGB(WordRelation):
-    pass
-
-
-class RHY(WordRelation):
-    pass
-
-
-class NRY(WordRelation):
-    pass
-
-
-class HOM(WordRelation):
-    pass
-
-
-class CNS(WordRelation):
-    pass
+    def __str__(self):
+        """String for representing the Model object"""
+        return f'{self.source_word} {self.code} {self.related_word}'
 
 
 class PartOfSpeech(models.Model):
@@ -263,11 +272,201 @@ class WordSet(models.Model):
 class Membership(models.Model):
     """Class holding information for a word's inclusion in a wordset.
 
-    Occurrences is the number of times the word appears in the set."""
+    Occurrences is the number of times the word appears in the set. word_name is a copy of the name of the word, so
+    the memberships of a WordSet can be read in order of word name from an index, a page at a time, without joining
+    the Word table (see pagination.membership_page). It is filled in by save(), and for the Memberships created by
+    wordset.words.add() by fill_membership_word_names; code creating Memberships with bulk_create must set it."""
     word = models.ForeignKey(Word, on_delete=models.CASCADE)
     wordset = models.ForeignKey(WordSet, on_delete=models.CASCADE)
     occurrences = models.IntegerField(default=1)
+    word_name = models.CharField(max_length=100, blank=True)
 
     class Meta:
         # for each WordSet and word, there should be only one Membership
         constraints = [models.UniqueConstraint(fields=['word', 'wordset'], name='unique_word_per_wordset'), ]
+        # ordered scans of the memberships of a WordSet by word name
+        indexes = [models.Index(fields=['wordset', 'word_name', 'id'], name='membership_by_word_name'), ]
+
+    def save(self, *args, **kwargs):
+        if not self.word_name:
+            self.word_name = self.word.name
+        super().save(*args, **kwargs)
+
+
+@receiver(m2m_changed, sender=Membership)
+def fill_membership_word_names(sender, instance, action, reverse, pk_set, **kwargs):
+    """Fills in the word_name of the Memberships created by the add() method of the words of a WordSet (or the
+    wordsets of a Word), which creates them in bulk without calling Membership.save()."""
+    if action != 'post_add' or not pk_set:
+        return
+    memberships = Membership.objects.filter(word_name='')
+    if reverse:
+        memberships = memberships.filter(word=instance, wordset__in=pk_set)
+    else:
+        memberships = memberships.filter(wordset=instance, word__in=pk_set)
+    memberships.update(word_name=Subquery(Word.objects.filter(id=OuterRef('word_id')).values('name')[:1]))
+
+
+class Median(models.Aggregate):
+    """Median of the (non-null) values of an expression, computed by PostgreSQL's percentile_cont."""
+    function = 'PERCENTILE_CONT'
+    name = 'Median'
+    template = '%(function)s(0.5) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = models.FloatField()
+
+
+class WordSetStatsQuerySet(models.query.QuerySet):
+    """QuerySet for WordSetStats that recomputes the statistics of WordSets."""
+
+    def refresh(self, wordset: WordSet):
+        """Recomputes and saves the statistics of wordset, using two queries (three the first time). Returns the
+        WordSetStats."""
+        stats = Membership.objects.filter(wordset=wordset).aggregate(
+            unique_words=models.Count('id'),
+            total_occurrences=models.Sum('occurrences'),
+            recognized_words=models.Count('id', filter=models.Q(word__datamuse_success=True)),
+            frequency_min=models.Min('word__frequency'),
+            frequency_median=Median('word__frequency'),
+            frequency_max=models.Max('word__frequency'),
+        )
+        stats['total_occurrences'] = stats['total_occurrences'] or 0
+        stats['missing_data_words'] = stats['unique_words'] - stats['recognized_words']
+        stats['unrecognized_words'] = wordset.unrecognized_words.count('<br>')
+        if stats['frequency_median'] is not None:
+            stats['frequency_median'] = round(stats['frequency_median'], 6)
+        stats['updated'] = timezone.now()
+        # update the existing row if there is one (without locking it first, as update_or_create would), else create it
+        if self.filter(wordset=wordset).update(**stats):
+            return WordSetStats(wordset=wordset, **stats)
+        return self.create(wordset=wordset, **stats)
+
+    def refresh_for_words(self, word_ids):
+        """Recomputes the statistics of each WordSet that holds any of the words with ids in word_ids (i.e. after the
+        data of the words was refreshed from Datamuse). Uses one query plus two for each such WordSet."""
+        wordset_ids = Membership.objects.filter(word__in=word_ids).values_list('wordset', flat=True).distinct()
+        for wordset in WordSet.objects.filter(id__in=list(wordset_ids)):
+            self.refresh(wordset)
+
+    def for_wordset(self, wordset: WordSet):
+        """Returns the statistics of wordset, computing them if the WordSet has none yet."""
+        try:
+            return wordset.stats
+        except WordSetStats.DoesNotExist:
+            return self.refresh(wordset)
+
+
+class WordSetStats(models.Model):
+    """Summary statistics of a WordSet, so pages showing a WordSet need not count or aggregate its words.
+
+    Written when the words of a new WordSet have been processed (see wordset_build.finish_build) and recomputed when
+    the data of any of its words is refreshed from Datamuse (see datamuse_json)."""
+    objects = WordSetStatsQuerySet.as_manager()
+
+    wordset = models.OneToOneField(WordSet, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+
+    # number of distinct words in the WordSet and their total number of occurrences
+    unique_words = models.IntegerField(default=0)
+    total_occurrences = models.IntegerField(default=0)
+
+    # words with data from Datamuse, and words Datamuse did not respond for when their data was queried
+    recognized_words = models.IntegerField(default=0)
+    missing_data_words = models.IntegerField(default=0)
+
+    # strings from the uploads that Datamuse did not recognize as words (which are not in the WordSet)
+    unrecognized_words = models.IntegerField(default=0)
+
+    # range and median of the frequencies of the words (None if no word has a frequency)
+    frequency_min = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True)
+    frequency_median = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True)
+    frequency_max = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True)
+
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'word set stats'
+
+    def __str__(self):
+        """String for representing the Model object"""
+        return f'{self.wordset.name}: {self.unique_words} words'
+
+
+class DatamuseResponse(models.Model):
+    """A cached result of a Datamuse query, used by the database backend of words.datamuse_cache.
+
+    key is derived from the query parameters (see datamuse_cache.cache_key)."""
+    key = models.CharField(max_length=40, primary_key=True)
+    result = JSONField()
+    expires = models.DateTimeField(db_index=True)
+
+
+def is_storable_name(name: str):
+    """Returns True if name fits in the name of a Word or an UnrecognizedWord. Longer strings (such as the junk tokens
+    of an upload) are never words, so they are neither looked up nor recorded."""
+    return len(name) <= Word._meta.get_field('name').max_length
+
+
+class UnrecognizedWordQuerySet(models.query.QuerySet):
+    """QuerySet for UnrecognizedWord that separates entries that are still valid from expired ones."""
+
+    def cutoff(self):
+        """Entries checked before this time are expired (see settings.UNRECOGNIZED_WORD_TTL)."""
+        return timezone.now() - timedelta(days=settings.UNRECOGNIZED_WORD_TTL)
+
+    def current(self):
+        return self.filter(last_checked__gte=self.cutoff())
+
+    def expired(self):
+        """Entries no query reads any more, deleted by each Datamuse backfill (see datamuse_backfill)."""
+        return self.filter(last_checked__lt=self.cutoff())
+
+    def record(self, names, language):
+        """Records that Datamuse did not recognize any of the strings in names, using two queries. Strings too long to
+        be stored are left out (see is_storable_name)."""
+        names = {name for name in names if is_storable_name(name)}
+        if not names:
+            return
+        now = timezone.now()
+        # refresh the entries that already exist, then create the rest
+        self.filter(name__in=names, language=language).update(last_checked=now)
+        self.bulk_create([UnrecognizedWord(name=name, language_id=language, last_checked=now) for name in names],
+                         ignore_conflicts=True)
+
+
+class UnrecognizedWord(models.Model):
+    """A string that Datamuse did not recognize as a word in a language.
+
+    Used to skip Datamuse queries for strings (typos, names, escape sequences...) known not to be words. An entry
+    expires settings.UNRECOGNIZED_WORD_TTL days after last_checked, after which Datamuse is queried for the string
+    again."""
+    objects = UnrecognizedWordQuerySet.as_manager()
+
+    name = models.CharField(max_length=100)
+    language = models.ForeignKey('Language', default=default_language, on_delete=models.CASCADE)
+    last_checked = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # for each language, there should be only one entry for a certain string
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'language'], name='unique_unrecognized_word_per_language'),
+        ]
+
+    def __str__(self):
+        """String for representing the Model object"""
+        return self.name
+
+
+class SpooledUploadChunk(models.Model):
+    """Part of the words of an upload, stored by the database backend of words.upload_spool.
+
+    The words of an upload are split into chunks of lines (in the format of upload_spool), which are read back in order
+    of index, so an upload never has to be held in memory all at once."""
+    key = models.CharField(max_length=64)
+    index = models.PositiveIntegerField()
+    data = models.TextField()
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # the chunks of an upload are unique and read back in order of index
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'index'], name='unique_spooled_upload_chunk'),
+        ]
@@ -0,0 +1,66 @@
+"""Keyset pagination: pages of rows are selected by a cursor holding the sort key of the last row of the previous page,
+rather than by an offset, so fetching a page deep in a large WordSet costs the same as fetching the first one.
+
+A cursor is an opaque string (URL-safe base64 of a JSON array of the values of the sort key) that clients pass back
+unchanged to get the following page."""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+from words.models import WordSet
+
+
+def encode_cursor(*values):
+    """Returns the cursor holding values (which must be serializable as JSON)."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, length: int):
+    """Returns the list of length values held by cursor. Raises ValueError if cursor is not valid."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError(f'invalid cursor: {cursor}')
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError(f'invalid cursor: {cursor}')
+    return values
+
+
+def decode_membership_cursor(cursor: str):
+    """Returns the (word name, Membership id) tuple held by a cursor returned by membership_page. Raises ValueError if
+    cursor is not valid."""
+    word_name, membership_id = decode_cursor(cursor, 2)
+    if not isinstance(word_name, str) or not isinstance(membership_id, int):
+        raise ValueError(f'invalid cursor: {cursor}')
+    return word_name, membership_id
+
+
+def membership_page(wordset: WordSet, limit: int, cursor: str = None):
+    """Returns a page of the words of wordset in order of name: a dictionary holding
+
+        words: the limit words following cursor (or the first limit words if cursor is None), each with its name and
+               number of occurrences in the WordSet
+        next:  the cursor of the following page, or None if this is the last page
+
+    Reads the memberships of wordset from the membership_by_word_name index with a single query. Raises ValueError if
+    cursor is not valid."""
+    queryset = wordset.membership_set.all()
+    if cursor is not None:
+        word_name, membership_id = decode_membership_cursor(cursor)
+        # the first condition bounds the index scan; the second skips the rows up to the cursor
+        queryset = queryset.filter(word_name__gte=word_name).filter(
+            Q(word_name__gt=word_name) | Q(word_name=word_name, id__gt=membership_id)
+        )
+
+    # fetch one more row than needed to find out if there are rows after the page
+    rows = list(queryset.order_by('word_name', 'id').values_list('word_name', 'occurrences', 'id')[:limit + 1])
+    words = [{"name": name, "occurrences": occurrences} for name, occurrences, _ in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last_name, _, last_id = rows[limit - 1]
+        next_cursor = encode_cursor(last_name, last_id)
+
+    return {"words": words, "next": next_cursor}
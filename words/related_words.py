@@ -0,0 +1,160 @@
+"""The related words chart: building its json object from stored relations, and the jobs that query Datamuse for the
+relations that are not stored yet (views.related_words_process).
+
+The view builds the part of the chart whose relation types are all stored, using a single query (see
+stored_relations), and only enqueues a job for the missing relation types; the page merges the result of the job into
+the chart when it finishes.
+
+Jobs are enqueued single-flight: requests for the chart of the same word and relation types share a single job rather
+than each enqueueing their own.
+The id of a job is derived from its word, relation types and language (see job_id), so a request looks up the job
+for its chart in Redis before enqueueing one. A job that is queued or running, or that finished less than
+settings.RELATED_WORDS_RESULT_TTL seconds ago (its result is kept by RQ for that long), is shared: the request returns
+its id, and the page follows that job (see job_progress). A new job is enqueued with the same id when there is no job,
+or when the last one failed or could not reach Datamuse.
+
+The job is claimed in a Redis transaction watching the key of the job, so of the requests that arrive together only
+one enqueues it (see enqueue_shared, which also shares the jobs expanding related words graphs, see
+related_words_graph)."""
+import hashlib
+import json
+from typing import List
+
+from django.conf import settings
+from redis import WatchError
+from rq import Queue
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+
+from words import datamuse_json
+from words.models import WordRelation, default_language, relation_verbose_names
+
+
+def stored_relations(word: str, codes: List[str]):
+    """Returns a dict mapping each code in codes for which relations of word are stored to the list of its
+    WordRelations (with related_word selected), in order of score, using a single query."""
+    relations_by_code = {}
+    for relation in WordRelation.objects.filter(source_word__name=word.strip().lower(), code__in=codes)\
+            .select_related('related_word').order_by('code', '-score'):
+        relations_by_code.setdefault(relation.code, []).append(relation)
+    return relations_by_code
+
+
+def build_chart(word: str, codes: List[str], relations_by_code: dict):
+    """Returns the result of the related words chart of word for the relation types in codes, from relations_by_code
+    (mapping codes to their WordRelations, in order of score): a dict holding the json object of the chart, and the
+    verbose names of the relation types in codes without related words (relations_with_no_results) if there are any.
+    If none of the relation types have related words, the dict holds a datamuse_error instead of the json object."""
+    result = {}
+    relations_with_no_results = [relation_verbose_names[code] for code in codes if code not in relations_by_code]
+    if relations_with_no_results:
+        result['relations_with_no_results'] = relations_with_no_results
+
+    if any(code in relations_by_code for code in codes):
+        result['json_object'] = {
+            "name": word,
+            "children": [
+                # a dictionary (read by js as an object) for each relation type, holding all the words related by
+                # this relation type and the associated score
+                {
+                    "name": relation_verbose_names[code],
+                    "children": [
+                        {"name": relation.related_word.name, "score": relation.score}
+                        for relation in relations_by_code[code]
+                    ]
+                }
+                for code in codes if code in relations_by_code
+            ]
+        }
+    else:
+        # Datamuse did not return related words for any relation code
+        result['datamuse_error'] = f'No related words found for word "{word}" for the chosen relations'
+    return result
+
+
+def merge_results(word: str, codes: List[str], page_result: dict, job_result: dict):
+    """Returns the result of the related words chart of word for the relation types in codes, merging job_result (the
+    result of the job for some of the relation types, see views.related_words_process) into page_result (built by
+    build_chart for the others), as the page does when the job finishes."""
+    names = [relation_verbose_names[code] for code in codes]
+    children = [child for result in (page_result, job_result) if 'json_object' in result
+                for child in result['json_object']['children']]
+    relations_with_no_results = page_result.get('relations_with_no_results', []) + \
+        job_result.get('relations_with_no_results', [])
+
+    result = {}
+    if children:
+        children.sort(key=lambda child: names.index(child['name']))
+        result['json_object'] = {'name': word, 'children': children}
+    if relations_with_no_results:
+        result['relations_with_no_results'] = sorted(relations_with_no_results, key=names.index)
+    if 'datamuse_error' in job_result and not (children and 'relations_with_no_results' in job_result):
+        # the job's error, unless it only says that none of the job's relation types have related words
+        result['datamuse_error'] = job_result['datamuse_error']
+    return result
+
+
+def job_id(word: str, codes: List[str], language: str = None):
+    """Returns the id of the job building the chart of word for the relation types in codes (in any order)."""
+    if language is None:
+        language = default_language()
+    key = json.dumps([language, word.strip().lower(), sorted(set(codes))])
+    return f'related-words-{hashlib.sha1(key.encode()).hexdigest()}'
+
+
+def is_shared(status: str, job: Job):
+    """Returns True if a request for the chart of job (whose status is status) can follow job."""
+    if status == JobStatus.FINISHED:
+        # Datamuse could not be reached, so the chart may be complete if built again
+        return not (isinstance(job.result, dict) and job.result.get('retryable'))
+    return status != JobStatus.FAILED
+
+
+def enqueue(queue: Queue, word: str, codes: List[str], language: str = None):
+    """Returns the job building the chart of word for the relation types in codes: the job shared by the requests for
+    the same chart if there is one (see is_shared), otherwise a job enqueued on queue."""
+    word = word.strip().lower()
+    # the chart lists the relation types in the order of relation_codes, whichever request enqueued it
+    codes = [code for code in datamuse_json.relation_codes if code in codes]
+    return enqueue_shared(queue, job_id(word, codes, language), 'words.views.related_words_process', (word, codes),
+                          f'related words: {word} ({", ".join(codes)})')
+
+
+def enqueue_shared(queue: Queue, id: str, func: str, args: tuple, description: str):
+    """Returns the job with id if it can be shared (see is_shared), otherwise enqueues a job with id on queue, calling
+    func (the import path of a function) with args."""
+    with queue.connection.pipeline() as pipeline:
+        while True:
+            try:
+                pipeline.watch(Job.key_for(id))
+                status = pipeline.hget(Job.key_for(id), 'status')
+                if status is not None:
+                    try:
+                        job = Job.fetch(id, connection=queue.connection)
+                        if is_shared(status.decode(), job):
+                            return job
+                    except NoSuchJobError:
+                        # the job expired since its status was read
+                        pass
+
+                # claim the id; a request that watched the key at the same time fails with WatchError and shares
+                # the job instead
+                job = Job.create(func=func,
+                                 args=args,
+                                 connection=queue.connection,
+                                 status=JobStatus.QUEUED,
+                                 result_ttl=settings.RELATED_WORDS_RESULT_TTL,
+                                 # if the job is claimed but never enqueued, its id is freed after this long
+                                 ttl=settings.RELATED_WORDS_JOB_TTL,
+                                 description=description,
+                                 id=id,
+                                 origin=queue.name)
+                pipeline.multi()
+                job.save(pipeline=pipeline)
+                job.cleanup(ttl=job.ttl, pipeline=pipeline)
+                pipeline.execute()
+                break
+            except WatchError:
+                continue
+
+    return queue.enqueue_job(job)
@@ -0,0 +1,129 @@
+"""Cache of the related words charts built by views.related_words_process, so that a chart built from relations that
+are all stored is served by the view itself rather than by a job.
+
+A chart only depends on the WordRelations of its word, so it is cached in Redis under its word and relation types,
+along with the version of the word's relations. The version is a counter that datamuse_json increments each
+time it adds relations for the word (see invalidate), which makes every chart cached for the word stale at once; stale
+charts are never read again and expire after settings.RELATED_WORDS_CACHE_TTL seconds. A job reads the version before
+it reads the relations, so a chart built while relations were being added is stored under the old version.
+
+The relation types Datamuse returned no words related to a word for are recorded as well (see add_no_results), so
+that the view treats them like stored relation types rather than enqueueing a job for them again. Relations stored for
+such a type later take precedence, so the record is not versioned; it expires after settings.RELATED_WORDS_CACHE_TTL
+seconds, after which Datamuse is queried again.
+
+If Redis is unavailable, the error is logged and the chart is treated as a miss."""
+import hashlib
+import json
+import logging
+from typing import Iterable, List
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+# Get an instance of a logger
+logger = logging.getLogger(__name__)
+
+
+class RelatedWordsCache:
+    """Versioned cache of related words charts (the results of views.related_words_process), kept for ttl seconds. A
+    cache with ttl=0 holds nothing."""
+
+    prefix = 'related-words-chart'
+
+    def __init__(self, ttl: int, connection=None):
+        self.ttl = ttl
+        self._connection = connection
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            # the Redis client used by django-rq
+            from words.views import redis_cursor
+            self._connection = redis_cursor
+        return self._connection
+
+    def version_key(self, word: str):
+        return f'{self.prefix}:version:{word.strip().lower()}'
+
+    def chart_key(self, word: str, codes: List[str], version: int):
+        codes_hash = hashlib.sha1(json.dumps(sorted(set(codes))).encode()).hexdigest()
+        return f'{self.prefix}:{word.strip().lower()}:{version}:{codes_hash}'
+
+    def no_results_key(self, word: str):
+        return f'{self.prefix}:no-results:{word.strip().lower()}'
+
+    def version(self, word: str):
+        """Returns the version of the relations of word (0 if none were added since the version expired), or None if
+        the cache is disabled or unavailable."""
+        if not self.ttl:
+            return None
+        try:
+            return int(self.connection.get(self.version_key(word)) or 0)
+        except RedisError as e:
+            logger.warning(f'related words cache unavailable: {e}')
+            return None
+
+    def get(self, word: str, codes: List[str]):
+        """Returns the cached chart of word for the relation types in codes, or None if there is none."""
+        version = self.version(word)
+        if version is None:
+            return None
+        try:
+            chart = self.connection.get(self.chart_key(word, codes, version))
+        except RedisError as e:
+            logger.warning(f'related words cache unavailable: {e}')
+            return None
+        return None if chart is None else json.loads(chart)
+
+    def set(self, word: str, codes: List[str], version: int, chart: dict):
+        """Stores chart, built from the relations of word at version (read with version() before the relations)."""
+        if version is None:
+            return
+        try:
+            pipeline = self.connection.pipeline()
+            pipeline.set(self.chart_key(word, codes, version), json.dumps(chart), ex=self.ttl)
+            # the version outlives the charts cached under it, so that it never starts over while one of them is kept
+            pipeline.expire(self.version_key(word), 2 * self.ttl)
+            pipeline.execute()
+        except RedisError as e:
+            logger.warning(f'related words cache unavailable: {e}')
+
+    def no_results(self, word: str):
+        """Returns the set of relation types Datamuse returned no words related to word for (see add_no_results), which
+        is empty if the cache is disabled or unavailable."""
+        if not self.ttl:
+            return set()
+        try:
+            return {code.decode() for code in self.connection.smembers(self.no_results_key(word))}
+        except RedisError as e:
+            logger.warning(f'related words cache unavailable: {e}')
+            return set()
+
+    def add_no_results(self, word: str, codes: List[str]):
+        """Records that Datamuse returned no words related to word for the relation types in codes."""
+        if not self.ttl or not codes:
+            return
+        try:
+            pipeline = self.connection.pipeline()
+            pipeline.sadd(self.no_results_key(word), *codes)
+            pipeline.expire(self.no_results_key(word), self.ttl)
+            pipeline.execute()
+        except RedisError as e:
+            logger.warning(f'related words cache unavailable: {e}')
+
+    def invalidate(self, words: Iterable[str]):
+        """Makes the cached charts of each of words stale, after relations were added for them."""
+        if not self.ttl:
+            return
+        try:
+            pipeline = self.connection.pipeline()
+            for word in words:
+                pipeline.incr(self.version_key(word))
+                pipeline.expire(self.version_key(word), 2 * self.ttl)
+            pipeline.execute()
+        except RedisError as e:
+            logger.warning(f'related words cache unavailable: {e}')
+
+
+cache = RelatedWordsCache(settings.RELATED_WORDS_CACHE_TTL)
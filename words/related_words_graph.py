@@ -0,0 +1,204 @@
+"""Related words graph: the words related to a word through several hops of a single relation type (for instance the
+synonyms of the word, the synonyms of each synonym, and so on), charted as a radial dendrogram branching out from the
+word.
+
+The graph is expanded breadth-first by an RQ job (graph_job), one level at a time. The words added by a level (its
+frontier) are the parents of the next level:
+    - each word of the frontier branches out to at most fan_out of its related words, in order of score, leaving out
+      the related words scoring less than min_score and the words already in the graph (so a word appears only once,
+      at its shallowest level, under the first parent that reached it).
+    - the stored relations of the whole frontier are read in a single query. Datamuse is only queried for the frontier
+      words with no stored relations, concurrently (see datamuse_json.run_queries), and their relations are saved in
+      bulk, so a level costs a constant number of queries and about one Datamuse round trip rather than one serial
+      add_related per word.
+    - the expansion stops after depth levels (at most settings.RELATED_WORDS_GRAPH_MAX_DEPTH), or when a level adds
+      no words.
+
+Each level is appended to job.meta['levels'] and published (see job_progress) as soon as it is expanded, so the page
+draws the first level of the chart while the next one is being fetched. Jobs are shared by the requests for the same
+graph, like the jobs of the related words chart (see related_words.enqueue_shared)."""
+import hashlib
+import json
+import logging
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db.models import F
+from rq import Queue
+from rq.job import get_current_job
+
+from words import datamuse_json, job_progress, related_words, related_words_cache
+from words.datamuse_json import DatamuseWordNotRecognizedError
+from words.models import WordRelation, default_language
+
+# Get an instance of a logger
+logger = logging.getLogger(__name__)
+
+
+def stored_relations(names: Iterable[str], code: str):
+    """Returns a dict mapping each of names with stored relations of type code to a list of (related word, score)
+    tuples, in order of score, using a single query."""
+    relations_by_name = {}
+    for name, related_name, score in WordRelation.objects.filter(source_word__name__in=names, code=code)\
+            .order_by('source_word__name', F('score').desc(nulls_last=True))\
+            .values_list('source_word__name', 'related_word__name', 'score'):
+        relations_by_name.setdefault(name, []).append((related_name, score or 0))
+    return relations_by_name
+
+
+def fetch_relations(names: Iterable[str], code: str, workers: int = None):
+    """Queries Datamuse concurrently for the words related to each of names by relation type code, and saves them in
+    bulk. Returns the list of names Datamuse could not be reached for."""
+    queries = {name: {f'rel_{code}': name, 'md': 'dpf'} for name in names}
+    logger.debug(f'querying Datamuse for words related to {list(queries)} by {code}')
+
+    results = {}
+    failed_names = []
+    for name, result in datamuse_json.run_queries(queries, workers):
+        if isinstance(result, ConnectionError):
+            logger.error(result)
+            failed_names.append(name)
+        elif result:
+            results[name] = result
+
+    if results:
+        # save every related word, then every relation, in bulk
+        words = datamuse_json.bulk_decode_words([item for result in results.values() for item in result])
+        words.update(datamuse_json.bulk_get_or_create_words(results.keys() - words.keys()))
+        WordRelation.objects.bulk_create(
+            [WordRelation(source_word=words[name], related_word=words[item['word'].lower()], code=code,
+                          score=item.get('score', 0))
+             for name, result in results.items() for item in result],
+            ignore_conflicts=True
+        )
+        # the charts cached for these words are out of date
+        related_words_cache.cache.invalidate(results.keys())
+
+    return failed_names
+
+
+def expand(word: str, code: str, depth: int, fan_out: int = None, min_score: int = None, workers: int = None):
+    """Expands the graph of the words related to word by relation type code breadth-first, up to depth levels (see the
+    module docstring). fan_out and min_score default to settings.RELATED_WORDS_GRAPH_FAN_OUT and
+    settings.RELATED_WORDS_GRAPH_MIN_SCORE.
+
+    Yields a dict for each level as soon as it is expanded, holding its number (level, 1 for the words related to
+    word), its words (nodes, a list of dicts holding the name, parent and score of each word) and the words of the
+    previous level Datamuse could not be reached for (failed_words). Raises DatamuseWordNotRecognizedError if
+    Datamuse does not recognize word."""
+    if code not in datamuse_json.relation_codes:
+        raise ValueError(f'{code} is not a valid related word code.')
+    if fan_out is None:
+        fan_out = settings.RELATED_WORDS_GRAPH_FAN_OUT
+    if min_score is None:
+        min_score = settings.RELATED_WORDS_GRAPH_MIN_SCORE
+
+    word = word.strip().lower()
+    if not datamuse_json.add_or_update_word(word):
+        raise DatamuseWordNotRecognizedError(word)
+
+    visited = {word}
+    frontier = [word]
+    for level in range(1, min(depth, settings.RELATED_WORDS_GRAPH_MAX_DEPTH) + 1):
+        relations_by_name = stored_relations(frontier, code)
+        missing_names = [name for name in frontier if name not in relations_by_name]
+        failed_names = []
+        if missing_names:
+            failed_names = fetch_relations(missing_names, code, workers)
+            fetched_names = [name for name in missing_names if name not in failed_names]
+            if fetched_names:
+                relations_by_name.update(stored_relations(fetched_names, code))
+
+        nodes = []
+        for parent in frontier:
+            children = 0
+            for name, score in relations_by_name.get(parent, []):
+                if children == fan_out or score < min_score:
+                    # the relations are in order of score, so the rest score lower
+                    break
+                if name not in visited:
+                    visited.add(name)
+                    nodes.append({'name': name, 'parent': parent, 'score': score})
+                    children += 1
+
+        yield {'level': level, 'nodes': nodes, 'failed_words': failed_names}
+        if not nodes:
+            return
+        frontier = [node['name'] for node in nodes]
+
+
+def build_tree(word: str, levels: List[dict]):
+    """Returns the json object of the related words graph chart of word from the levels yielded by expand: the tree of
+    the words, each holding its name, its score and the list of its children (if it has any)."""
+    tree = {'name': word.strip().lower(), 'children': []}
+    nodes = {tree['name']: tree}
+    for level in levels:
+        for node in level['nodes']:
+            nodes[node['name']] = {'name': node['name'], 'score': node['score']}
+            nodes[node['parent']].setdefault('children', []).append(nodes[node['name']])
+    return tree
+
+
+def graph_job(word: str, code: str, depth: int, fan_out: int = None, min_score: int = None):
+    """RQ job expanding the related words graph of word (see expand). Each level is added to job.meta['levels'] and
+    published as soon as it is expanded. Returns the result of the chart: a dict holding its json object (see
+    build_tree), or a datamuse_error."""
+    job = get_current_job()
+    word = word.strip().lower()
+    result = {}
+    levels = []
+    if job is not None:
+        # the root of the tree the page builds from the levels
+        job.meta['word'] = word
+        job.meta['levels'] = levels
+
+    try:
+        for level in expand(word, code, depth, fan_out, min_score):
+            levels.append(level)
+            if job is not None:
+                job.save_meta()
+                job_progress.publish(job)
+
+        failed = any(level['failed_words'] for level in levels)
+        if levels and levels[0]['nodes']:
+            result['json_object'] = build_tree(word, levels)
+        elif not failed:
+            result['datamuse_error'] = f'No related words found for word "{word}" for the chosen relation'
+        if failed:
+            # the graph is missing the words related to the words Datamuse could not be reached for
+            result.setdefault('datamuse_error', 'Datamuse service unavailable, the chart is incomplete')
+            result['retryable'] = True
+
+    except DatamuseWordNotRecognizedError as e:
+        # no chart to display because Datamuse does not recognize the word
+        result['datamuse_error'] = e.message
+    except (ConnectionError, ValueError) as e:
+        # no chart to display due to error when querying Datamuse
+        result['datamuse_error'] = str(e)
+        # the next request for this graph enqueues a new job rather than sharing this one (see related_words)
+        result['retryable'] = True
+
+    # push the result to pages watching the job (see job_progress)
+    job_progress.publish(job, 'finished', result)
+    return result
+
+
+def job_id(word: str, code: str, depth: int, fan_out: int, min_score: int, language: str = None):
+    """Returns the id of the job expanding the related words graph of word with these parameters."""
+    if language is None:
+        language = default_language()
+    key = json.dumps([language, word.strip().lower(), code, depth, fan_out, min_score])
+    return f'related-words-graph-{hashlib.sha1(key.encode()).hexdigest()}'
+
+
+def enqueue(queue: Queue, word: str, code: str, depth: int, fan_out: int = None, min_score: int = None):
+    """Returns the job expanding the related words graph of word: the job shared by the requests for the same graph if
+    there is one, otherwise a job enqueued on queue."""
+    word = word.strip().lower()
+    if fan_out is None:
+        fan_out = settings.RELATED_WORDS_GRAPH_FAN_OUT
+    if min_score is None:
+        min_score = settings.RELATED_WORDS_GRAPH_MIN_SCORE
+    return related_words.enqueue_shared(queue, job_id(word, code, depth, fan_out, min_score),
+                                        'words.related_words_graph.graph_job', (word, code, depth, fan_out, min_score),
+                                        f'related words graph: {word} ({code}, {depth} levels)')
@@ -0,0 +1,95 @@
+from decimal import Decimal
+
+from django.test import TestCase, SimpleTestCase
+
+from words import chart_data
+from words.models import WordSet, Word
+
+
+class CursorTest(SimpleTestCase):
+    def test_round_trip(self):
+        cursor = chart_data.encode_cursor(Decimal('22.500000'), 'bike')
+        self.assertEqual(chart_data.decode_cursor(cursor), (Decimal('22.5'), 'bike'))
+
+    def test_invalid_cursor(self):
+        for cursor in ['not a cursor', 'W10=', chart_data.encode_cursor('x', 'bike')]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    chart_data.decode_cursor(cursor)
+
+
+class FrequencyPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.wordset = WordSet.objects.create(name='test')
+        frequencies = [('and', 25000), ('for', 8000), ('bike', 22.5), ('walk', 12), ('gondola', 0.4),
+                       ('zzz', 0), ('none', None)]
+        for name, frequency in frequencies:
+            cls.wordset.words.add(Word.objects.create(name=name, frequency=frequency))
+
+    def test_tail_aggregated_by_power_of_ten(self):
+        with self.assertNumQueries(2):
+            page = chart_data.frequency_page(self.wordset, 1)
+        self.assertEqual(page['words'], [{'name': 'and', 'title': 'and', 'group': 'test', 'value': 25000.0}])
+        self.assertEqual(
+            [(item['name'], item['count'], item['value'], item['min'], item['max']) for item in page['bins']],
+            [('1000–10000', 1, 8000.0, 8000.0, 8000.0),
+             ('10–100', 2, 34.5, 12.0, 22.5),
+             ('0.1–1', 1, 0.4, 0.4, 0.4),
+             ('0', 1, 0.0, 0.0, 0.0)]
+        )
+        # words without a frequency are left out
+        self.assertEqual(page['count'], 6)
+        self.assertIsNotNone(page['next'])
+
+    def test_last_page_has_no_bins(self):
+        with self.assertNumQueries(1):
+            page = chart_data.frequency_page(self.wordset, 10)
+        self.assertEqual(len(page['words']), 6)
+        self.assertEqual(page['bins'], [])
+        self.assertIsNone(page['next'])
+
+    def test_frequency_limits(self):
+        page = chart_data.frequency_page(self.wordset, 10, frequency_gt=1, frequency_lt=10000)
+        self.assertEqual([word['name'] for word in page['words']], ['for', 'bike', 'walk'])
+
+    def test_words_with_equal_frequency_ordered_by_name(self):
+        Word.objects.filter(name='walk').update(frequency=22.5)
+        first = chart_data.frequency_page(self.wordset, 3)
+        second = chart_data.frequency_page(self.wordset, 3, cursor=first['next'])
+        self.assertEqual([word['name'] for word in first['words'] + second['words']],
+                         ['and', 'for', 'bike', 'walk', 'gondola', 'zzz'])
+
+
+class ScatterplotDataTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.wordset = WordSet.objects.create(name='test')
+        points = [('and', 25000, 40), ('for', 8000, 20), ('bike', 22.5, 1), ('walk', 12, 2), ('none', None, 5)]
+        for name, frequency, occurrences in points:
+            cls.wordset.words.add(Word.objects.create(name=name, frequency=frequency),
+                                  through_defaults={'occurrences': occurrences})
+
+    def test_points(self):
+        with self.assertNumQueries(2):
+            data = chart_data.scatterplot_data(self.wordset, max_points=10, occurrences_lt=30)
+        self.assertEqual(data['mode'], 'points')
+        self.assertEqual(data['count'], 3)
+        self.assertCountEqual(data['points'], [{'name': 'for', 'x': 20, 'y': 8000.0},
+                                               {'name': 'bike', 'x': 1, 'y': 22.5},
+                                               {'name': 'walk', 'x': 2, 'y': 12.0}])
+
+    def test_grid_cells(self):
+        with self.assertNumQueries(2):
+            data = chart_data.scatterplot_data(self.wordset, max_points=3, grid_size=2)
+        self.assertEqual(data['mode'], 'bins')
+        self.assertEqual(data['count'], 4)
+        # each cell is placed at the mean of its words; the largest values fall in the last cell
+        self.assertEqual([(point['count'], round(point['x'], 2), round(point['y'], 2)) for point in data['points']],
+                         [(3, 7.67, 2678.17), (1, 40.0, 25000.0)])
+
+    def test_single_value_range(self):
+        Word.objects.filter(name__in=['and', 'for']).update(frequency=12)
+        data = chart_data.scatterplot_data(self.wordset, max_points=1, grid_size=4, occurrences_gt=10)
+        self.assertEqual([(point['count'], point['x'], point['y']) for point in data['points']],
+                         [(1, 20.0, 12.0), (1, 40.0, 12.0)])
@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from fakeredis import FakeStrictRedis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from words.circuit_breaker import CircuitBreaker
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    """Tests the circuit breaker shared through Redis"""
+
+    def setUp(self):
+        self.conn = FakeStrictRedis()
+        self.breaker = CircuitBreaker('test', failures=3, window=60, cooldown=60, connection=self.conn)
+
+    def test_opens_after_failures(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+
+    def test_state_shared_between_breakers(self):
+        # breakers of other processes using the same Redis server see the breaker open
+        other = CircuitBreaker('test', failures=3, window=60, cooldown=60, connection=self.conn)
+        for _ in range(3):
+            other.record_failure()
+        self.assertFalse(self.breaker.allow())
+        # breakers of other services are not affected
+        self.assertTrue(CircuitBreaker('other', failures=3, window=60, cooldown=60, connection=self.conn).allow())
+
+    def test_success_resets_failures(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_allows_single_probe(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        # end of the cooldown
+        self.conn.delete(self.breaker.open_key)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.conn.delete(self.breaker.open_key)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow())
+        self.assertTrue(self.conn.exists(self.breaker.open_key))
+
+    def test_disabled(self):
+        breaker = CircuitBreaker('test', failures=0, window=60, cooldown=60, connection=self.conn)
+        for _ in range(10):
+            breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        self.assertEqual(self.conn.keys(), [])
+
+    def test_redis_unavailable(self):
+        connection = mock.MagicMock()
+        connection.mget.side_effect = RedisConnectionError
+        connection.pipeline.side_effect = RedisConnectionError
+        breaker = CircuitBreaker('test', failures=1, window=60, cooldown=60, connection=connection)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
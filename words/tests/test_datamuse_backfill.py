@@ -0,0 +1,113 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from fakeredis import FakeStrictRedis
+from rq import Queue, SimpleWorker
+from rq.job import Job
+
+from words import datamuse_backfill, datamuse_cache, datamuse_json, views
+from words.circuit_breaker import CircuitBreaker
+from words.fake_datamuse import FakeDatamuseServer
+from words.models import Word, UnrecognizedWord
+
+
+class BackfillTest(TestCase):
+    """Tests the backfill of words missing data against the local fake Datamuse server"""
+
+    def setUp(self):
+        self.connection = FakeStrictRedis()
+        self.server = FakeDatamuseServer(latency=0).__enter__()
+        self.addCleanup(self.server.__exit__)
+        patchers = [
+            mock.patch.object(views, 'redis_cursor', self.connection),
+            mock.patch.object(datamuse_json.api, 'api_root', self.server.url),
+            # no cached results
+            mock.patch.object(datamuse_cache, 'cache', datamuse_cache.DatamuseCache(None, 0, 0)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # the fake server recognizes words made of letters
+        for name in ('walk', 'x1', 'run', 'jump'):
+            Word.objects.create(name=name)
+        Word.objects.create(name='known', datamuse_success=True)
+
+    def test_words_updated(self):
+        batches = list(datamuse_backfill.backfill(batch_size=3))
+        self.assertEqual([batch['processed_words'] for batch in batches], [3, 1])
+        self.assertEqual(sum(batch['updated_words'] for batch in batches), 3)
+        self.assertEqual(sum(batch['unrecognized_words'] for batch in batches), 1)
+        self.assertEqual(list(Word.objects.filter(datamuse_success=False).values_list('name', flat=True)), ['x1'])
+        self.assertTrue(UnrecognizedWord.objects.filter(name='x1').exists())
+        # the words with data are not queried
+        self.assertEqual(self.server.requests, 4)
+        # the scan is complete, so the next backfill starts over
+        self.assertEqual(datamuse_backfill.get_cursor(), 0)
+
+    def test_expired_unrecognized_words_deleted(self):
+        language = Word.objects.get(name='x1').language_id
+        UnrecognizedWord.objects.record(['zzqw', 'qwzz'], language)
+        UnrecognizedWord.objects.filter(name='zzqw').update(last_checked=timezone.now() - timedelta(days=365))
+        list(datamuse_backfill.backfill())
+        self.assertFalse(UnrecognizedWord.objects.filter(name='zzqw').exists())
+        self.assertTrue(UnrecognizedWord.objects.filter(name='qwzz').exists())
+
+    def test_resumed_after_limit(self):
+        list(datamuse_backfill.backfill(batch_size=1, limit=2))
+        self.assertEqual(datamuse_backfill.get_cursor(), Word.objects.get(name='x1').id)
+        self.assertEqual(Word.objects.filter(datamuse_success=True).count(), 2)
+
+        batches = list(datamuse_backfill.backfill(batch_size=10))
+        self.assertEqual(sum(batch['processed_words'] for batch in batches), 2)
+        self.assertEqual(Word.objects.filter(datamuse_success=True).count(), 4)
+
+    def test_unrecognized_words_not_queried(self):
+        UnrecognizedWord.objects.record(['x1'], Word.objects.get(name='x1').language_id)
+        batches = list(datamuse_backfill.backfill())
+        self.assertEqual(batches[0]['unrecognized_words'], 1)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_stopped_by_open_breaker(self):
+        breaker = CircuitBreaker('datamuse', failures=1, window=60, cooldown=60, connection=FakeStrictRedis())
+        breaker.trip()
+        with mock.patch.object(datamuse_json, 'breaker', breaker):
+            self.assertEqual(list(datamuse_backfill.backfill(batch_size=2)), [])
+        self.assertEqual(self.server.requests, 0)
+        self.assertEqual(datamuse_backfill.get_cursor(), 0)
+        self.assertEqual(Word.objects.filter(datamuse_success=False).count(), 4)
+
+    def test_job_progress(self):
+        queue = Queue(is_async=False, connection=self.connection)
+        job = queue.enqueue(datamuse_backfill.backfill_job, 2)
+        self.assertEqual(job.result, 3)
+        job.refresh()
+        self.assertEqual(job.meta['potential_words'], 4)
+        self.assertEqual(job.meta['processed_words'], 4)
+        self.assertEqual((job.meta['updated_words'], job.meta['unrecognized_words'], job.meta['failed_words']),
+                         (3, 1, 0))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('backfill_words', batch_size=2, stdout=out)
+        self.assertIn('4 words missing data', out.getvalue())
+        self.assertIn('backfill done: 3 words updated', out.getvalue())
+
+    def test_command_enqueues_single_job(self):
+        queue = Queue(connection=self.connection)
+        with mock.patch.object(views, 'rq_queue', new=queue):
+            call_command('backfill_words', enqueue=True, stdout=StringIO())
+            out = StringIO()
+            call_command('backfill_words', enqueue=True, stdout=out)
+            self.assertIn('already queued', out.getvalue())
+            self.assertEqual(queue.job_ids, [datamuse_backfill.job_id])
+
+            SimpleWorker([queue], connection=self.connection).work(burst=True)
+            self.assertEqual(Job.fetch(datamuse_backfill.job_id, connection=self.connection).result, 3)
+            # a finished backfill is enqueued again
+            call_command('backfill_words', enqueue=True, stdout=StringIO())
+            self.assertEqual(queue.job_ids, [datamuse_backfill.job_id])
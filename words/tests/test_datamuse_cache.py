@@ -0,0 +1,118 @@
+import time
+import unittest.mock
+
+from django.test import TestCase, SimpleTestCase
+from fakeredis import FakeStrictRedis
+
+from words import datamuse_cache, datamuse_json
+from words.datamuse_cache import cache_key, DatamuseCache, LRUBackend, RedisBackend, DatabaseBackend, create_cache
+from words.models import DatamuseResponse
+
+
+class CacheKeyTest(SimpleTestCase):
+    def test_equivalent_queries_share_key(self):
+        self.assertEqual(cache_key({'sp': 'Walk ', 'md': 'dpf', 'max': 1}),
+                         cache_key({'max': 1, 'md': 'dpf', 'sp': 'walk'}))
+
+    def test_different_queries_have_different_keys(self):
+        self.assertNotEqual(cache_key({'sp': 'walk'}), cache_key({'rel_syn': 'walk'}))
+
+
+class LRUBackendTest(SimpleTestCase):
+    def test_least_recently_used_evicted(self):
+        backend = LRUBackend(max_entries=2)
+        backend.set('a', [1], 60)
+        backend.set('b', [2], 60)
+        backend.get('a')
+        backend.set('c', [3], 60)
+        self.assertEqual(backend.get('a'), [1])
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(len(backend), 2)
+
+    def test_expired_entry_not_returned(self):
+        backend = LRUBackend(max_entries=2)
+        backend.set('a', [1], -1)
+        self.assertIsNone(backend.get('a'))
+
+
+class RedisBackendTest(SimpleTestCase):
+    def test_set_and_get(self):
+        backend = RedisBackend(max_entries=10, connection=FakeStrictRedis())
+        backend.set('a', [{'word': 'walk'}], 60)
+        self.assertEqual(backend.get('a'), [{'word': 'walk'}])
+
+    def test_oldest_evicted(self):
+        backend = RedisBackend(max_entries=2, connection=FakeStrictRedis())
+        for key in ('a', 'b', 'c'):
+            backend.set(key, [key], 60)
+            time.sleep(0.01)
+        self.assertIsNone(backend.get('a'))
+        self.assertEqual(backend.get('c'), ['c'])
+        self.assertEqual(len(backend), 2)
+
+
+class DatabaseBackendTest(TestCase):
+    def test_set_and_get(self):
+        backend = DatabaseBackend(max_entries=10)
+        backend.set('a', [{'word': 'walk'}], 60)
+        self.assertEqual(backend.get('a'), [{'word': 'walk'}])
+
+    def test_expired_entry_not_returned(self):
+        backend = DatabaseBackend(max_entries=10)
+        backend.set('a', [1], -1)
+        self.assertIsNone(backend.get('a'))
+
+    def test_evict(self):
+        backend = DatabaseBackend(max_entries=2)
+        backend.set('expired', [0], -1)
+        for ttl, key in enumerate(('a', 'b', 'c'), start=60):
+            backend.set(key, [key], ttl)
+        backend.evict()
+        self.assertCountEqual(DatamuseResponse.objects.values_list('key', flat=True), ['b', 'c'])
+
+
+class DatamuseCacheTest(SimpleTestCase):
+    def test_hits_and_misses_counted(self):
+        cache = DatamuseCache(LRUBackend(10), positive_ttl=60, negative_ttl=60)
+        self.assertIsNone(cache.get({'sp': 'walk'}))
+        cache.set({'sp': 'walk'}, [{'word': 'walk'}])
+        self.assertEqual(cache.get({'sp': 'walk'}), [{'word': 'walk'}])
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_negative_result_uses_negative_ttl(self):
+        backend = unittest.mock.Mock()
+        cache = DatamuseCache(backend, positive_ttl=60, negative_ttl=5)
+        cache.set({'sp': 'ssdfio'}, [])
+        backend.set.assert_called_with(cache_key({'sp': 'ssdfio'}), [], 5)
+        cache.set({'sp': 'walk'}, [{'word': 'walk'}])
+        backend.set.assert_called_with(cache_key({'sp': 'walk'}), [{'word': 'walk'}], 60)
+
+    def test_related_words_cached_only_when_empty(self):
+        cache = DatamuseCache(LRUBackend(10), positive_ttl=60, negative_ttl=60)
+        cache.set({'rel_syn': 'walk', 'md': 'dpf'}, [{'word': 'stroll', 'score': 100}])
+        cache.set({'rel_ant': 'walk', 'md': 'dpf'}, [])
+        self.assertIsNone(cache.get({'rel_syn': 'walk', 'md': 'dpf'}))
+        self.assertEqual(cache.get({'rel_ant': 'walk', 'md': 'dpf'}), [])
+
+    def test_no_backend(self):
+        cache = create_cache({'BACKEND': 'none'})
+        cache.set({'sp': 'walk'}, [{'word': 'walk'}])
+        self.assertIsNone(cache.get({'sp': 'walk'}))
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            create_cache({'BACKEND': 'memcached'})
+
+
+class QueryWithRetryCacheTest(SimpleTestCase):
+    """Tests that datamuse_json.query_with_retry uses the cache"""
+    @unittest.mock.patch.object(datamuse_json.api, 'words')
+    def test_repeated_query_served_from_cache(self, wordsMock):
+        wordsMock.return_value = []
+        cache = DatamuseCache(LRUBackend(10), positive_ttl=60, negative_ttl=60)
+        with unittest.mock.patch.object(datamuse_cache, 'cache', new=cache):
+            datamuse_json.query_with_retry(1, 0, sp='ssdfio', md='dpf', max=1)
+            result = datamuse_json.query_with_retry(1, 0, sp='ssdfio', md='dpf', max=1)
+        self.assertEqual(result, [])
+        self.assertEqual(wordsMock.call_count, 1)
+        self.assertEqual(cache.hits, 1)
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase
+
+from words.datamuse_client import DatamuseClient, DatamuseResponseError
+from words.fake_datamuse import FakeDatamuseServer
+
+
+class DatamuseClientTest(SimpleTestCase):
+    """Tests the Datamuse client against the fake Datamuse server"""
+
+    def test_words(self):
+        with FakeDatamuseServer(latency=0) as server:
+            client = DatamuseClient(server.url)
+            result = client.words(sp='walk', md='f', max=1)
+        self.assertEqual(result, [{'word': 'walk', 'score': 1000, 'tags': ['f:4.000000']}])
+
+    def test_connections_reused(self):
+        with FakeDatamuseServer(latency=0) as server:
+            client = DatamuseClient(server.url)
+            for word in ('walk', 'run', 'jump'):
+                client.words(sp=word)
+            self.assertEqual((server.requests, server.connections), (3, 1))
+
+    def test_connections_limited_to_pool_size(self):
+        with FakeDatamuseServer(latency=0.01) as server:
+            client = DatamuseClient(server.url, pool_size=2)
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(lambda i: client.words(sp=f'word{chr(97 + i % 26)}'), range(40)))
+            self.assertEqual(server.requests, 40)
+            self.assertLessEqual(server.connections, 2)
+
+    def test_gzip_requested(self):
+        with FakeDatamuseServer(latency=0) as server:
+            client = DatamuseClient(server.url)
+            response = client.session.get(f'{server.url}/words', params={'sp': 'walk'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.json()[0]['word'], 'walk')
+
+    def test_error_status_raises(self):
+        with FakeDatamuseServer(latency=0, error_rate=1.0) as server:
+            client = DatamuseClient(server.url)
+            with self.assertRaises(DatamuseResponseError) as cm:
+                client.words(sp='walk')
+            self.assertEqual(cm.exception.status, 500)
+            # the connection of the error response is reused
+            with self.assertRaises(DatamuseResponseError):
+                client.words(sp='walk')
+            self.assertEqual(server.connections, 1)
+
+    def test_invalid_parameters(self):
+        client = DatamuseClient('http://127.0.0.1:1')
+        with self.assertRaises(ValueError):
+            client.words(rel_xyz='walk')
+        with self.assertRaises(ValueError):
+            client.words(sp='walk', max=1001)
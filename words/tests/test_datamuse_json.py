@@ -1,10 +1,18 @@
+import time
 import unittest.mock
+from decimal import Decimal
 
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase, override_settings
 
-from words.datamuse_json import add_or_update_word, add_related, query_with_retry, DatamuseWordNotRecognizedError
-from words.models import Word
+from fakeredis import FakeStrictRedis
+
+from words import datamuse_cache, datamuse_json
+from words.circuit_breaker import CircuitBreaker, CircuitOpenError
+from words.datamuse_json import add_or_update_word, add_related, query_with_retry, DatamuseWordNotRecognizedError, \
+    query_words, RateLimiter, bulk_decode_words, bulk_get_or_create_words, add_related_many, backoff_delay
+from words.fake_datamuse import FakeDatamuseServer
+from words.models import Word, PartOfSpeech, UnrecognizedWord, WordRelation, WordSet, WordSetStats
 
 
 class AddOrUpdateWordTest(TestCase):
@@ -26,6 +34,12 @@ class AddOrUpdateWordTest(TestCase):
         result = add_or_update_word(word=word)
         self.assertIsNone(result)
 
+    @unittest.mock.patch('words.datamuse_json.query_with_retry')
+    def test_parameter_too_long(self, query_with_retryMock):
+        """Tests add_or_update_word with a string too long to be the name of a Word"""
+        self.assertIsNone(add_or_update_word(word='w' * 120))
+        query_with_retryMock.assert_not_called()
+
     def test_word_not_found_by_datamuse(self):
         """Tests add_or_update_word with a word that will not be found by datamuse"""
         word = "ssdfio"
@@ -43,6 +57,19 @@ class AddOrUpdateWordTest(TestCase):
             self.assertFalse(result.datamuse_success)
 
 
+    @unittest.mock.patch('words.datamuse_json.query_with_retry')
+    def test_known_unrecognized_word_not_queried(self, query_with_retryMock):
+        UnrecognizedWord.objects.create(name='qwzz')
+        self.assertIsNone(add_or_update_word('qwzz'))
+        query_with_retryMock.assert_not_called()
+
+    @unittest.mock.patch('words.datamuse_json.query_with_retry')
+    def test_unrecognized_word_recorded(self, query_with_retryMock):
+        query_with_retryMock.return_value = []
+        self.assertIsNone(add_or_update_word('qwzz'))
+        self.assertTrue(UnrecognizedWord.objects.filter(name='qwzz').exists())
+
+
 class AddRelatedTest(TestCase):
     def test_word_parameter_is_none(self):
         """Tests add_related with parameter word = None"""
@@ -90,3 +117,226 @@ class AddRelatedTest(TestCase):
         query_with_retryMock.side_effect = ConnectionError(message)
         with self.assertRaisesRegex(ConnectionError, message):
             result = add_related("bat", "jja")
+
+
+
+def fake_related_result(retries, wait, **kwargs):
+    """Stand-in for query_with_retry: returns three related words for any rel_[code] query."""
+    code, word = next((key[4:], value) for key, value in kwargs.items() if key.startswith('rel_'))
+    return [{'word': f'{word}{code}{i}', 'score': 100 - i, 'tags': ['n', 'f:1.0']} for i in range(3)]
+
+
+class AddRelatedManyTest(TestCase):
+    """Tests add_related_many function"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.word = Word.objects.create(name='bat', datamuse_success=True)
+
+    @unittest.mock.patch('words.datamuse_json.query_with_retry', side_effect=fake_related_result)
+    def test_related_words_grouped_by_code(self, query_with_retryMock):
+        word, relations_by_code = add_related_many('Bat', ['syn', 'rhy'])
+        self.assertEqual(word, self.word)
+        self.assertCountEqual(relations_by_code.keys(), ['syn', 'rhy'])
+        self.assertEqual([relation.related_word.name for relation in relations_by_code['syn']],
+                         ['batsyn0', 'batsyn1', 'batsyn2'])
+        self.assertTrue(Word.objects.get(name='batrhy0').datamuse_success)
+
+    @unittest.mock.patch('words.datamuse_json.query_with_retry', side_effect=fake_related_result)
+    def test_only_missing_codes_queried(self, query_with_retryMock):
+        self.word.syn.add(Word.objects.create(name='club'), through_defaults={'score': 50})
+        relations_by_code = add_related_many('bat', ['syn', 'rhy'])[1]
+        self.assertEqual(query_with_retryMock.call_count, 1)
+        self.assertIn('rel_rhy', query_with_retryMock.call_args[1])
+        self.assertEqual([relation.related_word.name for relation in relations_by_code['syn']], ['club'])
+
+    @unittest.mock.patch('words.datamuse_json.query_with_retry', side_effect=fake_related_result)
+    def test_number_of_queries_independent_of_code_count(self, query_with_retryMock):
+        # create the Language and PartOfSpeech rows beforehand so both calls below do the same work
+        add_related_many('bat', ['jja'])
+        Word.objects.create(name='cat', datamuse_success=True)
+        with self.assertNumQueries(12):
+            add_related_many('bat', ['syn', 'ant'])
+        with self.assertNumQueries(12):
+            add_related_many('cat', ['syn', 'ant', 'rhy', 'nry', 'hom', 'cns'])
+        # once stored, the related words are read back without querying Datamuse
+        query_with_retryMock.reset_mock()
+        with self.assertNumQueries(3):
+            relations_by_code = add_related_many('cat', ['syn', 'ant', 'rhy', 'nry', 'hom', 'cns'])[1]
+            names = [relation.related_word.name for relations in relations_by_code.values() for relation in relations]
+        self.assertEqual(len(names), 18)
+        query_with_retryMock.assert_not_called()
+
+    def test_invalid_code(self):
+        with self.assertRaisesRegex(ValueError, 'xyz is not a valid related word code.'):
+            add_related_many('bat', ['syn', 'xyz'])
+
+    @unittest.mock.patch('words.datamuse_json.query_with_retry')
+    def test_connection_error_after_saving_other_results(self, query_with_retryMock):
+        def side_effect(retries, wait, **kwargs):
+            if 'rel_ant' in kwargs:
+                raise ConnectionError('Datamuse service unavailable')
+            return fake_related_result(retries, wait, **kwargs)
+        query_with_retryMock.side_effect = side_effect
+        with self.assertRaises(ConnectionError):
+            add_related_many('bat', ['syn', 'ant'])
+        self.assertEqual(WordRelation.objects.filter(source_word=self.word, code='syn').count(), 3)
+
+
+class QueryWordsTest(SimpleTestCase):
+    """Tests query_words function"""
+    @unittest.mock.patch('words.datamuse_json.query_with_retry')
+    def test_result_for_each_word(self, query_with_retryMock):
+        query_with_retryMock.side_effect = lambda retries, wait, **kwargs: [{'word': kwargs['sp']}]
+        words = ['one', 'two', 'three', 'four']
+        results = dict(query_words(words, workers=3))
+        self.assertCountEqual(results.keys(), words)
+        for word in words:
+            self.assertEqual(results[word], [{'word': word}])
+
+    @unittest.mock.patch('words.datamuse_json.query_with_retry')
+    def test_connection_error_returned_as_result(self, query_with_retryMock):
+        query_with_retryMock.side_effect = ConnectionError('Datamuse service unavailable')
+        results = dict(query_words(['bat'], workers=2))
+        self.assertIsInstance(results['bat'], ConnectionError)
+
+    def test_fake_server(self):
+        """Tests query_words against the local fake Datamuse server"""
+        with FakeDatamuseServer(latency=0) as server:
+            with unittest.mock.patch.object(datamuse_json.api, 'api_root', server.url):
+                results = dict(query_words(['walk', 'x1'], workers=2))
+        self.assertEqual(results['walk'][0]['word'], 'walk')
+        self.assertEqual(results['x1'], [])
+
+
+class RateLimiterTest(SimpleTestCase):
+    def test_calls_spaced_out(self):
+        limiter = RateLimiter(20)
+        start = time.monotonic()
+        for i in range(5):
+            limiter.wait()
+        # first call is immediate, the next four wait 1/20 s each
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_no_limit(self):
+        limiter = RateLimiter(0)
+        start = time.monotonic()
+        for i in range(100):
+            limiter.wait()
+        self.assertLess(time.monotonic() - start, 0.1)
+
+
+class QueryWithRetryTest(SimpleTestCase):
+    """Tests the retries and circuit breaker of query_with_retry against the local fake Datamuse server"""
+
+    def setUp(self):
+        self.breaker = CircuitBreaker('datamuse', failures=3, window=60, cooldown=60, connection=FakeStrictRedis())
+        patchers = [
+            unittest.mock.patch.object(datamuse_json, 'breaker', self.breaker),
+            # no cached results
+            unittest.mock.patch.object(datamuse_cache, 'cache', datamuse_cache.DatamuseCache(None, 0, 0)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def query(self, url: str, retries: int = 2):
+        with unittest.mock.patch.object(datamuse_json.api, 'api_root', url):
+            return query_with_retry(retries, 0, sp='walk', max=1)
+
+    def test_server_error_retried(self):
+        with FakeDatamuseServer(latency=0, error_rate=1.0) as server:
+            with self.assertRaises(ConnectionError):
+                self.query(server.url)
+            self.assertEqual(server.requests, 2)
+            server.error_rate = 0
+            self.assertEqual(self.query(server.url)[0]['word'], 'walk')
+
+    def test_connection_error_retried(self):
+        # nothing listens on port 1
+        with self.assertRaises(ConnectionError):
+            self.query('http://127.0.0.1:1')
+        self.assertEqual(int(self.breaker.connection.get(self.breaker.failures_key)), 2)
+
+    def test_client_error_not_retried(self):
+        with FakeDatamuseServer(latency=0) as server:
+            # answered with 404
+            with self.assertRaises(ConnectionError):
+                self.query(f'{server.url}/missing')
+            self.assertEqual(server.requests, 1)
+        self.assertIsNone(self.breaker.connection.get(self.breaker.failures_key))
+
+    def test_open_breaker_fails_fast(self):
+        with FakeDatamuseServer(latency=0, error_rate=1.0) as server:
+            # the breaker opens after the third failure, so the other two attempts are not made
+            with self.assertRaises(CircuitOpenError):
+                self.query(server.url, retries=5)
+            self.assertEqual(server.requests, 3)
+
+            server.error_rate = 0
+            with self.assertRaises(CircuitOpenError):
+                self.query(server.url)
+            self.assertEqual(server.requests, 3)
+
+    def test_words_not_queried_while_breaker_open(self):
+        self.breaker.trip()
+        with FakeDatamuseServer(latency=0) as server:
+            with unittest.mock.patch.object(datamuse_json.api, 'api_root', server.url):
+                results = dict(query_words(['walk', 'run'], workers=2))
+            self.assertEqual(server.requests, 0)
+        self.assertIsInstance(results['walk'], CircuitOpenError)
+        self.assertIsInstance(results['run'], CircuitOpenError)
+
+    @override_settings(DATAMUSE_BACKOFF_MAX=8)
+    def test_backoff_delay(self):
+        # the upper bound of each random wait
+        with unittest.mock.patch('words.datamuse_json.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual([backoff_delay(attempt, 0.5) for attempt in range(1, 7)], [0.5, 1, 2, 4, 8, 8])
+            self.assertEqual(backoff_delay(1, 0.5, retry_after=3), 3)
+            self.assertEqual(backoff_delay(1, 0.5, retry_after=60), 8)
+
+
+class BulkDecodeWordsTest(TestCase):
+    """Tests bulk_decode_words and bulk_get_or_create_words functions"""
+    @staticmethod
+    def json_for(word):
+        return {'word': word, 'score': 100, 'tags': ['n', 'v', 'f:12.5'], 'defs': [f'n\tdefinition of {word}']}
+
+    def test_words_created(self):
+        words = bulk_decode_words([self.json_for('walk'), self.json_for('run')])
+        self.assertCountEqual(words.keys(), ['walk', 'run'])
+        walk = Word.objects.get(name='walk')
+        self.assertTrue(walk.datamuse_success)
+        self.assertEqual(float(walk.frequency), 12.5)
+        self.assertEqual(walk.definitions, ['n\tdefinition of walk'])
+        self.assertCountEqual(walk.parts_of_speech.values_list('name', flat=True), ['n', 'v'])
+
+    def test_existing_word_updated(self):
+        Word.objects.create(name='walk', datamuse_success=False)
+        bulk_decode_words([self.json_for('walk')])
+        self.assertEqual(Word.objects.filter(name='walk').count(), 1)
+        self.assertTrue(Word.objects.get(name='walk').datamuse_success)
+
+    def test_number_of_queries_independent_of_word_count(self):
+        # create the Language and PartOfSpeech rows beforehand so both calls below do the same work
+        bulk_decode_words([self.json_for('first')])
+        with self.assertNumQueries(8):
+            bulk_decode_words([self.json_for(f'word{i}') for i in range(5)])
+        with self.assertNumQueries(8):
+            bulk_decode_words([self.json_for(f'other{i}') for i in range(50)])
+
+    def test_stats_of_wordsets_refreshed(self):
+        """Tests that the statistics of a WordSet holding a word that was missing data are recomputed"""
+        wordset = WordSet.objects.create(name='test')
+        wordset.words.add(Word.objects.create(name='walk', datamuse_success=False))
+        self.assertEqual(WordSetStats.objects.refresh(wordset).missing_data_words, 1)
+        bulk_decode_words([self.json_for('walk')])
+        stats = WordSetStats.objects.get(wordset=wordset)
+        self.assertEqual((stats.recognized_words, stats.missing_data_words), (1, 0))
+        self.assertEqual(stats.frequency_median, Decimal('12.5'))
+
+    def test_get_or_create_words(self):
+        existing = Word.objects.create(name='walk', datamuse_success=True)
+        words = bulk_get_or_create_words(['walk', 'run'])
+        self.assertEqual(words['walk'], existing)
+        self.assertFalse(words['run'].datamuse_success)
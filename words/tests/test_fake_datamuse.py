@@ -0,0 +1,62 @@
+import json
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from django.test import SimpleTestCase
+
+from words.fake_datamuse import FakeDatamuseServer, load_corpus, word_entry
+from words.management.commands.load_test import percentile
+
+
+def get_json(url: str):
+    with urlopen(url) as response:
+        return json.loads(response.read())
+
+
+class FakeDatamuseServerTest(SimpleTestCase):
+    """Tests the fake Datamuse server"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.corpus = load_corpus()
+
+    def test_corpus_words_recognized(self):
+        with FakeDatamuseServer(latency=0, corpus=self.corpus) as server:
+            result = get_json(f'{server.url}/words?sp=walk&md=dpf&max=1')
+            self.assertEqual(result[0]['word'], 'walk')
+            self.assertEqual(result[0]['tags'], self.corpus['words']['walk']['tags'])
+            self.assertEqual(get_json(f'{server.url}/words?sp=qwzz&md=dpf&max=1'), [])
+
+    def test_corpus_relations(self):
+        with FakeDatamuseServer(latency=0, corpus=self.corpus) as server:
+            result = get_json(f'{server.url}/words?rel_syn=walk&md=dpf')
+        self.assertEqual([entry['word'] for entry in result], self.corpus['relations']['walk']['syn'])
+
+    def test_metadata_selected_by_md(self):
+        entry = word_entry('walk', data={'tags': ['v', 'f:10.0'], 'defs': ['v\tto move on foot']}, md='f')
+        self.assertEqual(entry, {'word': 'walk', 'score': 1000, 'tags': ['f:10.0']})
+
+    def test_error_rate(self):
+        with FakeDatamuseServer(latency=0, error_rate=1.0) as server:
+            with self.assertRaises(HTTPError) as cm:
+                get_json(f'{server.url}/words?sp=walk')
+        self.assertEqual(cm.exception.code, 500)
+
+    def test_rate_limit(self):
+        with FakeDatamuseServer(latency=0, rate_limit=2) as server:
+            get_json(f'{server.url}/words?sp=walk')
+            get_json(f'{server.url}/words?sp=walk')
+            with self.assertRaises(HTTPError) as cm:
+                get_json(f'{server.url}/words?sp=walk')
+            self.assertEqual(cm.exception.code, 429)
+            self.assertEqual(server.rejected, 1)
+
+
+class PercentileTest(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3.0], 99), 3.0)
@@ -1,13 +1,26 @@
 import os
+from collections import Counter
+from datetime import timedelta
 from string import punctuation
+from unittest import mock
 
 from django import forms
+from django.conf import settings
 from django.core.files.uploadedfile import InMemoryUploadedFile
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from fakeredis import FakeStrictRedis
+from rq.job import Job
 
+from words import wordset_build
 from words.forms import RelatedWordsForm, WordSetCreateForm, WordCharField, WordFileField, WordSetChoice, \
-    ScatterplotWordSetChoice
-from words.models import WordSet
+    ScatterplotWordSetChoice, add_words, complete_wordset, count_words, tokenize
+from words.job_checkpoint import JobCheckpoint
+from words.job_progress import ProgressReporter
+from words.models import WordSet, Word, Membership, UnrecognizedWord, WordSetStats, default_language
+from words.upload_spool import SpooledUpload, spool
 
 
 class WordSetCreateFormTest(TestCase):
@@ -100,7 +113,7 @@ class WordSetCreateFormTest(TestCase):
             form = WordSetCreateForm(post_dict, file_dict, self.form_kwargs)
             self.assertTrue(form.is_valid())
             expected = ['Some', 'text', 'and', 'some', 'punctuation']
-            self.assertListEqual(form.cleaned_data['text_file'], expected)
+            self.assertEqual(form.cleaned_data['text_file'], Counter(expected))
 
     def test_text_file_em_dash_stripped(self):
         """Tests that the em dash, '--' in plain text, is removed from the text of an uploaded file."""
@@ -113,7 +126,7 @@ class WordSetCreateFormTest(TestCase):
             form = WordSetCreateForm(post_dict, file_dict, self.form_kwargs)
             self.assertTrue(form.is_valid())
             expected = ['Some', 'text', 'with', 'em', 'dashes']
-            self.assertListEqual(form.cleaned_data['text_file'], expected)
+            self.assertEqual(form.cleaned_data['text_file'], Counter(expected))
 
     def test_text_file_all_puncuation_except_hyphens_stripped_from_words(self):
         """Tests that, except for the hyphen '-', punctuation is stripped from the middle of words in uploaded text."""
@@ -128,7 +141,199 @@ class WordSetCreateFormTest(TestCase):
             form = WordSetCreateForm(post_dict, file_dict, self.form_kwargs)
             self.assertTrue(form.is_valid())
             expected = ['Some', 'text', 'with', 'punctuation', 'and', 'a', 'hyphenated-word']
-            self.assertListEqual(form.cleaned_data['text_file'], expected)
+            self.assertEqual(form.cleaned_data['text_file'], Counter(expected))
+
+    def test_text_file_counts_repeated_words(self):
+        """Tests that the text_file field reduces the uploaded text to a Counter of words and their occurrences."""
+        with open("text.txt", "w") as upload_file:
+            upload_file.write("the cat and the hat\nthe end")
+        with open("text.txt", "rb") as upload_file:
+            post_dict = {'name': 'test'}
+            file_dict = {'text_file': InMemoryUploadedFile(
+                upload_file, 'text_file', upload_file.name, '', os.path.getsize('text.txt'), None)}
+            form = WordSetCreateForm(post_dict, file_dict, self.form_kwargs)
+            self.assertTrue(form.is_valid())
+            expected = Counter({'the': 3, 'cat': 1, 'and': 1, 'hat': 1, 'end': 1})
+            self.assertEqual(form.cleaned_data['text_file'], expected)
+
+    @mock.patch('words.wordset_build.Job.create')
+    def test_save_spools_single_word_counter(self, createMock):
+        """Tests that words from both fields are combined, ignoring case, into one Counter, which is spooled, and that
+        the coordinator job is passed only a reference to the spooled words"""
+        with open("text.txt", "w") as upload_file:
+            upload_file.write("Walk run walk")
+        with open("text.txt", "rb") as upload_file:
+            post_dict = {'name': 'test', 'words': 'walk\r\nskip'}
+            file_dict = {'text_file': InMemoryUploadedFile(
+                upload_file, 'text_file', upload_file.name, '', os.path.getsize('text.txt'), None)}
+            form = WordSetCreateForm(post_dict, file_dict, self.form_kwargs)
+            self.assertTrue(form.is_valid())
+            with mock.patch('words.views.rq_queue'):
+                form.save()
+        instance, spooled_upload, build_id = createMock.call_args[1]['args']
+        self.assertEqual(createMock.call_args[1]['func'], wordset_build.split_words)
+        self.assertEqual(spooled_upload, SpooledUpload(wordset_build.coordinator_id(form.job_id)))
+        self.assertEqual(dict(spooled_upload.items()), {'walk': 3, 'run': 1, 'skip': 1})
+
+
+class TokenizeTest(TestCase):
+    """Tests tokenize generator"""
+
+    def test_yields_words_from_each_line(self):
+        lines = iter([b'Some text, over\n', b'two--lines\n'])
+        self.assertEqual(list(tokenize(lines)), ['Some', 'text', 'over', 'two', 'lines'])
+
+    def test_is_lazy(self):
+        """Tests that lines are only read as words are needed"""
+        lines = iter([b'first line\n', b'second line\n'])
+        words = tokenize(lines)
+        self.assertEqual(next(words), 'first')
+        self.assertEqual(next(lines), b'second line\n')
+
+
+def fake_query_words(words, workers=None):
+    """Stand-in for datamuse_json.query_words: recognizes every word except those starting with 'x'."""
+    for word in words:
+        if word.startswith('x'):
+            yield word, []
+        else:
+            yield word, [{'word': word, 'score': 100, 'tags': ['n', 'f:1.0']}]
+
+
+@mock.patch('words.forms.datamuse_json.query_words', new=fake_query_words)
+class AddWordsTest(TestCase):
+    """Tests adding words to a new WordSet with add_words and complete_wordset, as the jobs of a build do (see
+    wordset_build)"""
+
+    def setUp(self):
+        # the job adding the words; tests that need a real job (for its checkpoint) replace it
+        self.job = mock.MagicMock(meta={})
+
+    def add(self, wordset, *args):
+        """Adds the words in args (see count_words) to wordset with add_words, then completes wordset."""
+        progress = ProgressReporter(self.job, 'recognized_words', 'skipped_lookups')
+        checkpoint = JobCheckpoint(self.job)
+        detected_words = count_words(*args)
+        progress.set_total(len(detected_words))
+        with progress:
+            unrecognized_words = add_words(wordset, detected_words, progress, checkpoint)
+        complete_wordset(wordset, True, unrecognized_words)
+
+    def test_words_added_with_occurrences(self):
+        wordset = WordSet.objects.create(name='test')
+        self.add(wordset, ['Walk', 'walk', 'run'], ['xqz', 'run', 'walk'])
+        self.assertEqual(Membership.objects.get(wordset=wordset, word__name='walk').occurrences, 3)
+        self.assertEqual(Membership.objects.get(wordset=wordset, word__name='run').occurrences, 2)
+        self.assertFalse(Word.objects.filter(name='xqz').exists())
+        self.assertEqual(wordset.unrecognized_words, 'xqz<br>')
+
+    def test_stats_written(self):
+        wordset = WordSet.objects.create(name='test')
+        self.add(wordset, ['Walk', 'walk', 'run'], ['xqz'])
+        stats = WordSetStats.objects.get(wordset=wordset)
+        self.assertEqual((stats.unique_words, stats.total_occurrences, stats.unrecognized_words), (2, 3, 1))
+
+    def test_word_counts_added_with_occurrences(self):
+        """Tests that Counters of words (as enqueued by WordSetCreateForm) are accepted along with lists"""
+        wordset = WordSet.objects.create(name='test')
+        self.add(wordset, Counter({'walk': 4, 'run': 1}), ['Walk'])
+        self.assertEqual(Membership.objects.get(wordset=wordset, word__name='walk').occurrences, 5)
+        self.assertEqual(Membership.objects.get(wordset=wordset, word__name='run').occurrences, 1)
+
+    def test_spooled_upload_processed(self):
+        wordset = WordSet.objects.create(name='test')
+        spool.write('job1', {'walk': 2, 'xqz': 1})
+        self.add(wordset, SpooledUpload('job1'))
+        self.assertEqual(Membership.objects.get(wordset=wordset, word__name='walk').occurrences, 2)
+        self.assertEqual(wordset.unrecognized_words, 'xqz<br>')
+
+    def test_resumed_job_skips_words_already_added(self):
+        """Tests that words added to the wordset by an earlier, unfinished run of the job are not looked up again"""
+        job = self.job
+        wordset = WordSet.objects.create(name='test')
+        Membership.objects.create(wordset=wordset, word=Word.objects.create(name='walk'), occurrences=2)
+        with mock.patch('words.forms.datamuse_json.query_words', side_effect=fake_query_words) as query_wordsMock:
+            self.add(wordset, {'walk': 2, 'run': 1})
+        self.assertEqual(list(query_wordsMock.call_args[0][0]), ['run'])
+        self.assertEqual(wordset.words.count(), 2)
+        self.assertEqual(job.meta['processed_words'], 2)
+
+    def test_resumed_job_skips_checkpointed_words(self):
+        """Tests that words an earlier, unfinished run of the job found unrecognized are not looked up again"""
+        job = self.job = Job.create(func=len, args=([],), connection=FakeStrictRedis(), id='job1')
+        checkpoint = JobCheckpoint(job)
+        checkpoint.add(['xqz'])
+        wordset = WordSet.objects.create(name='test')
+        with mock.patch('words.forms.datamuse_json.query_words', side_effect=fake_query_words) as query_wordsMock:
+            self.add(wordset, ['walk', 'xqz'])
+        self.assertEqual(list(query_wordsMock.call_args[0][0]), ['walk'])
+        self.assertEqual(wordset.unrecognized_words, 'xqz<br>')
+        self.assertEqual((job.meta['processed_words'], job.meta['recognized_words']), (2, 1))
+
+    def test_unrecognized_words_checkpointed(self):
+        job = self.job = Job.create(func=len, args=([],), connection=FakeStrictRedis(), id='job1')
+        wordset = WordSet.objects.create(name='test')
+        self.add(wordset, ['walk', 'xqz', 'xzz'])
+        self.assertEqual(JobCheckpoint(job).words(), {'xqz', 'xzz'})
+
+    def test_job_progress(self):
+        job = self.job
+        Word.objects.create(name='walk', datamuse_success=True)
+        wordset = WordSet.objects.create(name='test')
+        self.add(wordset, ['walk', 'run', 'xqz', ' '])
+        eta = job.meta.pop('eta')
+        rate = job.meta.pop('rate')
+        self.assertEqual(job.meta, {'potential_words': 4, 'processed_words': 4, 'recognized_words': 2,
+                                    'skipped_lookups': 0})
+        self.assertGreater(rate, 0)
+        self.assertEqual(eta, 0)
+
+    @override_settings(JOB_PROGRESS_INTERVAL=3600, JOB_PROGRESS_WORDS=50)
+    def test_job_progress_written_in_batches(self):
+        """Tests that the progress of the job is written once per batch of words rather than once per word"""
+        job = self.job
+        wordset = WordSet.objects.create(name='test')
+        self.add(wordset, [f'word{i}' for i in range(200)])
+        self.assertEqual(job.meta['processed_words'], 200)
+        # written when created, when the words are counted, after each 50 words and when done
+        self.assertEqual(job.save_meta.call_count, 7)
+
+    def test_unrecognized_words_recorded(self):
+        wordset = WordSet.objects.create(name='test')
+        self.add(wordset, ['walk', 'xqz'])
+        self.assertTrue(UnrecognizedWord.objects.filter(name='xqz').exists())
+        self.assertFalse(UnrecognizedWord.objects.filter(name='walk').exists())
+
+    def test_known_unrecognized_words_skipped(self):
+        job = self.job
+        UnrecognizedWord.objects.create(name='qwzz')
+        wordset = WordSet.objects.create(name='test')
+        with mock.patch('words.forms.datamuse_json.query_words', side_effect=fake_query_words) as query_wordsMock:
+            self.add(wordset, ['walk', 'qwzz'])
+        self.assertEqual(list(query_wordsMock.call_args[0][0]), ['walk'])
+        self.assertEqual(job.meta['skipped_lookups'], 1)
+        self.assertEqual(wordset.unrecognized_words, 'qwzz<br>')
+
+    def test_expired_unrecognized_word_queried_again(self):
+        last_checked = timezone.now() - timedelta(days=settings.UNRECOGNIZED_WORD_TTL + 1)
+        UnrecognizedWord.objects.create(name='walk', last_checked=last_checked)
+        wordset = WordSet.objects.create(name='test')
+        self.add(wordset, ['walk'])
+        self.assertTrue(wordset.words.filter(name='walk').exists())
+        self.assertFalse(UnrecognizedWord.objects.filter(name='walk').exists())
+
+    def test_queries_grow_with_batches_not_words(self):
+        """Tests that saving ten times as many words (in the same number of batches) takes the same number of queries"""
+        default_language()  # the first save of a Word also creates its Language
+        query_counts = []
+        for size in (10, 100):
+            wordset = WordSet.objects.create(name=f'test{size}')
+            words = [f'word{size}n{i}' for i in range(size)]
+            with CaptureQueriesContext(connection) as context:
+                self.add(wordset, words)
+            query_counts.append(len(context))
+            self.assertEqual(wordset.words.count(), size)
+        self.assertEqual(query_counts[0], query_counts[1])
 
 
 class RelatedWordsFormTest(TestCase):
@@ -0,0 +1,120 @@
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase
+from fakeredis import FakeStrictRedis
+from rq import Queue
+
+from words import job_progress
+
+
+def event_data(event: str):
+    """Returns the json held by a Server-Sent Event."""
+    return json.loads(event[len('data: '):])
+
+
+def say(word):
+    return word
+
+
+class JobProgressTest(SimpleTestCase):
+    """Tests the publishing and streaming of job progress"""
+
+    def setUp(self):
+        self.conn = FakeStrictRedis()
+        self.queue = Queue(connection=self.conn)
+        self.job = self.queue.enqueue(say, 'walk')
+        self.job.meta['processed_words'] = 0
+        self.job.save_meta()
+
+    def test_stream_starts_with_current_state(self):
+        events = job_progress.events(self.job, max_seconds=0, keepalive=1)
+        self.assertEqual(next(events), 'retry: 1000\n')
+        state = event_data(next(events))
+        self.assertEqual(state, {'status': 'queued', 'meta': {'processed_words': 0}, 'result': None})
+        self.assertEqual(list(events), [])
+
+    def test_published_progress_streamed(self):
+        events = job_progress.events(self.job, max_seconds=5, keepalive=5)
+        next(events), next(events)
+
+        self.job.meta['processed_words'] = 3
+        job_progress.publish(self.job)
+        self.assertEqual(event_data(next(events))['meta'], {'processed_words': 3})
+
+        job_progress.publish(self.job, 'finished', {'word': 'walk'})
+        state = event_data(next(events))
+        self.assertEqual(state['status'], 'finished')
+        self.assertEqual(state['result'], {'word': 'walk'})
+        # the stream ends with the job
+        self.assertEqual(list(events), [])
+
+    def test_finished_job_ends_stream(self):
+        self.job.set_status('finished')
+        events = list(job_progress.events(self.job, max_seconds=5, keepalive=5))
+        self.assertEqual(len(events), 2)
+        self.assertEqual(event_data(events[1])['status'], 'finished')
+
+    def test_failed_job_detected_when_idle(self):
+        events = job_progress.events(self.job, max_seconds=5, keepalive=0)
+        next(events), next(events)
+        self.assertEqual(next(events), ': keepalive\n\n')
+
+        self.job.set_status('failed')
+        self.assertEqual(event_data(next(events))['status'], 'failed')
+        self.assertEqual(list(events), [])
+
+    def test_publish_without_job(self):
+        # job functions called directly have no current job
+        job_progress.publish(None)
+
+
+class ProgressReporterTest(SimpleTestCase):
+    """Tests job_progress.ProgressReporter"""
+
+    def setUp(self):
+        self.job = mock.MagicMock(meta={})
+
+    def test_counters_started_at_zero(self):
+        job_progress.ProgressReporter(self.job, 'recognized_words')
+        self.assertEqual(self.job.meta, {'potential_words': 0, 'processed_words': 0, 'recognized_words': 0, 'rate': 0,
+                                         'eta': None})
+        self.job.save_meta.assert_called_once()
+
+    def test_writes_coalesced_by_word_count(self):
+        progress = job_progress.ProgressReporter(self.job, 'recognized_words', interval=3600, batch=10)
+        progress.set_total(25)
+        for _ in range(25):
+            progress.add(1, recognized_words=1)
+        # written when created, when the total is set and after 10 and 20 words
+        self.assertEqual(self.job.save_meta.call_count, 4)
+        self.assertEqual(self.job.meta['processed_words'], 25)
+        self.assertEqual(self.job.meta['recognized_words'], 25)
+
+    def test_writes_coalesced_by_interval(self):
+        with mock.patch('words.job_progress.time.monotonic', return_value=0):
+            progress = job_progress.ProgressReporter(self.job, interval=1, batch=1000)
+        for now in (0.5, 0.9, 1.0, 1.5, 2.5):
+            with mock.patch('words.job_progress.time.monotonic', return_value=now):
+                progress.add(1)
+        # written when created, and at 1.0 and 2.5 seconds
+        self.assertEqual(self.job.save_meta.call_count, 3)
+
+    def test_written_when_block_raises(self):
+        with self.assertRaises(ValueError):
+            with job_progress.ProgressReporter(self.job, interval=3600, batch=1000) as progress:
+                progress.add(3)
+                raise ValueError
+        self.assertEqual(self.job.save_meta.call_count, 2)
+        self.assertEqual(self.job.meta['processed_words'], 3)
+
+    def test_rate_and_eta(self):
+        with mock.patch('words.job_progress.time.monotonic', return_value=0):
+            progress = job_progress.ProgressReporter(self.job, interval=0, batch=1000)
+            progress.set_total(100)
+        with mock.patch('words.job_progress.time.monotonic', return_value=2):
+            # words done by an earlier run of the job are left out of the rate
+            progress.add(20, timed=False)
+            progress.add(40)
+        self.assertEqual(self.job.meta['rate'], 20)
+        self.assertEqual(self.job.meta['eta'], 2)
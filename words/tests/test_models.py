@@ -1,9 +1,15 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.utils import timezone
 
-from words.models import Word, Language, PartOfSpeech, WordSet
+from words.models import Word, Language, PartOfSpeech, WordSet, UnrecognizedWord, WordRelation, WordSetStats, \
+    Membership
 
 
 class WordTest(TestCase):
@@ -74,6 +80,36 @@ class WordTest(TestCase):
             self.assertFalse(word2_field.filter(name="dog").exists(), msg=f'field {name} not symmetrical')
 
 
+class WordRelationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Set up non-modified objects used by all test methods
+        cls.dog = Word.objects.create(name="dog")
+        cls.canine = Word.objects.create(name="canine")
+        cls.log = Word.objects.create(name="log")
+
+    def test_related_words_accessor_add_and_remove(self):
+        self.dog.syn.add(self.canine, through_defaults={'score': 90})
+        self.dog.rhy.add(self.log)
+        self.assertEqual(list(self.dog.syn.all()), [self.canine])
+        self.assertEqual(WordRelation.objects.get(source_word=self.dog, code='syn').score, 90)
+        self.dog.syn.remove(self.canine)
+        self.assertFalse(self.dog.syn.exists())
+        self.assertEqual(self.dog.rhy.count(), 1)
+        self.dog.rhy.clear()
+        self.assertFalse(WordRelation.objects.exists())
+
+    def test_relation_stored_once(self):
+        self.dog.syn.add(self.canine)
+        self.dog.syn.add(self.canine)
+        self.assertEqual(self.dog.syn.count(), 1)
+        with self.assertRaises(IntegrityError):
+            WordRelation.objects.create(source_word=self.dog, related_word=self.canine, code='syn')
+
+    def test_verbose_name(self):
+        self.assertEqual(Word.syn.verbose_name, 'synonyms')
+
+
 class LanguageTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -148,3 +184,76 @@ class WordSetTest(TestCase):
         pk = word_set.id
         expected_url = f'/words/wordset/{pk}'
         self.assertEqual(word_set.get_absolute_url(), expected_url)
+
+
+class MembershipTest(TestCase):
+    def test_word_name_copied_on_save(self):
+        membership = Membership.objects.create(wordset=WordSet.objects.create(name='test'),
+                                               word=Word.objects.create(name='walk'))
+        self.assertEqual(membership.word_name, 'walk')
+
+
+class WordSetStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.wordset = WordSet.objects.create(name="Test Set", unrecognized_words='xqz<br>qwzz<br>')
+        words = [('walk', 12.5, True, 3), ('run', 40, True, 1), ('stroll', 0.5, True, 2), ('amble', None, False, 4)]
+        for name, frequency, datamuse_success, occurrences in words:
+            word = Word.objects.create(name=name, frequency=frequency, datamuse_success=datamuse_success)
+            cls.wordset.words.add(word, through_defaults={'occurrences': occurrences})
+
+    def test_refresh(self):
+        WordSetStats.objects.refresh(self.wordset)
+        with self.assertNumQueries(2):
+            stats = WordSetStats.objects.refresh(self.wordset)
+        self.assertEqual((stats.unique_words, stats.total_occurrences), (4, 10))
+        self.assertEqual((stats.recognized_words, stats.missing_data_words, stats.unrecognized_words), (3, 1, 2))
+        self.assertEqual((stats.frequency_min, stats.frequency_median, stats.frequency_max),
+                         (Decimal('0.5'), Decimal('12.5'), Decimal('40')))
+
+    def test_empty_wordset(self):
+        stats = WordSetStats.objects.refresh(WordSet.objects.create(name="Empty"))
+        self.assertEqual((stats.unique_words, stats.total_occurrences), (0, 0))
+        self.assertIsNone(stats.frequency_median)
+
+    def test_refresh_for_words(self):
+        WordSetStats.objects.refresh(self.wordset)
+        Word.objects.filter(name='amble').update(datamuse_success=True)
+        WordSetStats.objects.refresh_for_words(Word.objects.filter(name='amble').values_list('id', flat=True))
+        self.assertEqual(WordSetStats.objects.get(wordset=self.wordset).missing_data_words, 0)
+
+    def test_for_wordset_computes_missing_stats(self):
+        self.assertFalse(WordSetStats.objects.filter(wordset=self.wordset).exists())
+        self.assertEqual(WordSetStats.objects.for_wordset(self.wordset).unique_words, 4)
+        wordset = WordSet.objects.select_related('stats').get(pk=self.wordset.pk)
+        with self.assertNumQueries(0):
+            WordSetStats.objects.for_wordset(wordset)
+
+
+class UnrecognizedWordTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Set up non-modified objects used by all test methods
+        UnrecognizedWord.objects.create(name="qwzz")
+        last_checked = timezone.now() - timedelta(days=settings.UNRECOGNIZED_WORD_TTL + 1)
+        UnrecognizedWord.objects.create(name="zzqw", last_checked=last_checked)
+
+    def test_current_and_expired(self):
+        self.assertTrue(UnrecognizedWord.objects.current().filter(name="qwzz").exists())
+        self.assertFalse(UnrecognizedWord.objects.current().filter(name="zzqw").exists())
+        self.assertTrue(UnrecognizedWord.objects.expired().filter(name="zzqw").exists())
+
+    def test_record_refreshes_and_creates_entries(self):
+        UnrecognizedWord.objects.record(["zzqw", "wqzz"], "en")
+        self.assertTrue(UnrecognizedWord.objects.current().filter(name="zzqw").exists())
+        self.assertTrue(UnrecognizedWord.objects.current().filter(name="wqzz").exists())
+        self.assertEqual(UnrecognizedWord.objects.filter(name="zzqw").count(), 1)
+
+    def test_record_leaves_out_names_too_long_to_store(self):
+        UnrecognizedWord.objects.record(["x" * 120, "wqzz"], "en")
+        self.assertTrue(UnrecognizedWord.objects.filter(name="wqzz").exists())
+        self.assertFalse(UnrecognizedWord.objects.filter(name__startswith="xxx").exists())
+
+    def test_unique_name_per_language(self):
+        with self.assertRaises(IntegrityError):
+            UnrecognizedWord.objects.create(name="qwzz")
@@ -0,0 +1,51 @@
+from django.test import TestCase, SimpleTestCase
+
+from words import pagination
+from words.models import WordSet, Word, Membership
+
+
+class CursorTest(SimpleTestCase):
+    def test_round_trip(self):
+        cursor = pagination.encode_cursor('walk', 12)
+        self.assertEqual(pagination.decode_cursor(cursor, 2), ['walk', 12])
+        self.assertEqual(pagination.decode_membership_cursor(cursor), ('walk', 12))
+
+    def test_invalid_cursor(self):
+        for cursor in ['not a cursor', '!!!!', pagination.encode_cursor('walk'), pagination.encode_cursor(12, 'walk')]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    pagination.decode_membership_cursor(cursor)
+
+
+class MembershipPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.wordset = WordSet.objects.create(name='test')
+        for i, name in enumerate(['walk', 'amble', 'stroll', 'hike', 'run']):
+            Membership.objects.create(wordset=cls.wordset, word=Word.objects.create(name=name), occurrences=i + 1)
+
+    def test_pages_in_order_of_name(self):
+        with self.assertNumQueries(1):
+            first = pagination.membership_page(self.wordset, 2)
+        self.assertEqual(first['words'], [{'name': 'amble', 'occurrences': 2}, {'name': 'hike', 'occurrences': 4}])
+        second = pagination.membership_page(self.wordset, 2, first['next'])
+        self.assertEqual([word['name'] for word in second['words']], ['run', 'stroll'])
+        last = pagination.membership_page(self.wordset, 2, second['next'])
+        self.assertEqual([word['name'] for word in last['words']], ['walk'])
+        self.assertIsNone(last['next'])
+
+    def test_wordset_built_with_words_add(self):
+        wordset = WordSet.objects.create(name='added')
+        wordset.words.add(*Word.objects.filter(name__in=['walk', 'run', 'hike']))
+        first = pagination.membership_page(wordset, 2)
+        self.assertEqual([word['name'] for word in first['words']], ['hike', 'run'])
+        last = pagination.membership_page(wordset, 2, first['next'])
+        self.assertEqual([word['name'] for word in last['words']], ['walk'])
+        self.assertIsNone(last['next'])
+
+    def test_words_of_other_wordsets_excluded(self):
+        other = WordSet.objects.create(name='other')
+        Membership.objects.create(wordset=other, word=Word.objects.create(name='bike'))
+        page = pagination.membership_page(self.wordset, 10)
+        self.assertNotIn('bike', [word['name'] for word in page['words']])
+        self.assertIsNone(page['next'])
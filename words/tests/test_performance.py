@@ -0,0 +1,171 @@
+"""Performance tests for the views and JSON endpoints that read WordSets.
+
+Each view is requested for WordSets of several sizes (settings via the PERFORMANCE_TEST_SIZES environment variable, a
+comma separated list of membership counts) and must use the same number of queries for every size, so a change that
+turns a constant number of queries into one query per membership fails. The wall-clock time of each request is written
+to a JSON report (path set by the PERFORMANCE_REPORT environment variable).
+
+The tests are tagged 'performance'; run them alone with "python manage.py test --tag performance" or skip them with
+"python manage.py test --exclude-tag performance"."""
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings, tag
+from django.urls import reverse
+from fakeredis import FakeStrictRedis
+from rq import Queue
+from rq.job import Job
+
+from words import pagination, views
+from words.models import WordSet, Word, Membership, WordRelation, WordSetStats, default_language
+
+# numbers of memberships in the seeded WordSets
+sizes = [int(size) for size in os.getenv('PERFORMANCE_TEST_SIZES', '100,10000,100000').split(',')]
+
+# file the timings are written to
+report_path = os.getenv('PERFORMANCE_REPORT', os.path.join(tempfile.gettempdir(), 'datamuse_viz_performance.json'))
+
+
+def seed_wordset(size: int):
+    """Creates a WordSet with size memberships, using a few bulk queries."""
+    wordset = WordSet.objects.create(name=f'performance {size}')
+    language = default_language()
+    words = Word.objects.bulk_create(
+        [Word(name=f'p{size}w{i}', language_id=language, frequency=i % 1000, datamuse_success=i % 10 != 0)
+         for i in range(size)],
+        batch_size=10000
+    )
+    Membership.objects.bulk_create(
+        [Membership(wordset=wordset, word=word, word_name=word.name, occurrences=i % 50 + 1)
+         for i, word in enumerate(words)],
+        batch_size=10000
+    )
+    WordSetStats.objects.refresh(wordset)
+    return wordset
+
+
+@tag('performance')
+class ViewPerformanceTest(TestCase):
+    """Tests that the number of queries used by each view does not grow with the size of the WordSet"""
+
+    # timings in seconds, by view and WordSet size
+    report = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wordsets = {size: seed_wordset(size) for size in sizes}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with open(report_path, 'w') as report_file:
+            json.dump(cls.report, report_file, indent=4, sort_keys=True)
+
+    def measure(self, name: str, size: int, queries: int, request):
+        """Calls request (which makes a request and returns the response), asserting that it uses exactly queries
+        queries, and records its wall-clock time in the report."""
+        with self.assertNumQueries(queries):
+            start = time.perf_counter()
+            response = request()
+            elapsed = time.perf_counter() - start
+        self.assertEqual(response.status_code, 200)
+        self.report.setdefault(name, {})[str(size)] = round(elapsed, 4)
+        return response
+
+    def test_wordset_detail(self):
+        for size, wordset in self.wordsets.items():
+            with self.subTest(size=size):
+                self.measure('wordset_detail', size, 3,
+                             lambda: self.client.get(reverse('wordset-detail', args=[wordset.pk])))
+
+    def test_wordset_words_json(self):
+        """Tests the first page of the word table and a page deep in the WordSet, which must cost the same"""
+        for size, wordset in self.wordsets.items():
+            with self.subTest(size=size):
+                url = reverse('wordset words json', args=[wordset.pk])
+                self.measure('wordset_words_json', size, 2, lambda: self.client.get(url))
+                # the cursor of a page near the end of the WordSet
+                last = Membership.objects.filter(wordset=wordset).order_by('-word_name', '-id')[10]
+                cursor = pagination.encode_cursor(last.word_name, last.id)
+                self.measure('wordset_words_json_last_page', size, 2,
+                             lambda: self.client.get(url, {'cursor': cursor}))
+
+    def test_wordset_list(self):
+        for size in self.wordsets:
+            with self.subTest(size=size):
+                self.measure('wordset_list', size, 1, lambda: self.client.get(reverse('wordsets')))
+
+    @override_settings(FREQUENCY_CHART_PAGE_SIZE=10)
+    def test_visualization_frequency(self):
+        for size, wordset in self.wordsets.items():
+            with self.subTest(size=size):
+                self.measure('visualization_frequency', size, 4,
+                             lambda: self.client.post(reverse('viz frequency'), {'word_set': wordset.pk}))
+
+    def test_visualization_frequency_json(self):
+        """Tests the first page and a page deep in the WordSet, which must cost the same"""
+        for size, wordset in self.wordsets.items():
+            with self.subTest(size=size):
+                url = reverse('viz frequency json', args=[wordset.pk])
+                response = self.measure('visualization_frequency_json', size, 3,
+                                        lambda: self.client.get(url, {'limit': 10}))
+                cursor = response.json()['next']
+                for _ in range(5):
+                    cursor = self.client.get(url, {'limit': 10, 'cursor': cursor}).json()['next']
+                self.measure('visualization_frequency_json_page_7', size, 3,
+                             lambda: self.client.get(url, {'limit': 10, 'cursor': cursor}))
+
+    def test_visualization_frequency_scatterplot(self):
+        for size, wordset in self.wordsets.items():
+            with self.subTest(size=size):
+                self.measure('visualization_frequency_scatterplot', size, 4,
+                             lambda: self.client.post(reverse('viz frequency scatterplot'), {'word_set': wordset.pk}))
+
+    def test_visualization_frequency_scatterplot_json(self):
+        for size, wordset in self.wordsets.items():
+            with self.subTest(size=size):
+                response = self.measure('visualization_frequency_scatterplot_json', size, 3, lambda: self.client.get(
+                    reverse('viz frequency scatterplot json', args=[wordset.pk])))
+                self.assertLessEqual(len(response.json()['points']), settings.SCATTERPLOT_MAX_POINTS)
+
+    @mock.patch('words.datamuse_json.query_with_retry', return_value=[])
+    def test_related_words_process(self, query_with_retryMock):
+        """Tests the job that builds the related words json, with up to 15 * size / 100 related words"""
+        codes = ['jja', 'jjb', 'syn', 'trg', 'ant', 'spc', 'gen', 'com', 'par', 'bga', 'bgb', 'rhy', 'nry', 'hom', 'cns']
+        for size, wordset in self.wordsets.items():
+            with self.subTest(size=size):
+                words = list(wordset.words.order_by('id')[:max(1, size // 100) + 1])
+                word = words[0]
+                Word.objects.filter(pk=word.pk).update(datamuse_success=True)
+                WordRelation.objects.bulk_create([
+                    WordRelation(source_word=word, related_word=related_word, code=code, score=i)
+                    for code in codes for i, related_word in enumerate(words[1:])
+                ])
+
+                class Response:
+                    status_code = 200
+
+                def request():
+                    result = views.related_words_process(word.name, codes)
+                    self.assertEqual(len(result['json_object']['children']), len(codes))
+                    return Response
+
+                self.measure('related_words_process', size, 3, request)
+
+    def test_job_json_endpoints(self):
+        """Tests that the job progress endpoints read the job from Redis without querying the database"""
+        connection = FakeStrictRedis()
+        job = Job.create(func=len, args=([],), connection=connection)
+        job.meta['processed_words'] = 1
+        job.save()
+        with mock.patch.object(views, 'redis_cursor', new=connection), \
+                mock.patch.object(views, 'rq_queue', new=Queue(is_async=False, connection=connection)):
+            for size in self.wordsets:
+                with self.subTest(size=size):
+                    self.measure('job_json', size, 0, lambda: self.client.get(reverse('job json', args=[job.id])))
+                    self.measure('wordset_create_progress_json', size, 0,
+                                 lambda: self.client.get(reverse('wordset_create_progress json', args=[job.id])))
@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from fakeredis import FakeStrictRedis
+from rq import Queue, SimpleWorker
+from rq.job import Job, JobStatus
+
+from words import related_words, views
+from words.models import Word, WordRelation
+
+
+class RelatedWordsJobTest(TestCase):
+    """Tests the single-flight enqueueing of related words chart jobs"""
+
+    def setUp(self):
+        self.connection = FakeStrictRedis()
+        self.queue = Queue(connection=self.connection)
+
+    def test_job_id(self):
+        self.assertEqual(related_words.job_id('Happy ', ['syn', 'ant']), related_words.job_id('happy', ['ant', 'syn']))
+        self.assertNotEqual(related_words.job_id('happy', ['syn']), related_words.job_id('happy', ['syn', 'ant']))
+        self.assertNotEqual(related_words.job_id('happy', ['syn']), related_words.job_id('sad', ['syn']))
+        self.assertNotEqual(related_words.job_id('happy', ['syn'], 'en'), related_words.job_id('happy', ['syn'], 'fr'))
+
+    def test_queued_job_shared(self):
+        job = related_words.enqueue(self.queue, 'happy', ['syn', 'ant'])
+        self.assertEqual(related_words.enqueue(self.queue, 'HAPPY', ['ant', 'syn']).id, job.id)
+        self.assertEqual(self.queue.job_ids, [job.id])
+        # the relation types are in the order of relation_codes, whichever order they were requested in
+        self.assertEqual(job.args, ('happy', ['syn', 'ant']))
+
+    def test_simultaneous_requests_share_job(self):
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            jobs = list(executor.map(lambda i: related_words.enqueue(self.queue, 'happy', ['syn'], 'en'), range(10)))
+        self.assertEqual(len({job.id for job in jobs}), 1)
+        self.assertEqual(self.queue.job_ids, [jobs[0].id])
+
+    @mock.patch('words.datamuse_json.query_with_retry', return_value=[])
+    def test_finished_job_shared(self, query_with_retryMock):
+        job = related_words.enqueue(self.queue, 'happy', ['syn'])
+        SimpleWorker([self.queue], connection=self.connection).work(burst=True)
+        self.assertEqual(related_words.enqueue(self.queue, 'happy', ['syn']).id, job.id)
+        self.assertEqual(self.queue.job_ids, [])
+        # the result is kept for settings.RELATED_WORDS_RESULT_TTL
+        self.assertGreater(self.connection.ttl(job.key), 0)
+
+    def test_failed_job_enqueued_again(self):
+        job = related_words.enqueue(self.queue, 'happy', ['syn'])
+        self.queue.pop_job_id()
+        job.set_status(JobStatus.FAILED)
+        self.assertEqual(related_words.enqueue(self.queue, 'happy', ['syn']).id, job.id)
+        self.assertEqual(self.queue.job_ids, [job.id])
+        self.assertEqual(Job.fetch(job.id, connection=self.connection).get_status(), JobStatus.QUEUED)
+
+    @mock.patch('words.datamuse_json.query_with_retry', side_effect=ConnectionError('Datamuse service unavailable'))
+    def test_job_that_could_not_reach_datamuse_not_shared(self, query_with_retryMock):
+        job = related_words.enqueue(self.queue, 'happy', ['syn'])
+        SimpleWorker([self.queue], connection=self.connection).work(burst=True)
+        job.refresh()
+        self.assertTrue(job.result['retryable'])
+        related_words.enqueue(self.queue, 'happy', ['syn'])
+        self.assertEqual(self.queue.job_ids, [job.id])
+
+    def test_duplicate_posts_share_job_id(self):
+        with mock.patch.object(views, 'rq_queue', new=self.queue):
+            responses = [self.client.post(reverse('viz related words'), {'word': 'happy', 'relations': ['syn']})
+                         for _ in range(2)]
+        self.assertEqual(responses[0].context['job_id'], responses[1].context['job_id'])
+        self.assertEqual(len(self.queue), 1)
+
+
+class StoredRelationsTest(TestCase):
+    """Tests that the part of the related words chart whose relations are stored is built by the view"""
+
+    @classmethod
+    def setUpTestData(cls):
+        word = Word.objects.create(name='dog', datamuse_success=True)
+        WordRelation.objects.bulk_create([
+            WordRelation(source_word=word, related_word=Word.objects.create(name='canine'), code='syn', score=10),
+            WordRelation(source_word=word, related_word=Word.objects.create(name='hound'), code='syn', score=90),
+            WordRelation(source_word=word, related_word=Word.objects.create(name='log'), code='rhy', score=50),
+        ])
+
+    def setUp(self):
+        self.queue = Queue(connection=FakeStrictRedis())
+
+    def post(self, word, codes):
+        with mock.patch.object(views, 'rq_queue', new=self.queue):
+            return self.client.post(reverse('viz related words'), {'word': word, 'relations': codes})
+
+    def test_stored_relations_single_query(self):
+        with self.assertNumQueries(1):
+            relations_by_code = related_words.stored_relations('Dog ', ['syn', 'rhy', 'ant'])
+        self.assertEqual({code: [relation.related_word.name for relation in relations]
+                          for code, relations in relations_by_code.items()},
+                         {'syn': ['hound', 'canine'], 'rhy': ['log']})
+
+    def test_build_chart(self):
+        relations_by_code = related_words.stored_relations('dog', ['syn', 'rhy'])
+        result = related_words.build_chart('dog', ['syn', 'rhy', 'ant'], relations_by_code)
+        self.assertEqual(result['json_object'], {'name': 'dog', 'children': [
+            {'name': 'synonyms', 'children': [{'name': 'hound', 'score': 90}, {'name': 'canine', 'score': 10}]},
+            {'name': 'rhymes', 'children': [{'name': 'log', 'score': 50}]},
+        ]})
+        self.assertEqual(result['relations_with_no_results'], ['antonyms'])
+        self.assertEqual(related_words.build_chart('dog', ['ant'], {})['datamuse_error'],
+                         'No related words found for word "dog" for the chosen relations')
+
+    def test_stored_chart_served_without_job(self):
+        response = self.post('Dog', ['rhy', 'syn'])
+        self.assertNotIn('job_id', response.context)
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual([child['name'] for child in response.context['result']['json_object']['children']],
+                         ['synonyms', 'rhymes'])
+
+    def test_job_only_for_missing_relations(self):
+        response = self.post('dog', ['syn', 'ant', 'trg'])
+        self.assertEqual([child['name'] for child in response.context['result']['json_object']['children']],
+                         ['synonyms'])
+        job = Job.fetch(response.context['job_id'], connection=self.queue.connection)
+        self.assertEqual(job.args, ('dog', ['trg', 'ant']))
+        self.assertEqual(response.context['relation_names'], ['synonyms', 'triggers', 'antonyms'])
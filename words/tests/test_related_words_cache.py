@@ -0,0 +1,133 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from fakeredis import FakeStrictRedis
+from rq import Queue
+
+from words import related_words_cache, views
+from words.datamuse_json import add_related_many
+from words.models import Word, WordRelation
+from words.related_words_cache import RelatedWordsCache
+
+
+class RelatedWordsCacheTest(SimpleTestCase):
+    """Tests the versioned cache of related words charts"""
+
+    def setUp(self):
+        self.cache = RelatedWordsCache(60, connection=FakeStrictRedis())
+        self.chart = {'json_object': {'name': 'happy', 'children': []}}
+
+    def test_chart_cached_by_word_and_codes(self):
+        version = self.cache.version('happy')
+        self.cache.set('happy', ['syn', 'ant'], version, self.chart)
+        self.assertEqual(self.cache.get('Happy', ['ant', 'syn']), self.chart)
+        self.assertIsNone(self.cache.get('happy', ['syn']))
+
+    def test_invalidated_when_relations_added(self):
+        self.cache.set('happy', ['syn'], self.cache.version('happy'), self.chart)
+        self.cache.set('sad', ['syn'], self.cache.version('sad'), self.chart)
+        self.cache.invalidate(['happy'])
+        self.assertIsNone(self.cache.get('happy', ['syn']))
+        self.assertEqual(self.cache.get('sad', ['syn']), self.chart)
+
+    def test_chart_built_before_invalidation_not_served(self):
+        # a job reads the version, then relations are added while it builds the chart
+        version = self.cache.version('happy')
+        self.cache.invalidate(['happy'])
+        self.cache.set('happy', ['syn'], version, self.chart)
+        self.assertIsNone(self.cache.get('happy', ['syn']))
+
+    def test_disabled(self):
+        cache = RelatedWordsCache(0, connection=FakeStrictRedis())
+        cache.set('happy', ['syn'], cache.version('happy'), self.chart)
+        self.assertIsNone(cache.get('happy', ['syn']))
+        cache.add_no_results('happy', ['ant'])
+        self.assertEqual(cache.no_results('happy'), set())
+
+    def test_no_results_recorded(self):
+        self.cache.add_no_results('happy', ['ant'])
+        self.cache.add_no_results('Happy', ['trg'])
+        self.assertEqual(self.cache.no_results('happy'), {'ant', 'trg'})
+        self.assertEqual(self.cache.no_results('sad'), set())
+
+
+class RelatedWordsChartCacheTest(TestCase):
+    """Tests that the related words view serves cached charts and that new relations invalidate them"""
+
+    def setUp(self):
+        self.cache = RelatedWordsCache(60, connection=FakeStrictRedis())
+        patcher = mock.patch.object(related_words_cache, 'cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.word = Word.objects.create(name='dog', datamuse_success=True)
+        WordRelation.objects.create(source_word=self.word, related_word=Word.objects.create(name='hound'), code='syn',
+                                    score=90)
+
+    @mock.patch('words.datamuse_json.query_with_retry', return_value=[])
+    def test_chart_cached_by_job(self, query_with_retryMock):
+        result = views.related_words_process('dog', ['syn'])
+        self.assertEqual(self.cache.get('dog', ['syn']), result)
+
+    @mock.patch('words.datamuse_json.query_with_retry', side_effect=ConnectionError('Datamuse service unavailable'))
+    def test_chart_without_datamuse_not_cached(self, query_with_retryMock):
+        views.related_words_process('dog', ['ant'])
+        self.assertIsNone(self.cache.get('dog', ['ant']))
+
+    @mock.patch('words.datamuse_json.query_with_retry', return_value=[])
+    def test_cache_hit_served_without_job(self, query_with_retryMock):
+        result = views.related_words_process('dog', ['syn'])
+        queue = Queue(connection=FakeStrictRedis())
+        with mock.patch.object(views, 'rq_queue', new=queue):
+            response = self.client.post(reverse('viz related words'), {'word': 'Dog', 'relations': ['syn']})
+        self.assertEqual(response.context['result'], result)
+        self.assertNotIn('job_id', response.context)
+        self.assertEqual(len(queue), 0)
+        self.assertContains(response, 'id="related-words-result"')
+
+    @mock.patch('words.datamuse_json.query_with_retry', return_value=[{'word': 'canine', 'score': 80, 'tags': []}])
+    def test_new_relations_invalidate_chart(self, query_with_retryMock):
+        views.related_words_process('dog', ['syn'])
+        add_related_many('dog', ['rhy'])
+        self.assertIsNone(self.cache.get('dog', ['syn']))
+
+    def post(self, codes):
+        queue = Queue(connection=FakeStrictRedis())
+        with mock.patch.object(views, 'rq_queue', new=queue):
+            response = self.client.post(reverse('viz related words'), {'word': 'dog', 'relations': codes})
+        return response, queue
+
+    @mock.patch('words.datamuse_json.query_with_retry', return_value=[])
+    def test_relations_without_results_not_missing(self, query_with_retryMock):
+        views.related_words_process('dog', ['ant'])
+        self.assertEqual(self.cache.no_results('dog'), {'ant'})
+        response, queue = self.post(['syn', 'ant'])
+        self.assertNotIn('job_id', response.context)
+        self.assertEqual(len(queue), 0)
+        result = response.context['result']
+        self.assertEqual([child['name'] for child in result['json_object']['children']], ['synonyms'])
+        self.assertEqual(result['relations_with_no_results'], ['antonyms'])
+        # the whole chart is cached under all of its relation types
+        self.assertEqual(self.cache.get('dog', ['syn', 'ant']), result)
+
+    def test_cached_result_for_missing_relations_merged(self):
+        self.cache.set('dog', ['ant'], self.cache.version('dog'), {
+            'relations_with_no_results': ['antonyms'],
+            'datamuse_error': 'No related words found for word "dog" for the chosen relations',
+        })
+        response, queue = self.post(['ant', 'syn'])
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(response.context['result'], {
+            'json_object': {'name': 'dog', 'children': [{'name': 'synonyms', 'children': [{'name': 'hound',
+                                                                                          'score': 90}]}]},
+            'relations_with_no_results': ['antonyms'],
+        })
+        self.assertEqual(self.cache.get('dog', ['syn', 'ant']), response.context['result'])
+
+    def test_job_for_missing_relations_after_relations_without_results(self):
+        self.cache.add_no_results('dog', ['ant'])
+        response, queue = self.post(['ant', 'trg'])
+        self.assertEqual(len(queue), 1)
+        # whether any relation type has related words is up to the job
+        self.assertEqual(response.context['result'], {'relations_with_no_results': ['antonyms']})
@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from fakeredis import FakeStrictRedis
+from rq import Queue, SimpleWorker
+from rq.job import Job
+
+from words import related_words_graph, views
+from words.models import Word, WordRelation
+
+
+def datamuse_stub(relations: dict):
+    """Returns a stand-in for query_with_retry answering the rel_syn queries with the related words in relations (a
+    dict mapping words to lists of (related word, score) tuples)."""
+    def query_with_retry(attempts, backoff, **kwargs):
+        return [{'word': name, 'score': score, 'tags': []} for name, score in relations.get(kwargs['rel_syn'], [])]
+    return query_with_retry
+
+
+class RelatedWordsGraphTest(TestCase):
+    """Tests the breadth-first expansion of related words graphs"""
+
+    @classmethod
+    def setUpTestData(cls):
+        words = {name: Word.objects.create(name=name, datamuse_success=True)
+                 for name in ('dog', 'hound', 'canine', 'puppy', 'pooch', 'mutt')}
+        WordRelation.objects.bulk_create([
+            WordRelation(source_word=words[source], related_word=words[related], code='syn', score=score)
+            for source, related, score in [
+                ('dog', 'hound', 90), ('dog', 'canine', 70), ('dog', 'puppy', 5),
+                ('hound', 'dog', 95), ('hound', 'pooch', 60), ('hound', 'mutt', 50),
+                ('canine', 'hound', 80),
+            ]
+        ])
+
+    @mock.patch('words.datamuse_json.query_with_retry')
+    def test_stored_relations(self, query_with_retryMock):
+        """Tests the fan-out cap, the score threshold and that each word appears once, using stored relations only"""
+        query_with_retryMock.side_effect = datamuse_stub({})
+        levels = list(related_words_graph.expand('Dog', 'syn', depth=2, fan_out=2, min_score=55))
+        self.assertEqual(levels[0]['nodes'], [
+            {'name': 'hound', 'parent': 'dog', 'score': 90},
+            {'name': 'canine', 'parent': 'dog', 'score': 70},
+        ])
+        # dog is already in the graph, and mutt scores less than min_score
+        self.assertEqual(levels[1]['nodes'], [{'name': 'pooch', 'parent': 'hound', 'score': 60}])
+        query_with_retryMock.assert_not_called()
+
+    @mock.patch('words.datamuse_json.query_with_retry')
+    def test_frontier_without_stored_relations_queried(self, query_with_retryMock):
+        query_with_retryMock.side_effect = datamuse_stub({'pooch': [('doggy', 40)]})
+        levels = list(related_words_graph.expand('hound', 'syn', depth=3, fan_out=2))
+        # mutt is beyond the fan-out of hound
+        self.assertEqual([[node['name'] for node in level['nodes']] for level in levels],
+                         [['dog', 'pooch'], ['canine', 'puppy', 'doggy'], []])
+        # Datamuse is only queried for the words with no stored relations
+        queried = sorted(call[1]['rel_syn'] for call in query_with_retryMock.call_args_list)
+        self.assertEqual(queried, ['doggy', 'pooch', 'puppy'])
+        self.assertTrue(WordRelation.objects.filter(source_word__name='pooch', related_word__name='doggy').exists())
+
+    @mock.patch('words.datamuse_json.query_with_retry', side_effect=ConnectionError('Datamuse service unavailable'))
+    def test_failed_words(self, query_with_retryMock):
+        levels = list(related_words_graph.expand('hound', 'syn', depth=2, fan_out=2))
+        self.assertEqual(levels[1]['failed_words'], ['pooch'])
+
+    def test_build_tree(self):
+        levels = [
+            {'level': 1, 'nodes': [{'name': 'hound', 'parent': 'dog', 'score': 90}], 'failed_words': []},
+            {'level': 2, 'nodes': [{'name': 'pooch', 'parent': 'hound', 'score': 60}], 'failed_words': []},
+        ]
+        self.assertEqual(related_words_graph.build_tree('dog', levels), {'name': 'dog', 'children': [
+            {'name': 'hound', 'score': 90, 'children': [{'name': 'pooch', 'score': 60}]},
+        ]})
+
+    @mock.patch('words.datamuse_json.query_with_retry')
+    def test_job_reports_levels(self, query_with_retryMock):
+        query_with_retryMock.side_effect = datamuse_stub({})
+        queue = Queue(connection=FakeStrictRedis())
+        job = related_words_graph.enqueue(queue, 'dog', 'syn', 2, fan_out=1)
+        self.assertEqual(related_words_graph.enqueue(queue, 'Dog', 'syn', 2, fan_out=1).id, job.id)
+        SimpleWorker([queue], connection=queue.connection).work(burst=True)
+
+        job = Job.fetch(job.id, connection=queue.connection)
+        self.assertEqual([level['nodes'] for level in job.meta['levels']], [
+            [{'name': 'hound', 'parent': 'dog', 'score': 90}],
+            [{'name': 'pooch', 'parent': 'hound', 'score': 60}],
+        ])
+        self.assertEqual(job.result['json_object']['children'][0]['children'], [{'name': 'pooch', 'score': 60}])
+
+    def test_view_enqueues_graph_job(self):
+        queue = Queue(connection=FakeStrictRedis())
+        with mock.patch.object(views, 'rq_queue', new=queue):
+            response = self.client.post(reverse('viz related words'), {'word': 'dog', 'relations': ['syn'], 'depth': 2})
+            self.assertEqual(response.context['job_id'], related_words_graph.job_id('dog', 'syn', 2, 5, 0))
+            self.assertNotIn('result', response.context)
+
+            response = self.client.post(reverse('viz related words'),
+                                        {'word': 'dog', 'relations': ['syn', 'ant'], 'depth': 2})
+            self.assertFalse(response.context['form'].is_valid())
+        self.assertEqual(len(queue), 1)
@@ -0,0 +1,70 @@
+import tempfile
+from collections import Counter
+from unittest import mock
+
+from django.test import TestCase, SimpleTestCase
+
+from words import upload_spool
+from words.models import SpooledUploadChunk
+from words.upload_spool import FileSystemBackend, DatabaseBackend, UploadSpool, SpooledUpload, create_spool
+
+
+class FileSystemBackendTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.spool = UploadSpool(FileSystemBackend(self.directory.name))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_write_read_and_delete(self):
+        word_counts = Counter({'walk': 2, 'new\nline': 1, 'tab\tword': 3})
+        self.spool.write('job1', word_counts)
+        self.assertTrue(self.spool.exists('job1'))
+        self.assertEqual(self.spool.keys(), ['job1'])
+        self.assertEqual(Counter(dict(self.spool.read('job1'))), word_counts)
+        self.spool.delete('job1')
+        self.assertFalse(self.spool.exists('job1'))
+
+    def test_key_cannot_leave_directory(self):
+        with self.assertRaises(ValueError):
+            self.spool.write('../job1', {'walk': 1})
+
+
+class DatabaseBackendTest(TestCase):
+    def test_write_read_and_delete(self):
+        spool = UploadSpool(DatabaseBackend(chunk_size=2))
+        word_counts = Counter({'walk': 2, 'run': 1, 'jump': 3})
+        spool.write('job1', word_counts)
+        self.assertEqual(SpooledUploadChunk.objects.filter(key='job1').count(), 2)
+        self.assertEqual(list(spool.read('job1')), list(word_counts.items()))
+        spool.delete('job1')
+        self.assertFalse(spool.exists('job1'))
+
+    def test_empty_upload_exists(self):
+        spool = UploadSpool(DatabaseBackend())
+        spool.write('job1', {})
+        self.assertTrue(spool.exists('job1'))
+        self.assertEqual(list(spool.read('job1')), [])
+
+    def test_write_replaces_words(self):
+        spool = UploadSpool(DatabaseBackend())
+        spool.write('job1', {'walk': 1})
+        spool.write('job1', {'run': 1})
+        self.assertEqual(list(spool.read('job1')), [('run', 1)])
+
+
+class SpooledUploadTest(TestCase):
+    def test_items_streamed_from_spool(self):
+        spool = UploadSpool(DatabaseBackend())
+        spool.write('job1', {'walk': 2})
+        with mock.patch.object(upload_spool, 'spool', spool):
+            self.assertEqual(dict(SpooledUpload('job1').items()), {'walk': 2})
+            SpooledUpload('job1').delete()
+        self.assertFalse(spool.exists('job1'))
+
+
+class CreateSpoolTest(SimpleTestCase):
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            create_spool({'BACKEND': 'tape'})
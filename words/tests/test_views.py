@@ -6,7 +6,7 @@ from unittest import mock
 from django import http
 from fakeredis import FakeStrictRedis
 from django.contrib.auth.models import User
-from django.test import TestCase, SimpleTestCase
+from django.test import TestCase, SimpleTestCase, override_settings
 from django.urls import reverse
 from rq import Queue
 from rq.job import Job
@@ -14,7 +14,7 @@ from unittest import mock
 
 from words import views
 from words.datamuse_json import DatamuseWordNotRecognizedError
-from words.models import WordSet, Word
+from words.models import WordSet, Word, WordRelation, WordSetStats, Membership
 
 logger = logging.getLogger(__name__)
 
@@ -172,6 +172,37 @@ class WordSetCreateProgressJSONTest(TestCase):
                 self.assertIn('processed_words', content)
                 self.assertIn('recognized_words', content)
 
+    def test_json_does_not_write_job(self, uuid4Mock):
+        """Tests that 'wordset_create_progress json' only reads the job."""
+        conn = FakeStrictRedis()
+        with mock.patch.object(views, "rq_queue", new=Queue(is_async=False, connection=conn)):
+            with mock.patch.object(views, "redis_cursor", new=conn):
+                self.client.post('/words/wordset/create/', {'name': 'test1', 'words': 'word\r\ntest'})
+                with mock.patch.object(Job, "save_meta") as save_meta, mock.patch.object(Job, "save") as save:
+                    self.client.get(reverse("wordset_create_progress json", args=[self.job_id]))
+                save_meta.assert_not_called()
+                save.assert_not_called()
+
+
+class JobEventsTest(SimpleTestCase):
+    """Tests 'job events' view."""
+
+    def test_unknown_job(self):
+        with mock.patch.object(views, "redis_cursor", new=FakeStrictRedis()):
+            response = self.client.get(reverse("job events", args=['no-such-job']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_finished_job_streamed(self):
+        conn = FakeStrictRedis()
+        job = Queue(is_async=False, connection=conn).enqueue(len, 'walk')
+        with mock.patch.object(views, "redis_cursor", new=conn):
+            response = self.client.get(reverse("job events", args=[job.id]))
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertIn('"status": "finished"', content)
+        self.assertIn('"result": 4', content)
+
 
 # patch so that jobs always have the same id. requires an additional arg representing the mocked function be passed
 # to each function in the test class
@@ -255,6 +286,48 @@ class WordSetDetailViewTest(TestCase):
         self.assertTrue(words_missing_data.filter(name="web").exists())
         self.assertTrue(words_missing_data.filter(name="site").exists())
 
+    def test_stats_in_context(self):
+        """Tests that the statistics of the WordSet are read from WordSetStats, and computed if it has none yet"""
+        wordset = WordSet.objects.get(name="test1")
+        wordset.words.add(Word.objects.create(name="web", datamuse_success=True))
+        response = self.client.get(wordset.get_absolute_url())
+        self.assertEqual(response.context['stats'].unique_words, 1)
+        self.assertNotIn('words_missing_data', response.context)
+        # stored statistics are not recomputed
+        WordSetStats.objects.filter(wordset=wordset).update(unique_words=5)
+        response = self.client.get(wordset.get_absolute_url())
+        self.assertContains(response, 'Number of Words: 5')
+
+
+class WordSetWordsJsonTest(TestCase):
+    """Tests the json endpoint serving pages of the word table of a WordSet"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wordset = WordSet.objects.create(name='test')
+        for name in ['walk', 'amble', 'stroll']:
+            Membership.objects.create(wordset=cls.wordset, word=Word.objects.create(name=name), occurrences=2)
+        cls.url = reverse('wordset words json', args=[cls.wordset.pk])
+
+    def test_pages_follow_cursor(self):
+        first = self.client.get(self.url, {'limit': 2}).json()
+        self.assertEqual(first['words'], [{'name': 'amble', 'occurrences': 2}, {'name': 'stroll', 'occurrences': 2}])
+        last = self.client.get(self.url, {'limit': 2, 'cursor': first['next']}).json()
+        self.assertEqual(last, {'words': [{'name': 'walk', 'occurrences': 2}], 'next': None})
+
+    @override_settings(WORDSET_TABLE_PAGE_SIZE=2)
+    def test_first_page_rendered_in_detail_page(self):
+        response = self.client.get(self.wordset.get_absolute_url())
+        self.assertEqual([word['name'] for word in response.context['words_page']['words']], ['amble', 'stroll'])
+        self.assertEqual(response.context['words_url'], self.url)
+        self.assertContains(response, '<td align=left>stroll</td>', html=True)
+        self.assertNotContains(response, '<td align=left>walk</td>', html=True)
+
+    def test_invalid_parameters(self):
+        for params in [{'cursor': 'not a cursor'}, {'limit': 0}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
 
 class WordSetDeleteTest(TestCase):
     @classmethod
@@ -504,23 +577,69 @@ class VisualizationFrequencyTest(TestCase):
     # tests for POST
 
     def test_wordset_data_in_post(self):
-        """Tests when POST used with a WordSet, context contains 'wordset_data', json formatted for the bubble chart"""
+        """Tests when POST used with a WordSet, context contains 'wordset_data', the first page of the bubble chart"""
         # create a WordSet to use
         word_set = WordSet.objects.create(name='test')
-        word_set.words.add(Word.objects.create(name="and")),
-        word_set.words.add(Word.objects.create(name="for"))
-        word_set.words.add(Word.objects.create(name="bike"))
+        word_set.words.add(Word.objects.create(name="and", frequency=25000))
+        word_set.words.add(Word.objects.create(name="for", frequency=8000))
+        word_set.words.add(Word.objects.create(name="bike", frequency=22.5))
         postData = {'word_set': word_set.id}
         response = self.client.post('/words/frequencies/', data=postData)
-        data_item_pattern = "{" \
-                            "'name': '\\s*'," \
-                            "'title': '\\s*'," \
-                            "'group': 'test'," \
-                            "'value': \\d*\\.\\d*" \
-                            "}"
-        pattern = "[" + data_item_pattern + "," + data_item_pattern + "," + data_item_pattern + "]"
         wordset_data = response.context['wordset_data']
-        self.assertRegex(wordset_data, pattern)
+        self.assertEqual(wordset_data['words'], [
+            {'name': 'and', 'title': 'and', 'group': 'test', 'value': 25000.0},
+            {'name': 'for', 'title': 'for', 'group': 'test', 'value': 8000.0},
+            {'name': 'bike', 'title': 'bike', 'group': 'test', 'value': 22.5},
+        ])
+        self.assertEqual(response.context['wordcount'], 3)
+        self.assertEqual(response.context['data_url'], reverse('viz frequency json', args=[word_set.id]))
+
+    def test_frequency_limits_in_data_url(self):
+        """Tests that the frequency limits of the form are applied to the first page and passed on in 'data_url'"""
+        word_set = WordSet.objects.create(name='test')
+        word_set.words.add(Word.objects.create(name="and", frequency=25000))
+        word_set.words.add(Word.objects.create(name="bike", frequency=22.5))
+        response = self.client.post('/words/frequencies/', data={'word_set': word_set.id, 'frequency_lt': 100})
+        self.assertEqual([word['name'] for word in response.context['wordset_data']['words']], ['bike'])
+        self.assertEqual(response.context['data_url'],
+                         reverse('viz frequency json', args=[word_set.id]) + '?frequency_lt=100')
+
+
+class VisualizationFrequencyJsonTest(TestCase):
+    """Tests the json endpoint serving pages of the frequency bubble chart"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wordset = WordSet.objects.create(name='test')
+        for name, frequency in [('and', 25000), ('for', 8000), ('bike', 22.5), ('walk', 22.5), ('gondola', 0.4)]:
+            cls.wordset.words.add(Word.objects.create(name=name, frequency=frequency))
+        cls.url = reverse('viz frequency json', args=[cls.wordset.pk])
+
+    def test_pages_follow_cursor(self):
+        first = self.client.get(self.url, {'limit': 2}).json()
+        self.assertEqual([word['name'] for word in first['words']], ['and', 'for'])
+        self.assertEqual(first['count'], 5)
+        self.assertEqual([item['count'] for item in first['bins']], [2, 1])
+
+        second = self.client.get(self.url, {'limit': 2, 'cursor': first['next']}).json()
+        self.assertEqual([word['name'] for word in second['words']], ['bike', 'walk'])
+        self.assertEqual(second['count'], 3)
+
+        last = self.client.get(self.url, {'limit': 2, 'cursor': second['next']}).json()
+        self.assertEqual([word['name'] for word in last['words']], ['gondola'])
+        self.assertEqual(last['bins'], [])
+        self.assertIsNone(last['next'])
+
+    def test_invalid_parameters(self):
+        for params in [{'cursor': 'not a cursor'}, {'limit': 0}, {'frequency_gt': 10, 'frequency_lt': 5}]:
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('errors', response.json())
+
+    def test_unknown_wordset(self):
+        response = self.client.get(reverse('viz frequency json', args=[self.wordset.pk + 1]))
+        self.assertEqual(response.status_code, 404)
 
 
 class VisualizationFrequencyScatterplotTest(TestCase):
@@ -555,3 +674,81 @@ class VisualizationFrequencyScatterplotTest(TestCase):
         wordset = WordSet.objects.create(name="test")
         response = self.client.get(f'/words/scatterplot/?id={wordset.id}')
         self.assertEqual(response.context['form'].initial['word_set'], wordset)
+
+    # tests for POST
+
+    def test_word_data_in_post(self):
+        """Tests when POST used with a WordSet, context contains 'word_data', the points of the scatterplot"""
+        word_set = WordSet.objects.create(name='test')
+        word_set.words.add(Word.objects.create(name="and", frequency=25000), through_defaults={'occurrences': 12})
+        word_set.words.add(Word.objects.create(name="bike", frequency=22.5), through_defaults={'occurrences': 3})
+        response = self.client.post(reverse('viz frequency scatterplot'),
+                                    {'word_set': word_set.id, 'occurrences_lt': 10})
+        self.assertEqual(response.context['word_data'],
+                         {'mode': 'points', 'count': 1, 'points': [{'name': 'bike', 'x': 3, 'y': 22.5}]})
+
+
+class VisualizationFrequencyScatterplotJsonTest(TestCase):
+    """Tests the json endpoint serving the data of the scatterplot"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wordset = WordSet.objects.create(name='test')
+        for i in range(10):
+            cls.wordset.words.add(Word.objects.create(name=f'word{i}', frequency=i),
+                                  through_defaults={'occurrences': i})
+        cls.url = reverse('viz frequency scatterplot json', args=[cls.wordset.pk])
+
+    def test_points(self):
+        data = self.client.get(self.url, {'frequency_gt': 6}).json()
+        self.assertEqual(data['mode'], 'points')
+        self.assertEqual(sorted(point['name'] for point in data['points']), ['word7', 'word8', 'word9'])
+
+    @override_settings(SCATTERPLOT_MAX_POINTS=5, SCATTERPLOT_GRID_SIZE=2)
+    def test_bins_when_too_many_points(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['mode'], 'bins')
+        self.assertEqual(data['count'], 10)
+        self.assertEqual([(point['count'], point['x'], point['y']) for point in data['points']],
+                         [(5, 2.0, 2.0), (5, 7.0, 7.0)])
+
+    def test_invalid_parameters(self):
+        response = self.client.get(self.url, {'occurrences_gt': 10, 'occurrences_lt': 5})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('errors', response.json())
+
+
+class RelatedWordsProcessTest(TestCase):
+    """Tests related_words_process function"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.word = Word.objects.create(name='dog', datamuse_success=True)
+        WordRelation.objects.bulk_create([
+            WordRelation(source_word=cls.word, related_word=Word.objects.create(name='canine'), code='syn', score=10),
+            WordRelation(source_word=cls.word, related_word=Word.objects.create(name='hound'), code='syn', score=90),
+            WordRelation(source_word=cls.word, related_word=Word.objects.create(name='log'), code='rhy', score=50),
+        ])
+
+    @mock.patch('words.datamuse_json.query_with_retry')
+    def test_related_words_in_order_of_score(self, query_with_retryMock):
+        """Tests that the json object lists the related words for each relation type in order of score"""
+        query_with_retryMock.return_value = []
+        result = views.related_words_process('dog', ['syn', 'rhy', 'ant'])
+        self.assertEqual(result['json_object']['children'], [
+            {'name': 'synonyms', 'children': [{'name': 'hound', 'score': 90}, {'name': 'canine', 'score': 10}]},
+            {'name': 'rhymes', 'children': [{'name': 'log', 'score': 50}]},
+        ])
+        self.assertEqual(result['relations_with_no_results'], ['antonyms'])
+
+    @mock.patch('words.datamuse_json.query_with_retry')
+    def test_no_related_words(self, query_with_retryMock):
+        query_with_retryMock.return_value = []
+        result = views.related_words_process('dog', ['ant'])
+        self.assertEqual(result['datamuse_error'], 'No related words found for word "dog" for the chosen relations')
+
+    @mock.patch('words.datamuse_json.query_with_retry')
+    def test_connection_error(self, query_with_retryMock):
+        query_with_retryMock.side_effect = ConnectionError('Datamuse service unavailable')
+        result = views.related_words_process('dog', ['ant'])
+        self.assertEqual(result['datamuse_error'], 'Datamuse service unavailable')
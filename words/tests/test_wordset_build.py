@@ -0,0 +1,212 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.urls import reverse
+from fakeredis import FakeStrictRedis
+from rq import Queue, SimpleWorker, Worker
+from rq.job import Job
+from rq.registry import StartedJobRegistry
+
+from words import views, wordset_build
+from words.job_checkpoint import JobCheckpoint
+from words.models import WordSet, Word, Membership, WordSetStats
+from words.tests.test_forms import fake_query_words
+from words.upload_spool import SpooledUpload, spool
+
+
+class ShardCountTest(SimpleTestCase):
+    @override_settings(WORDSET_SHARDS=4, WORDSET_SHARD_MIN_WORDS=100)
+    def test_shards_hold_minimum_words(self):
+        self.assertEqual(wordset_build.shard_count(0), 1)
+        self.assertEqual(wordset_build.shard_count(199), 1)
+        self.assertEqual(wordset_build.shard_count(250), 2)
+        self.assertEqual(wordset_build.shard_count(10000), 4)
+
+
+@override_settings(WORDSET_SHARDS=3, WORDSET_SHARD_MIN_WORDS=2)
+@mock.patch('words.forms.datamuse_json.query_words', new=fake_query_words)
+class WordSetBuildTest(TestCase):
+    """Tests building a WordSet with a coordinator job, shard jobs and a build job"""
+
+    build_id = 'build1'
+    words = {'walk': 2, 'run': 1, 'xqz': 1, 'jump': 3, 'skip': 1, 'xzz': 1, 'hop': 1}
+
+    def setUp(self):
+        self.connection = FakeStrictRedis()
+        self.wordset = WordSet.objects.create(name='test')
+        spool.write(wordset_build.coordinator_id(self.build_id), self.words)
+
+    def build(self, queue: Queue):
+        with mock.patch.object(views, 'rq_queue', new=queue):
+            wordset_build.enqueue(queue, self.wordset, True, self.build_id)
+            if queue.is_async:
+                SimpleWorker([queue], connection=self.connection).work(burst=True)
+        return Job.fetch(self.build_id, connection=self.connection)
+
+    def test_words_added_by_shards(self):
+        build_job = self.build(Queue(is_async=False, connection=self.connection))
+        self.assertEqual(build_job.get_status(), 'finished')
+        self.assertEqual(build_job.meta['shards'], 3)
+        for shard in range(3):
+            self.assertEqual(Job.fetch(wordset_build.shard_id(self.build_id, shard),
+                                       connection=self.connection).get_status(), 'finished')
+
+        self.assertEqual(dict(Membership.objects.filter(wordset=self.wordset).values_list('word__name', 'occurrences')),
+                         {word: count for word, count in self.words.items() if not word.startswith('x')})
+        self.wordset.refresh_from_db()
+        # unrecognized words are merged in the order of the shards
+        self.assertEqual(self.wordset.unrecognized_words, 'xqz<br>xzz<br>')
+        self.assertEqual(WordSetStats.objects.get(wordset=self.wordset).unique_words, 5)
+
+    def test_token_too_long_to_store_unrecognized(self):
+        """Tests that a token longer than the name of a Word (recognized by the stand-in for Datamuse, as it does not
+        start with 'x') neither crashes its shard nor is looked up, but is listed in the unrecognized words"""
+        token = 'w' * 120
+        spool.write(wordset_build.coordinator_id(self.build_id), dict(self.words, **{token: 1}))
+        build_job = self.build(Queue(connection=self.connection))
+        self.assertEqual(build_job.get_status(), 'finished')
+        self.wordset.refresh_from_db()
+        self.assertIn(f'{token}<br>', self.wordset.unrecognized_words)
+        self.assertEqual(WordSetStats.objects.get(wordset=self.wordset).unique_words, 5)
+        self.assertFalse(Word.objects.filter(name=token).exists())
+
+    def test_progress_summed_over_shards(self):
+        build_job = self.build(Queue(is_async=False, connection=self.connection))
+        meta = build_job.meta
+        self.assertEqual((meta['potential_words'], meta['processed_words'], meta['recognized_words']), (7, 7, 5))
+        self.assertEqual(meta['eta'], 0)
+
+    def test_spool_and_redis_keys_deleted(self):
+        self.build(Queue(is_async=False, connection=self.connection))
+        self.assertEqual(spool.keys(), [])
+        self.assertEqual(self.connection.keys('wordset-build:*'), [])
+
+    def test_build_job_deferred_until_shards_done(self):
+        queue = Queue(connection=self.connection)
+        with mock.patch.object(views, 'rq_queue', new=queue):
+            build_job = wordset_build.enqueue(queue, self.wordset, True, self.build_id)
+            self.assertEqual(build_job.get_status(), 'deferred')
+            self.assertEqual(queue.job_ids, [wordset_build.coordinator_id(self.build_id)])
+
+            # run the coordinator and all but the last shard
+            worker = SimpleWorker([queue], connection=self.connection)
+            for _ in range(3):
+                worker.execute_job(Job.fetch(queue.pop_job_id(), connection=self.connection), queue)
+            self.assertEqual(build_job.get_status(), 'deferred')
+            SimpleWorker([queue], connection=self.connection).work(burst=True)
+        self.assertEqual(build_job.get_status(), 'finished')
+        self.wordset.refresh_from_db()
+        self.assertEqual(self.wordset.unrecognized_words, 'xqz<br>xzz<br>')
+
+    def test_failed_shard_fails_build(self):
+        """Tests that the build job, deferred until its shards are done, is marked failed when a shard raises"""
+        with mock.patch('words.forms.add_words', side_effect=RuntimeError('Datamuse service unavailable')), \
+                mock.patch.object(views, 'redis_cursor', new=self.connection):
+            build_job = self.build(Queue(connection=self.connection))
+            self.assertEqual(build_job.get_status(), 'failed')
+            response = self.client.get(reverse('wordset_create_progress json', args=[self.build_id]))
+        self.assertEqual(response.json()['status'], 'failed')
+
+    def test_totals_not_overwritten_by_slower_shard(self):
+        """Tests that a shard whose counts are outdated by another shard before it writes the totals reads them again"""
+        build_job = Job.create(func=len, args=([],), connection=self.connection, id=self.build_id)
+        build_job.meta.update(potential_words=10, shards=2, started=0)
+        build_job.save()
+        shard_job = Job.create(func=len, args=([],), connection=self.connection, id='shard0')
+        progress = wordset_build.ShardProgressReporter(shard_job, Job.fetch(self.build_id, connection=self.connection),
+                                                       0, interval=3600, batch=1000)
+        progress.add(3)
+
+        sum_counts = wordset_build.sum_counts
+
+        def interleaved_sum_counts(fields):
+            # the other shard writes its counts between the read of this shard and its write
+            if not self.connection.hexists(wordset_build.progress_key(self.build_id), '1:processed_words'):
+                self.connection.hset(wordset_build.progress_key(self.build_id), '1:processed_words', 4)
+            return sum_counts(fields)
+
+        with mock.patch('words.wordset_build.sum_counts', side_effect=interleaved_sum_counts) as sum_countsMock:
+            progress.write()
+        self.assertEqual(sum_countsMock.call_count, 2)
+        meta = Job.fetch(self.build_id, connection=self.connection).meta
+        self.assertEqual((meta['processed_words'], meta['shards']), (7, 2))
+
+    def test_requeued_shard_does_not_enqueue_build_again(self):
+        self.build(Queue(is_async=False, connection=self.connection))
+        self.connection.sadd(wordset_build.done_key(self.build_id), 0, 1, 2)
+        self.connection.hset(wordset_build.unrecognized_key(self.build_id), 0, '[]')
+        queue = Queue(connection=self.connection)
+        spool.write(wordset_build.shard_id(self.build_id, 0), {'walk': 2})
+        with mock.patch.object(views, 'rq_queue', new=queue), \
+                mock.patch('words.wordset_build.get_current_job') as get_current_jobMock:
+            get_current_jobMock.return_value = Job.fetch(wordset_build.shard_id(self.build_id, 0),
+                                                         connection=self.connection)
+            wordset_build.build_shard(self.wordset, self.build_id, 0)
+        self.assertEqual(queue.job_ids, [])
+
+
+@mock.patch('words.forms.datamuse_json.query_words', new=fake_query_words)
+class StalledBuildTest(TestCase):
+    """Tests finding, resuming and restarting jobs whose worker died"""
+
+    def setUp(self):
+        self.connection = FakeStrictRedis()
+        self.queue = Queue(connection=self.connection)
+        self.wordset = WordSet.objects.create(name='test')
+        self.registry = StartedJobRegistry(queue=self.queue)
+
+    def start(self, job_id: str, func=wordset_build.build_shard, args=None):
+        """Creates a job as a worker starts it, then leaves it as if the worker died."""
+        job = Job.create(func=func, args=args or (self.wordset, 'build1', 0), connection=self.connection,
+                         id=job_id, origin=self.queue.name)
+        job.set_status('started')
+        job.save()
+        self.registry.add(job, 3600)
+        return job
+
+    def test_jobs_without_worker_stalled(self):
+        self.start('job1')
+        running = self.start('job2')
+        self.start('job3', func=len, args=([],))
+        worker = Worker([self.queue], connection=self.connection)
+        worker.register_birth()
+        worker.set_current_job_id(running.id)
+        self.assertEqual([job.id for job in wordset_build.stalled_jobs(self.queue)], ['job1'])
+
+    def test_resume_keeps_checkpoint(self):
+        job = self.start('job1')
+        JobCheckpoint(job).add(['xqz'])
+        wordset_build.resume(self.queue, job)
+        self.assertEqual(self.registry.get_job_ids(), [])
+        self.assertEqual(self.queue.job_ids, ['job1'])
+        self.assertEqual(JobCheckpoint(job).words(), {'xqz'})
+
+    def test_restart_shard_discards_only_its_words(self):
+        job = self.start(wordset_build.shard_id('build1', 0), func=wordset_build.build_shard,
+                         args=(self.wordset, 'build1', 0))
+        spool.write(job.id, {'walk': 1})
+        JobCheckpoint(job).add(['xqz'])
+        for name in ('walk', 'run'):
+            Membership.objects.create(wordset=self.wordset, word=Word.objects.create(name=name), occurrences=1)
+        wordset_build.restart(self.queue, job)
+        self.assertEqual(self.queue.job_ids, [job.id])
+        self.assertEqual(JobCheckpoint(job).words(), set())
+        self.assertEqual(list(self.wordset.words.values_list('name', flat=True)), ['run'])
+
+    def test_resume_command(self):
+        coordinator_id = wordset_build.coordinator_id('build1')
+        spool.write(coordinator_id, {'walk': 1, 'xqz': 1})
+        wordset_build.enqueue(self.queue, self.wordset, True, 'build1')
+        # the worker that took the coordinator job died
+        self.queue.pop_job_id()
+        self.start(coordinator_id, func=wordset_build.split_words,
+                   args=(self.wordset, SpooledUpload(coordinator_id), 'build1'))
+        out = StringIO()
+        with mock.patch.object(views, 'rq_queue', new=self.queue):
+            call_command('resume_stalled_builds', stdout=out)
+            SimpleWorker([self.queue], connection=self.connection).work(burst=True)
+        self.assertIn(f'{coordinator_id}: resumed', out.getvalue())
+        self.assertEqual(Job.fetch('build1', connection=self.connection).get_status(), 'finished')
+        self.assertTrue(self.wordset.words.filter(name='walk').exists())
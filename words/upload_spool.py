@@ -0,0 +1,172 @@
+"""Spool area for the words of uploads waiting to be added to a new WordSet.
+
+WordSetCreateForm writes the words from its fields to the spool and enqueues the jobs that process them with only a
+SpooledUpload (a reference to the spooled words), so the words are not pickled into the jobs held by Redis (see
+wordset_build, which spools the words of each shard of a WordSet under the id of the shard job). Each job streams its
+words back from the spool and deletes them once they are in the database; if the job crashes, the words stay in the
+spool and the job can be resumed (see the resume_wordset_uploads management command).
+
+Each word is stored on its own line as a JSON array holding the word and its number of occurrences. The words are kept
+by one of the following backends, chosen by settings.WORDSET_SPOOL['BACKEND']:
+    'database':   the SpooledUploadChunk table
+    'filesystem': one file per upload in settings.WORDSET_SPOOL['DIRECTORY']"""
+import json
+import os
+from typing import Mapping
+
+from django.conf import settings
+
+from words.models import SpooledUploadChunk
+
+
+def encode(word: str, count: int):
+    """Returns the spool line for word."""
+    return json.dumps([word, count]) + '\n'
+
+
+def decode(line: str):
+    """Returns the (word, count) tuple stored in a spool line."""
+    word, count = json.loads(line)
+    return word, count
+
+
+class FileSystemBackend:
+    """Keeps each upload in a file named after its key in directory."""
+
+    suffix = '.jsonl'
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, key: str):
+        # keys are used as file names, so they cannot point outside of the spool directory
+        if os.path.basename(key) != key or key in ('', '.', '..'):
+            raise ValueError(f'{key} is not a valid spool key.')
+        return os.path.join(self.directory, key + self.suffix)
+
+    def write(self, key: str, lines):
+        os.makedirs(self.directory, exist_ok=True)
+        # write to a temporary file first, so a partly written upload is never read
+        temporary_path = self.path(key) + '.tmp'
+        with open(temporary_path, 'w', encoding='utf8') as file:
+            file.writelines(lines)
+        os.replace(temporary_path, self.path(key))
+
+    def read(self, key: str):
+        with open(self.path(key), encoding='utf8') as file:
+            yield from file
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, key: str):
+        return os.path.exists(self.path(key))
+
+    def keys(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [name[:-len(self.suffix)] for name in os.listdir(self.directory) if name.endswith(self.suffix)]
+
+
+class DatabaseBackend:
+    """Keeps each upload in rows of the SpooledUploadChunk table, chunk_size lines per row."""
+
+    def __init__(self, chunk_size: int = 1000):
+        self.chunk_size = chunk_size
+
+    def write(self, key: str, lines):
+        self.delete(key)
+        chunks = []
+        lines_in_chunk = []
+        for line in lines:
+            lines_in_chunk.append(line)
+            if len(lines_in_chunk) == self.chunk_size:
+                chunks.append(SpooledUploadChunk(key=key, index=len(chunks), data=''.join(lines_in_chunk)))
+                lines_in_chunk = []
+        # an upload with no words is stored as an empty chunk, so that it still exists
+        if lines_in_chunk or not chunks:
+            chunks.append(SpooledUploadChunk(key=key, index=len(chunks), data=''.join(lines_in_chunk)))
+        SpooledUploadChunk.objects.bulk_create(chunks)
+
+    def read(self, key: str):
+        # iterator() fetches the chunks from a cursor instead of caching all of them
+        for data in SpooledUploadChunk.objects.filter(key=key).order_by('index').values_list('data', flat=True)\
+                .iterator():
+            yield from data.splitlines(keepends=True)
+
+    def delete(self, key: str):
+        SpooledUploadChunk.objects.filter(key=key).delete()
+
+    def exists(self, key: str):
+        return SpooledUploadChunk.objects.filter(key=key).exists()
+
+    def keys(self):
+        return list(SpooledUploadChunk.objects.values_list('key', flat=True).distinct())
+
+
+class UploadSpool:
+    """Writes, streams back and deletes the words of uploads, each identified by a key."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def write(self, key: str, word_counts: Mapping[str, int]):
+        """Stores word_counts (a mapping of words to their number of occurrences) under key, replacing any words
+        already stored under key."""
+        self.backend.write(key, (encode(word, count) for word, count in word_counts.items()))
+
+    def read(self, key: str):
+        """Generator that yields the (word, count) tuples stored under key one at a time."""
+        for line in self.backend.read(key):
+            yield decode(line)
+
+    def delete(self, key: str):
+        self.backend.delete(key)
+
+    def exists(self, key: str):
+        return self.backend.exists(key)
+
+    def keys(self):
+        """Returns a list of the keys of all spooled uploads."""
+        return self.backend.keys()
+
+
+class SpooledUpload:
+    """Reference to the words of an upload in the spool, passed to the jobs of a WordSet build in place of the words
+    (see wordset_build)."""
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def items(self):
+        """Streams the (word, count) tuples of the upload back from the spool."""
+        return spool.read(self.key)
+
+    def delete(self):
+        spool.delete(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, SpooledUpload) and other.key == self.key
+
+    def __repr__(self):
+        return f'SpooledUpload({self.key!r})'
+
+
+def create_spool(options: dict):
+    """Returns an UploadSpool configured by options (a dict in the format of settings.WORDSET_SPOOL)."""
+    backend_name = options.get('BACKEND', 'database')
+    if backend_name == 'database':
+        backend = DatabaseBackend()
+    elif backend_name == 'filesystem':
+        backend = FileSystemBackend(options['DIRECTORY'])
+    else:
+        raise ValueError(f'{backend_name} is not a valid upload spool backend.')
+
+    return UploadSpool(backend)
+
+
+# the spool used by WordSetCreateForm and the jobs of WordSet builds
+spool = create_spool(settings.WORDSET_SPOOL)
@@ -1,26 +1,29 @@
-import json
 import logging
 import uuid
 from typing import List
+from urllib.parse import urlencode
 
 import django_rq
 import redis
 from coverage.xmlreport import os
+from django.conf import settings
 from django.contrib.auth.mixins import UserPassesTestMixin
-from django.core.serializers.json import DjangoJSONEncoder
-from django.http import JsonResponse
-from django.shortcuts import render
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, get_object_or_404
 from django.urls import reverse_lazy, reverse
 from django.views import generic
 from django.views.generic.edit import CreateView, DeleteView
 from rq.compat import text_type
-from rq.job import Job
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, get_current_job
 from rq.registry import StartedJobRegistry
 
-from words import datamuse_json
+from words import chart_data, datamuse_json, job_progress, pagination, related_words, related_words_cache, \
+    related_words_graph
 from words.datamuse_json import DatamuseWordNotRecognizedError
-from words.forms import RelatedWordsForm, WordSetCreateForm, WordSetChoice, ScatterplotWordSetChoice
-from words.models import WordSet, Word
+from words.forms import RelatedWordsForm, WordSetCreateForm, WordSetChoice, ScatterplotWordSetChoice, \
+    FrequencyChartQuery, ScatterplotQuery, WordTableQuery
+from words.models import WordSet, WordSetStats, relation_verbose_names
 
 # Get an instance of a logger
 logger = logging.getLogger(__name__)
@@ -49,6 +52,21 @@ def job_json(request, job_id):
     return JsonResponse(reply)
 
 
+def job_events(request, job_id):
+    """Streams the progress of a django-rq job as Server-Sent Events, each holding the job status, meta and result (if
+    any) in the format of job_json (see job_progress.events)."""
+    try:
+        job = Job.fetch(job_id, connection=redis_cursor)
+    except NoSuchJobError:
+        raise Http404(f'no job with id {job_id}')
+
+    response = StreamingHttpResponse(job_progress.events(job), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # stop proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def index(request):
     """View function for home tab of site."""
     context = {
@@ -72,28 +90,16 @@ def visualization_frequency(request):
         if form.is_valid():
             set_instance = form.cleaned_data['word_set']
             logger.debug(set_instance.name)
-            queryset = set_instance.words.all()
-
-            # apply limits on word frequency (if any)
-            if form.cleaned_data['frequency_gt']:
-                queryset = queryset.filter(frequency__gt=form.cleaned_data['frequency_gt'])
-            if form.cleaned_data['frequency_lt']:
-                queryset = queryset.filter(frequency__lt=form.cleaned_data['frequency_lt'])
-
-            # objects to pass to D3
-            json_list = [
-                {
-                    "name": word.name,
-                    "title": f'{word.name}',
-                    "group": set_instance.name,
-                    "value": word.frequency
-                }
-                for word in queryset]
-            context['wordcount'] = len(json_list)  # number of words in visualization
-
-            # json formatted for Observable bubble chart
-            wordset_data = json.dumps(json_list, cls=DjangoJSONEncoder)
-            context['wordset_data'] = wordset_data
+
+            # limits on word frequency (if any)
+            limits = {key: form.cleaned_data[key] for key in ('frequency_gt', 'frequency_lt') if form.cleaned_data[key]}
+
+            # the first page of the chart is included in the page, further pages are fetched from data_url on demand
+            page = chart_data.frequency_page(set_instance, settings.FREQUENCY_CHART_PAGE_SIZE, **limits)
+            context['wordcount'] = page['count']  # number of words in visualization
+            context['wordset_data'] = page
+            data_url = reverse('viz frequency json', args=[set_instance.pk])
+            context['data_url'] = f'{data_url}?{urlencode(limits)}' if limits else data_url
 
     # if a GET (or any other method) create a blank form
     else:
@@ -120,6 +126,17 @@ def visualization_frequency(request):
     return render(request, 'words/visualization_frequency.html', context)
 
 
+def visualization_frequency_json(request, pk):
+    """Returns a page of the frequency bubble chart of a WordSet in json format (see chart_data.frequency_page). The
+    query string can hold limits on word frequency (frequency_gt, frequency_lt), the number of words in the page
+    (limit) and the cursor of the page (from 'next' in the previous page)."""
+    wordset = get_object_or_404(WordSet, pk=pk)
+    form = FrequencyChartQuery(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    return JsonResponse(chart_data.frequency_page(wordset, **form.cleaned_data))
+
+
 def visualization_frequency_scatterplot(request):
     """View for a chart that plots frequency of words vs their number of occurrences in a WordSet."""
     context = {
@@ -134,37 +151,12 @@ def visualization_frequency_scatterplot(request):
             set_instance = form.cleaned_data['word_set']
             logger.debug(set_instance.name)
 
-            # get the Membership objects (each holds the word and occurrences in the WordWet) linked to the WordSet
-            queryset = set_instance.membership_set.all()
-
-            # apply limits on word frequency (if any)
-            if form.cleaned_data['frequency_gt']:
-                queryset = queryset.filter(word__frequency__gt=form.cleaned_data['frequency_gt'])
-            if form.cleaned_data['frequency_lt']:
-                queryset = queryset.filter(word__frequency__lt=form.cleaned_data['frequency_lt'])
+            # limits on word frequency and occurrences (if any)
+            limits = {key: form.cleaned_data[key] for key in ('frequency_gt', 'frequency_lt', 'occurrences_gt',
+                                                              'occurrences_lt') if form.cleaned_data[key]}
 
-            # apply limits on word occurrences (if any)
-            if form.cleaned_data['occurrences_gt']:
-                queryset = queryset.filter(occurrences__gt=form.cleaned_data['occurrences_gt'])
-            if form.cleaned_data['occurrences_lt']:
-                queryset = queryset.filter(occurrences__lt=form.cleaned_data['occurrences_lt'])
-
-            logger.debug(queryset)
-
-            # objects to pass to D3
-            data_list = [
-                {
-                    "name": membership.word.name,
-                    "x": membership.occurrences,
-                    "y": membership.word.frequency
-                }
-                for membership in queryset]
-
-            logger.debug(f'data_list: {data_list}')
-
-            # format data_list as json string
-            word_data = json.dumps(data_list, cls=DjangoJSONEncoder)
-            context['word_data'] = word_data
+            # individual points, or grid cells aggregating the words when there are too many to plot
+            context['word_data'] = chart_data.scatterplot_data(set_instance, **limits)
 
     # if a GET (or any other method) create a blank form
     else:
@@ -191,81 +183,105 @@ def visualization_frequency_scatterplot(request):
     return render(request, 'words/visualization_frequency_scatterplot.html', context)
 
 
+def visualization_frequency_scatterplot_json(request, pk):
+    """Returns the data of the occurrences vs frequency scatterplot of a WordSet in json format (see
+    chart_data.scatterplot_data). The query string can hold limits on word frequency (frequency_gt, frequency_lt) and
+    occurrences (occurrences_gt, occurrences_lt)."""
+    wordset = get_object_or_404(WordSet, pk=pk)
+    form = ScatterplotQuery(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    limits = {key: value for key, value in form.cleaned_data.items() if value is not None}
+    return JsonResponse(chart_data.scatterplot_data(wordset, **limits))
+
+
 def related_words_process(word: str, relation_codes: List[str]):
-    def related_words_query(word: str, relation_codes: List[str]):
-        """Helper for visualization_related_words that performs the needed Datamuse queryies.
+    """Queries Datamuse (when needed) for the words related to word by each of the relation types in relation_codes,
+    and builds the json object for the related words chart.
 
-        relation_codes is a list of strings corresponding to the desired relation types. Valid strings for this are in
-        datamuse_json.relation_codes.
+    relation_codes is a list of strings corresponding to the desired relation types. Valid strings for this are in
+    datamuse_json.relation_codes. The missing relation types are queried concurrently, and the json object is built in
+    a single pass over the related words (see datamuse_json.add_related_many and related_words.build_chart). The
+    result is cached (see related_words_cache) unless Datamuse could not be reached."""
+    result = {}
+    # read before the relations, so that a chart built while relations are being added is not cached as current
+    version = related_words_cache.cache.version(word)
 
-        Returns a dictionary where each key is the relationship code and the value is the model field holding the words
-        related to the word."""
-        results_by_code = {}
+    try:
+        # dict mapping each relation code with related words to its WordRelations, in order of score
+        query_results = datamuse_json.add_related_many(word, relation_codes)[1]
+        result = related_words.build_chart(word, relation_codes, query_results)
+        # the next request for these relation types needs no job (see related_words_context)
+        related_words_cache.cache.add_no_results(word, [code for code in relation_codes if code not in query_results])
+
+    except DatamuseWordNotRecognizedError as e:
+        # no chart to display because Datamuse does not recognize the word
+        result['datamuse_error'] = e.message
+    except (ConnectionError, ValueError) as e:
+        # no chart to display due to error when querying Datamuse
+        result['datamuse_error'] = str(e)
+        # the next request for this chart enqueues a new job rather than sharing this one (see related_words)
+        result['retryable'] = True
 
-        for code in relation_codes:
-            # retrieve the Words related to word for that relationship type
-            query_result = datamuse_json.add_related(word, code)[1]
-            if query_result.count() > 0:
-                # add item to dict with key corresponding to relation
-                results_by_code[code] = query_result
+    if not result.get('retryable'):
+        related_words_cache.cache.set(word, relation_codes, version, result)
 
-        return results_by_code
+    # push the result to pages watching the job (see job_progress)
+    job_progress.publish(get_current_job(), 'finished', result)
+    return result
 
-    result = {}
 
-    try:
-        query_results = related_words_query(word, relation_codes)
-        if query_results:
-            # Datamuse returned related words for at least one relation code
-
-            # holds relationship codes for which Datamuse returned no related words.
-            # If any items added to this list, they will be displayed in a message above the form.
-            relations_with_no_results = []
-
-            json_object = {
-                "name": word,
-                "children": [
-                    # list that will hold a dictionary (will be read by js as an object) for each relation type
-                ]
-            }
-
-            for code in relation_codes:
-                verbose_code = Word._meta.get_field(code).verbose_name
-                if code in query_results:
-                    json_object["children"].append(
-                        {
-                            "name":
-                                verbose_code,
-                            "children": [
-                                # list of all the words related by this relation type and the associated score
-                                {
-                                    "name": relation.related_word.name,
-                                    "score": relation.score
-                                }
-                                for relation in query_results[code].order_by("-score")
-                            ]
-                        }
-                    )
-                else:
-                    relations_with_no_results.append(verbose_code)
-
-            result['json_object'] = json_object
-            if relations_with_no_results:
-                result['relations_with_no_results'] = relations_with_no_results
+def related_words_context(word: str, relation_codes: List[str]):
+    """Returns the context of the related words chart of word for the relation types in relation_codes: the chart
+    (result) if it can be built without querying Datamuse, otherwise the part of the chart whose relations are all
+    stored (result) and the id of the job for the missing relation types (job_id).
 
-        else:
-            # results is empty (Datamuse did not return related words for any relation code)
-            result['datamuse_error'] = f'No related words found for word "{word}" for the chosen relations'
+    Relation types Datamuse returned no related words for are not missing (see related_words_cache.add_no_results),
+    and neither are those of a result cached for the missing relation types. A chart built without a job is cached
+    under all of relation_codes, so the next request for it is a single cache read."""
+    context = {}
+    result = related_words_cache.cache.get(word, relation_codes)
+    if result is not None:
+        # the chart is cached, so it is part of the page and no job is needed
+        context['result'] = result
+        return context
 
-    except DatamuseWordNotRecognizedError or ConnectionError or ValueError as e:
-        # no chart to display due to error when querying Datamuse
-        result['datamuse_error'] = e.message
+    # read before the relations, so that a chart built while relations are being added is not cached as current
+    version = related_words_cache.cache.version(word)
+    # the relations stored for any of the relation types, in a single query
+    relations_by_code = related_words.stored_relations(word, relation_codes)
+    no_results_codes = related_words_cache.cache.no_results(word)
+    missing_codes = [code for code in relation_codes if code not in relations_by_code and code not in no_results_codes]
+    chart_codes = [code for code in relation_codes if code not in missing_codes]
+    if chart_codes:
+        result = related_words.build_chart(word.strip().lower(), chart_codes, relations_by_code)
+
+    job_result = related_words_cache.cache.get(word, missing_codes) if missing_codes else None
+    if missing_codes and job_result is None:
+        if result is not None:
+            # none of the stored relation types having related words says nothing about the job's relation types
+            if 'json_object' not in result:
+                del result['datamuse_error']
+            context['result'] = result
+        # requests for the same chart share a single job (see related_words)
+        context['job_id'] = related_words.enqueue(rq_queue, word, missing_codes).id
+        return context
 
-    return result
+    if job_result is not None:
+        result = job_result if result is None else \
+            related_words.merge_results(word.strip().lower(), relation_codes, result, job_result)
+    related_words_cache.cache.set(word, relation_codes, version, result)
+    context['result'] = result
+    return context
 
 
 def visualization_related_words(request):
-    """View for the word relationship visualization"""
+    """View for the word relationship visualization.
+
+    The chart is part of the page if it is cached (see related_words_cache). Otherwise, the part of the chart whose
+    relations are all stored is, and a job is enqueued for the missing relation types (see related_words), which the
+    page merges into the chart when the job finishes. A chart of more than one level is expanded by a job (see
+    related_words_graph), and the page draws each level as soon as it is expanded."""
 
     context = {
         'viz_title': 'Related Words',  # Visualization title to use in page title
@@ -278,13 +294,21 @@ def visualization_related_words(request):
 
         if form.is_valid():
             word = form.cleaned_data['word']
-            relation_codes = form.cleaned_data['relations']
+            # in the order of relation_codes, which the chart lists the relation types in (see related_words.enqueue)
+            relation_codes = [code for code in datamuse_json.relation_codes if code in form.cleaned_data['relations']]
             logger.debug(f"word: {word}, codes: {relation_codes}")
 
             context['root_word'] = word
+            # verbose names of the relation types, in the order their part of the chart is displayed
+            context['relation_names'] = [relation_verbose_names[code] for code in relation_codes]
 
-            job = rq_queue.enqueue(related_words_process, word, relation_codes)
-            context['job_id'] = job.id
+            depth = form.cleaned_data.get('depth') or 1
+            if depth > 1:
+                # the chart branches out through a single relation; the page draws each level as the job expands it
+                job = related_words_graph.enqueue(rq_queue, word, relation_codes[0], depth)
+                context['job_id'] = job.id
+            else:
+                context.update(related_words_context(word, relation_codes))
 
     # if a GET (or any other method) create a blank form
     else:
@@ -296,20 +320,35 @@ def visualization_related_words(request):
     return render(request, 'words/visualization_related_words.html', context)
 
 
-# todo related words dendrogram that uses a single relation and branches out (ie for synonyms: display synonyms of the
-# chosen word as well as the synonyms of each synonym
-
-
 class WordSetDetailView(generic.DetailView):
     model = WordSet
 
+    # select the statistics of the WordSet in the same query
+    queryset = WordSet.objects.select_related('stats')
+
     def get_context_data(self, **kwargs):
         context = super(WordSetDetailView, self).get_context_data()
-        context['words_missing_data'] = self.object.words.filter(datamuse_success=False)
-        context['memberships_ordered_by_name'] = self.object.membership_set.order_by("word__name")
+        stats = WordSetStats.objects.for_wordset(self.object)
+        context['stats'] = stats
+        if stats.missing_data_words:
+            context['words_missing_data'] = self.object.words.filter(datamuse_success=False)
+        # the first page of the word table; the following pages are fetched from words_url as the table is scrolled
+        context['words_page'] = pagination.membership_page(self.object, settings.WORDSET_TABLE_PAGE_SIZE)
+        context['words_url'] = reverse('wordset words json', args=[self.object.pk])
         return context
 
 
+def wordset_words_json(request, pk):
+    """Returns a page of the word table of a WordSet (the words in order of name, with their occurrences) in json format
+    (see pagination.membership_page). The query string can hold the number of words in the page (limit) and the cursor
+    of the page (from 'next' in the previous page)."""
+    wordset = get_object_or_404(WordSet, pk=pk)
+    form = WordTableQuery(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    return JsonResponse(pagination.membership_page(wordset, **form.cleaned_data))
+
+
 class WordSetCreate(CreateView):
     """View to create a new WordSet"""
     model = WordSet
@@ -344,11 +383,9 @@ class WordSetCreate(CreateView):
 
 
 def wordset_create_progress_json(request, job_id):
-    """Returns an rq job's progress (contained in job.meta) in json format."""
+    """Returns an rq job's progress (contained in job.meta) and status in json format. Only reads the job."""
     job = Job.fetch(job_id, connection=redis_cursor)
-    job.meta['status'] = job.get_status()
-    job.save_meta()
-    return JsonResponse(job.meta)
+    return JsonResponse(dict(job.meta, status=job.get_status()))
 
 
 def wordset_create_progress(request, pk, job_id):
@@ -385,7 +422,8 @@ class WordSetDelete(UserPassesTestMixin, DeleteView):
 class WordSetListView(generic.ListView):
     model = WordSet
 
-    # todo add word count to template?
+    # select the creator and statistics of each WordSet (used to display the WordSet) in the same query
+    queryset = WordSet.objects.select_related('creator', 'stats')
 
     def get_context_data(self, *args, **kwargs):
         context = super(WordSetListView, self).get_context_data()
@@ -395,8 +433,8 @@ class WordSetListView(generic.ListView):
         user = self.request.user
         logger.debug(f'user: {user}')
         if user.is_authenticated:
-            user_wordsets = WordSet.objects.filter(creator=user)
-            other_wordsets = WordSet.objects.exclude(creator=user)
+            user_wordsets = WordSet.objects.filter(creator=user).select_related('stats')
+            other_wordsets = WordSet.objects.exclude(creator=user).select_related('creator', 'stats')
             context['user_wordsets'] = user_wordsets
             context['other_wordsets'] = other_wordsets
 
@@ -0,0 +1,328 @@
+"""Builds new WordSets with several RQ jobs, so that the words of a large upload are processed by all of the workers in
+parallel rather than by a single job.
+
+A build is made of
+    the coordinator job (split_words), which splits the spooled words of the upload into disjoint shards of at least
+        settings.WORDSET_SHARD_MIN_WORDS words (at most settings.WORDSET_SHARDS shards), spools each shard on its own
+        and enqueues a shard job for each;
+    the shard jobs (build_shard), each adding the words of its shard to the WordSet (see forms.add_words);
+    the build job (finish_build), which merges the unrecognized words of the shards into the WordSet and writes its
+        statistics once every shard is done.
+
+The build job has the id of the build (the job id pages use to follow the build, see job_progress), and is created
+deferred when the build is enqueued. rq cannot make a job depend on several jobs, so each shard job adds its index to
+a Redis set of finished shards and the shard job that completes the set enqueues the build job. Shard jobs add their
+progress to the meta of the build job as they go, so pages watching the build see the progress of all of the shards.
+If any job of the build raises, the build job is marked failed (see fails_build), so pages watching the build stop
+waiting for it.
+
+The coordinator and shard jobs can be requeued after a crash: the words of each job stay spooled under its job id until
+it is done, and words processed by an earlier run of the job are skipped (see job_checkpoint). Failed jobs are
+requeued by the resume_wordset_uploads command; jobs whose worker died are found in the StartedJobRegistry by
+stalled_jobs, and resumed or restarted by the resume_stalled_builds command or the WordSet admin actions."""
+import functools
+import inspect
+import json
+import math
+import time
+from typing import Mapping
+
+from django.conf import settings
+from rq import Queue, Worker
+from rq.exceptions import NoSuchJobError
+from redis import WatchError
+from rq.job import Job, JobStatus, dumps, get_current_job, unpickle
+from rq.registry import StartedJobRegistry
+
+from words import forms, job_checkpoint, job_progress, upload_spool
+from words.models import Membership, WordSet
+
+# seconds the Redis keys of a build are kept if its build job never runs
+key_ttl = 7 * 24 * 60 * 60
+
+# counters of job.meta summed over the shards of a build
+counters = ('processed_words', 'recognized_words', 'skipped_lookups')
+
+
+def coordinator_id(build_id: str):
+    """Returns the id of the coordinator job of the build (also the spool key of the words of the upload)."""
+    return f'{build_id}-split'
+
+
+def shard_id(build_id: str, index: int):
+    """Returns the id of the shard job with index (also the spool key of the words of the shard)."""
+    return f'{build_id}-shard-{index}'
+
+
+def progress_key(build_id: str):
+    """Returns the key of the Redis hash holding the counters of each shard of the build."""
+    return f'wordset-build:{build_id}:progress'
+
+
+def unrecognized_key(build_id: str):
+    """Returns the key of the Redis hash holding the json list of unrecognized words of each finished shard."""
+    return f'wordset-build:{build_id}:unrecognized'
+
+
+def done_key(build_id: str):
+    """Returns the key of the Redis set holding the index of each finished shard."""
+    return f'wordset-build:{build_id}:done'
+
+
+def shard_count(word_count: int):
+    """Returns the number of shards to split word_count words between."""
+    return max(1, min(settings.WORDSET_SHARDS, word_count // settings.WORDSET_SHARD_MIN_WORDS))
+
+
+def sum_counts(fields: Mapping[bytes, bytes]):
+    """Returns a dict holding each counter summed over the shards in fields (the progress hash of a build)."""
+    totals = dict.fromkeys(counters, 0)
+    for field, value in fields.items():
+        counter = field.decode().split(':', 1)[1]
+        totals[counter] += int(value)
+    return totals
+
+
+class ShardProgressReporter(job_progress.ProgressReporter):
+    """Reports the progress of a shard in the meta of its own job, and the progress summed over all of the shards of
+    the build in the meta of build_job (published to pages watching the build)."""
+
+    def __init__(self, job: Job, build_job: Job, index: int, **kwargs):
+        self.build_job = build_job
+        self.index = index
+        super().__init__(job, 'recognized_words', 'skipped_lookups', **kwargs)
+
+    def write(self):
+        super().write()
+        key = progress_key(self.build_job.id)
+        pipeline = self.job.connection.pipeline()
+        # each shard writes its own counts, so a requeued shard replaces the counts of its earlier run
+        pipeline.hmset(key, {f'{self.index}:{counter}': self.job.meta[counter] for counter in counters})
+        pipeline.expire(key, key_ttl)
+        pipeline.execute()
+
+        # the shards run at the same time, so the totals are written in a transaction watching the counts and the
+        # build job: a shard that read the counts before another shard wrote its own retries rather than overwriting
+        # the newer totals with older ones
+        with self.job.connection.pipeline() as pipeline:
+            while True:
+                try:
+                    pipeline.watch(key, self.build_job.key)
+                    meta = unpickle(pipeline.hget(self.build_job.key, 'meta'))
+                    totals = sum_counts(pipeline.hgetall(key))
+                    meta.update(totals)
+                    job_progress.update_rate(meta, totals['processed_words'], time.time() - meta['started'])
+                    self.build_job.meta = meta
+
+                    pipeline.multi()
+                    pipeline.hset(self.build_job.key, 'meta', dumps(meta))
+                    # published in the transaction, so pages receive the totals in the order they are written
+                    job_progress.publish(self.build_job, pipeline=pipeline)
+                    pipeline.execute()
+                    break
+                except WatchError:
+                    continue
+
+
+def fail_build(build_id: str, connection):
+    """Marks the build job failed and tells pages watching the build (see job_progress)."""
+    try:
+        build_job = Job.fetch(build_id, connection=connection)
+    except NoSuchJobError:
+        return
+    build_job.set_status(JobStatus.FAILED)
+    job_progress.publish(build_job, JobStatus.FAILED)
+
+
+def fails_build(func):
+    """Decorates a job function of a build (taking a build_id argument) so that the build job is marked failed when
+    the function raises. Otherwise the build job would stay deferred, as the shards it waits for never all finish."""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            build_id = signature.bind(*args, **kwargs).arguments['build_id']
+            fail_build(build_id, get_current_job().connection)
+            raise
+
+    return wrapper
+
+
+def enqueue(queue: Queue, wordset: WordSet, commit: bool, build_id: str):
+    """Creates the build job of wordset (deferred until its shards are done) and enqueues the coordinator job, which
+    reads the words spooled under coordinator_id(build_id). Returns the build job."""
+    build_job = Job.create(func=finish_build,
+                           args=(wordset, commit, build_id),
+                           connection=queue.connection,
+                           ttl=-1,
+                           status=JobStatus.DEFERRED,
+                           description=wordset.name,
+                           timeout='1h',
+                           id=build_id,
+                           origin=queue.name
+                           )
+    build_job.save()
+
+    coordinator = Job.create(func=split_words,
+                             args=(wordset, upload_spool.SpooledUpload(coordinator_id(build_id)), build_id),
+                             connection=queue.connection,
+                             ttl=-1,
+                             description=f'{wordset.name} (split)',
+                             timeout='1h',
+                             id=coordinator_id(build_id)
+                             )
+    queue.enqueue_job(coordinator)
+
+    return build_job
+
+
+@fails_build
+def split_words(wordset: WordSet, upload: upload_spool.SpooledUpload, build_id: str):
+    """Coordinator job of a build: splits the words of upload between shards, spools the words of each shard and
+    enqueues the shard jobs. Returns the number of shards."""
+    from words.views import rq_queue
+
+    job = get_current_job()
+    connection = job.connection
+
+    # the upload is deleted once the shard jobs are enqueued, so a coordinator resumed after that has nothing to do
+    if not upload_spool.spool.exists(upload.key):
+        return Job.fetch(build_id, connection=connection).meta['shards']
+
+    words = list(forms.count_words(upload).items())
+    shards = shard_count(len(words))
+    size = math.ceil(len(words) / shards)
+    for index in range(shards):
+        upload_spool.spool.write(shard_id(build_id, index), dict(words[index * size:(index + 1) * size]))
+
+    # a requeued coordinator starts the build over (the shard jobs skip the words they already added)
+    connection.delete(progress_key(build_id), unrecognized_key(build_id), done_key(build_id))
+
+    build_job = Job.fetch(build_id, connection=connection)
+    build_job.meta.update(dict.fromkeys(counters, 0), potential_words=len(words), rate=0, eta=None, shards=shards,
+                          started=time.time())
+    build_job.save_meta()
+    job_progress.publish(build_job)
+
+    for index in range(shards):
+        shard_job = Job.create(func=build_shard,
+                               args=(wordset, build_id, index),
+                               connection=connection,
+                               ttl=-1,
+                               description=f'{wordset.name} (shard {index + 1} of {shards})',
+                               timeout='1h',
+                               id=shard_id(build_id, index)
+                               )
+        rq_queue.enqueue_job(shard_job)
+
+    # the words are held by the shards now
+    upload.delete()
+
+    return shards
+
+
+@fails_build
+def build_shard(wordset: WordSet, build_id: str, index: int):
+    """Shard job of a build: adds the words of shard index to wordset, records its unrecognized words and enqueues the
+    build job if it is the last shard to finish. Returns the number of words in the shard."""
+    from words.views import rq_queue
+
+    job = get_current_job()
+    connection = job.connection
+    build_job = Job.fetch(build_id, connection=connection)
+
+    upload = upload_spool.SpooledUpload(shard_id(build_id, index))
+    detected_words = dict(upload.items())
+
+    progress = ShardProgressReporter(job, build_job, index)
+    checkpoint = job_checkpoint.JobCheckpoint(job)
+    progress.set_total(len(detected_words))
+    # the progress is written when the words are done, or when processing them fails
+    with progress:
+        unrecognized_words = forms.add_words(wordset, detected_words, progress, checkpoint)
+
+    # record the unrecognized words and mark the shard finished in a single transaction, so that exactly one shard
+    # sees the set of finished shards complete
+    pipeline = connection.pipeline()
+    pipeline.hset(unrecognized_key(build_id), index, json.dumps(unrecognized_words))
+    pipeline.sadd(done_key(build_id), index)
+    pipeline.scard(done_key(build_id))
+    pipeline.expire(unrecognized_key(build_id), key_ttl)
+    pipeline.expire(done_key(build_id), key_ttl)
+    added, done = pipeline.execute()[1:3]
+
+    upload.delete()
+    checkpoint.delete()
+
+    if added and done == build_job.meta['shards']:
+        rq_queue.enqueue_job(Job.fetch(build_id, connection=connection))
+
+    return len(detected_words)
+
+
+@fails_build
+def finish_build(wordset: WordSet, commit: bool, build_id: str):
+    """Build job of a build: merges the unrecognized words of the shards (in the order of the shards) into wordset,
+    saves wordset (if commit) and writes its statistics, then tells pages watching the build that it is complete."""
+    job = get_current_job()
+    connection = job.connection
+
+    shard_unrecognized_words = connection.hgetall(unrecognized_key(build_id))
+    unrecognized_words = []
+    for index in range(job.meta['shards']):
+        unrecognized_words.extend(json.loads(shard_unrecognized_words[str(index).encode()]))
+    forms.complete_wordset(wordset, commit, unrecognized_words)
+
+    job.meta.update(sum_counts(connection.hgetall(progress_key(build_id))))
+    job_progress.update_rate(job.meta, job.meta['processed_words'], time.time() - job.meta['started'])
+    job.save_meta()
+    connection.delete(progress_key(build_id), unrecognized_key(build_id), done_key(build_id))
+
+    job_progress.publish(job, 'finished')
+
+    return wordset
+
+
+def is_build_job(job: Job):
+    """Returns True if job adds words to a new WordSet (a job of a build)."""
+    return job.func_name in (f'{__name__}.split_words', f'{__name__}.build_shard', f'{__name__}.finish_build')
+
+
+def stalled_jobs(queue: Queue):
+    """Returns the jobs adding words to new WordSets that are in the StartedJobRegistry of queue, but that no worker is
+    running. When a worker dies mid-job, rq leaves its job started until the job times out."""
+    running_job_ids = {worker.get_current_job_id() for worker in Worker.all(queue=queue)}
+    jobs = []
+    for job_id in StartedJobRegistry(queue=queue).get_job_ids():
+        if job_id in running_job_ids:
+            continue
+        try:
+            job = Job.fetch(job_id, connection=queue.connection)
+        except NoSuchJobError:
+            continue
+        if is_build_job(job):
+            jobs.append(job)
+    return jobs
+
+
+def resume(queue: Queue, job: Job):
+    """Requeues the stalled job with the same id, so that it skips the words its earlier runs processed (see
+    job_checkpoint)."""
+    StartedJobRegistry(queue=queue).remove(job)
+    queue.enqueue_job(job)
+
+
+def restart(queue: Queue, job: Job):
+    """Requeues the stalled job after discarding the work of its earlier runs (its checkpoint and the Memberships it
+    added to its WordSet), so that it processes all of its words again. Words saved by the earlier runs are kept, so
+    Datamuse is not queried again for the words it recognized."""
+    wordset = job.args[0]
+    if job.func_name == f'{__name__}.build_shard':
+        words = [word for word, count in upload_spool.spool.read(job.id)]
+        for chunk in forms.chunks(words, settings.WORDSET_CHUNK_SIZE):
+            Membership.objects.filter(wordset=wordset, word_name__in=chunk).delete()
+    job_checkpoint.JobCheckpoint(job).delete()
+    resume(queue, job)